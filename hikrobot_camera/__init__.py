@@ -1,3 +1,7 @@
 from .__info__ import __version__
 from .hikrobot_camera import HikrobotCamera, HikCameraError
 from .multi_hikrobot_cameras import MultiHikrobotCameras
+from .frame import Frame, FrameLease
+from .frame_queue import FrameQueue, DropPolicy
+from .pixel_format import ChannelOrder
+from .flat_field import FlatFieldCorrection
@@ -0,0 +1,289 @@
+import typing
+import logging
+import dataclasses
+import numpy as np
+import cv2
+
+from .pixel_format import DecodePlan, unpack_10_packed, unpack_12_packed, unpack_packed_to_8
+from .transform import TransformPlan, ROT90_K, decimation_step, write_into
+
+_logger = logging.getLogger(__name__)
+
+
+class ConversionBackend:
+    """
+    解码及变换后端
+    每台相机按 camera_params.yml 中的 conversion_backend 为每种像素格式选择后端, 后端不支持的情况回退到 OpenCV
+    输出均写入调用者提供的 dst 或 alloc 分配的数组
+    """
+    # 后端名称, 与 camera_params.yml 中的取值一致
+    name: str = ""
+
+    def supports(self, plan: DecodePlan, gray: bool = False, keep_depth: bool = False) -> bool:
+        """
+        是否支持以该方案解码
+        :param plan:
+        :param gray:        是否直接解码为灰度图
+        :param keep_depth:  是否保持高位深
+        :return:
+        """
+        return True
+
+    def decode(
+            self,
+            plan: DecodePlan,
+            raw: np.ndarray,
+            pixel_type: typing.Optional[int],
+            height: int,
+            width: int,
+            dst: typing.Optional[np.ndarray] = None,
+            alloc: typing.Optional[typing.Callable[..., np.ndarray]] = None,
+            keep_depth: bool = False,
+            gray: bool = False,
+    ) -> np.ndarray:
+        """
+        解码一维原始数据, 参数同 DecodePlan.decode
+        :param plan:
+        :param raw:
+        :param pixel_type:  enPixelType, SDK 后端需要
+        :param height:
+        :param width:
+        :param dst:
+        :param alloc:
+        :param keep_depth:
+        :param gray:
+        :return:
+        """
+        raise NotImplementedError
+
+    def transform(
+            self,
+            transform_plan: TransformPlan,
+            image_data: np.ndarray,
+            dst: typing.Optional[np.ndarray] = None,
+            alloc: typing.Optional[typing.Callable[..., np.ndarray]] = None,
+    ) -> np.ndarray:
+        """
+        resize/rotation, 缺省由 TransformPlan (OpenCV) 执行
+        :param transform_plan:
+        :param image_data:
+        :param dst:
+        :param alloc:
+        :return:
+        """
+        return transform_plan.apply(image_data, dst=dst, alloc=alloc)
+
+
+class OpenCVBackend(ConversionBackend):
+    """OpenCV 后端, 即 DecodePlan / TransformPlan 本身"""
+    name = "opencv"
+
+    def decode(self, plan, raw, pixel_type, height, width, dst=None, alloc=None, keep_depth=False, gray=False):
+        return plan.decode(raw, height, width, dst=dst, alloc=alloc, keep_depth=keep_depth, gray=gray)
+
+
+# 通道重排可由 numpy 完成的颜色转换代码 -> 取用的通道下标
+NUMPY_CHANNEL_INDEX: dict[int, tuple[int, ...]] = {
+    cv2.COLOR_RGB2BGR: (2, 1, 0),
+    cv2.COLOR_RGBA2RGB: (0, 1, 2),
+    cv2.COLOR_BGRA2BGR: (0, 1, 2),
+    cv2.COLOR_RGBA2BGR: (2, 1, 0),
+    cv2.COLOR_BGRA2RGB: (2, 1, 0),
+}
+
+
+class NumpyBackend(ConversionBackend):
+    """
+    纯 numpy 后端, 不调用 OpenCV
+    支持灰度、Packed 及 RGB/BGR(A) 格式, Bayer 插值及 YUV 转换回退到 OpenCV
+    与 OpenCV 的差异:
+      - 高位深缩放到 8 位为右移(向下取整), OpenCV 为四舍五入
+      - 整数倍缩小为块均值(与 INTER_AREA 一致), 其余比例为最近邻
+    """
+    name = "numpy"
+
+    def supports(self, plan, gray=False, keep_depth=False):
+        if plan.bayer is not None or plan.swap_rb:
+            return False
+        if plan.kernel is not None and plan.kernel not in (unpack_10_packed, unpack_12_packed):
+            return False
+        if gray and plan.out_channels != 1:
+            return False
+        return plan.cvt_code is None or plan.cvt_code in NUMPY_CHANNEL_INDEX
+
+    def decode(self, plan, raw, pixel_type, height, width, dst=None, alloc=None, keep_depth=False, gray=False):
+        if alloc is None:
+            alloc = np.empty
+        shape = (height, width) if plan.channels == 1 else (height, width, plan.channels)
+        if not keep_depth and plan.kernel8 is not None:
+            target = dst if plan.cvt_code is None and dst is not None else alloc(shape, np.uint8)
+            image_data = unpack_packed_to_8(raw, height, width, target)
+        elif plan.kernel is not None:
+            image_data = plan.kernel(raw, height, width, alloc(shape, plan.dtype))
+        else:
+            image_data = plan.raw_view(raw, height, width)
+
+        # 高位深 -> 8 位
+        if image_data.dtype != np.uint8 and not keep_depth:
+            target = dst if plan.cvt_code is None and dst is not None else alloc(image_data.shape, np.uint8)
+            np.right_shift(image_data, plan.bits - 8, out=target, casting="unsafe")
+            image_data = target
+
+        # 通道重排
+        if plan.cvt_code is not None:
+            target = dst if dst is not None else alloc(plan.out_shape(height, width), image_data.dtype)
+            np.take(image_data, NUMPY_CHANNEL_INDEX[plan.cvt_code], axis=2, out=target)
+            image_data = target
+        return image_data
+
+    def transform(self, transform_plan, image_data, dst=None, alloc=None):
+        if transform_plan.views and dst is None:
+            return transform_plan.apply(image_data, dst=dst, alloc=alloc)
+        if alloc is None:
+            alloc = np.empty
+
+        resized_height, resized_width = transform_plan.resized_size(*image_data.shape[:2])
+        if image_data.shape[:2] != (resized_height, resized_width):
+            image_data = self.resize(image_data, resized_height, resized_width, alloc)
+        if transform_plan.rotate_code is not None:
+            image_data = np.rot90(image_data, ROT90_K[transform_plan.rotate_code])
+
+        if dst is None:
+            dst = alloc(image_data.shape, image_data.dtype)
+        return write_into(image_data, dst)
+
+    @staticmethod
+    def resize(image_data: np.ndarray, height: int, width: int, alloc: typing.Callable[..., np.ndarray]) -> np.ndarray:
+        """
+        整数倍缩小为块均值, 其余为最近邻采样
+        :param image_data:
+        :param height:
+        :param width:
+        :param alloc:
+        :return:
+        """
+        step = decimation_step(image_data.shape, height, width)
+        if step is not None and image_data.shape[0] >= height * step and image_data.shape[1] >= width * step:
+            blocks = image_data[: height * step, : width * step].reshape(height, step, width, step, *image_data.shape[2:])
+            out = alloc((height, width, *image_data.shape[2:]), image_data.dtype)
+            # 先按 uint32 求和, 再加半数后整除, 四舍五入
+            total = blocks.sum(axis=(1, 3), dtype=np.uint32)
+            np.floor_divide(total + step * step // 2, step * step, out=out, casting="unsafe")
+            return out
+        rows = np.minimum(((np.arange(height) + 0.5) * image_data.shape[0] / height).astype(np.intp), image_data.shape[0] - 1)
+        cols = np.minimum(((np.arange(width) + 0.5) * image_data.shape[1] / width).astype(np.intp), image_data.shape[1] - 1)
+        return image_data[rows[:, None], cols]
+
+
+class SDKBackend(ConversionBackend):
+    """
+    MVS SDK 后端, 通过相机句柄调用:
+      - MV_CC_ConvertPixelTypeEx 解码为 Mono8 / RGB8_Packed / BGR8_Packed, 直接写入 dst, Bayer 插值质量由 MV_CC_SetBayerCvtQuality 设置
+      - MV_CC_RotateImage 旋转, 只支持 Mono8/RGB24/BGR24, 其余回退到 OpenCV
+      - SDK 没有缩放接口, resize 由 OpenCV 完成
+    只输出 8 位图像, 高位深模式回退到 OpenCV
+    """
+    name = "sdk"
+
+    def __init__(self, camera):
+        """
+        :param camera: HikrobotCamera, 已创建句柄
+        """
+        self.camera = camera
+        # cv2 旋转代码 -> SDK 旋转的 90° 次数 (MV_IMAGE_ROTATE_90/180/270), 首次旋转 90° 时标定方向
+        self.rotation_turns: typing.Optional[dict[int, int]] = None
+
+    def supports(self, plan, gray=False, keep_depth=False):
+        return not keep_depth or plan.dtype == np.uint8
+
+    def decode(self, plan, raw, pixel_type, height, width, dst=None, alloc=None, keep_depth=False, gray=False):
+        if alloc is None:
+            alloc = np.empty
+        order = plan.out_order(gray)
+        if dst is None or not dst.flags.c_contiguous:
+            target = alloc(plan.out_shape(height, width, gray), np.uint8)
+        else:
+            target = dst
+        image_data = self.camera.sdk_convert_pixel_type(raw, pixel_type, height, width, target, order)
+        return write_into(image_data, dst)
+
+    def transform(self, transform_plan, image_data, dst=None, alloc=None):
+        rotate_code = transform_plan.rotate_code
+        if (
+                rotate_code is None or (transform_plan.views and dst is None)
+                or image_data.dtype != np.uint8 or image_data.shape[2:] not in ((), (3,))
+        ):
+            return transform_plan.apply(image_data, dst=dst, alloc=alloc)
+        if alloc is None:
+            alloc = np.empty
+
+        resize_plan = dataclasses.replace(transform_plan, rotate_code=None)
+        if transform_plan.resize_first:
+            image_data = resize_plan.apply(image_data, alloc=alloc)
+            return self.rotate(image_data, rotate_code, dst, alloc)
+        image_data = self.rotate(image_data, rotate_code, None, alloc)
+        return resize_plan.apply(image_data, dst=dst, alloc=alloc)
+
+    def rotate(
+            self,
+            image_data: np.ndarray,
+            rotate_code: int,
+            dst: typing.Optional[np.ndarray],
+            alloc: typing.Callable[..., np.ndarray],
+    ) -> np.ndarray:
+        """
+        MV_CC_RotateImage
+        :param image_data:  Mono8 / RGB24 / BGR24
+        :param rotate_code: cv2.ROTATE_*
+        :param dst:
+        :param alloc:
+        :return:
+        """
+        if self.rotation_turns is None:
+            self.rotation_turns = self.calibrate_rotation()
+        image_data = np.ascontiguousarray(image_data)
+        shape = (image_data.shape[1], image_data.shape[0], *image_data.shape[2:]) if rotate_code != cv2.ROTATE_180 else image_data.shape
+        target = dst if dst is not None and dst.flags.c_contiguous else alloc(shape, np.uint8)
+        self.camera.sdk_rotate_image(image_data, self.rotation_turns[rotate_code], target)
+        return write_into(target, dst)
+
+    def calibrate_rotation(self) -> dict[int, int]:
+        """
+        以 2x3 的探针图像确定 MV_IMAGE_ROTATE_90 的方向
+        :return:
+        """
+        probe = np.arange(6, dtype=np.uint8).reshape(2, 3)
+        out = np.empty((3, 2), dtype=np.uint8)
+        self.camera.sdk_rotate_image(probe, 1, out)
+        if np.array_equal(out, np.rot90(probe, ROT90_K[cv2.ROTATE_90_CLOCKWISE])):
+            turns = {cv2.ROTATE_90_CLOCKWISE: 1, cv2.ROTATE_180: 2, cv2.ROTATE_90_COUNTERCLOCKWISE: 3}
+        elif np.array_equal(out, np.rot90(probe, ROT90_K[cv2.ROTATE_90_COUNTERCLOCKWISE])):
+            turns = {cv2.ROTATE_90_CLOCKWISE: 3, cv2.ROTATE_180: 2, cv2.ROTATE_90_COUNTERCLOCKWISE: 1}
+        else:
+            raise RuntimeError(f"unexpected MV_CC_RotateImage result {out.tolist()}")
+        _logger.debug(f"{self.camera.identity} sdk rotation turns {turns}")
+        return turns
+
+
+# 后端名称 -> 后端类
+BACKENDS: dict[str, type[ConversionBackend]] = {
+    OpenCVBackend.name: OpenCVBackend,
+    NumpyBackend.name: NumpyBackend,
+    SDKBackend.name: SDKBackend,
+}
+
+
+def create_backend(name: str, camera=None) -> ConversionBackend:
+    """
+    :param name:    opencv / numpy / sdk
+    :param camera:  HikrobotCamera, sdk 后端需要
+    :return:
+    """
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"conversion backend[{name}] should be one of {list(BACKENDS)}")
+    if backend_cls is SDKBackend:
+        if camera is None:
+            raise ValueError(f"conversion backend[{name}] requires a camera handle")
+        return SDKBackend(camera)
+    return backend_cls()
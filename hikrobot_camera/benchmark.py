@@ -0,0 +1,308 @@
+import time
+import typing
+import functools
+import numpy as np
+import pandas as pd
+import cv2
+
+from .pixel_format import DecodePlan, unpack_10_packed, unpack_12_packed, unpack_packed_to_8, superpixel_demosaic, BAYER_SUPERPIXEL_INDEX
+from .pixel_format import yuv422_to_rgb, YCBCR_709
+from .transform import TransformPlan
+from .backend import BACKENDS, create_backend
+
+# 网卡可用于图像数据的带宽, 字节/秒; 按线速的 95% 估算 (巨帧时以太网及 IP/UDP/GVSP 头开销约 1%, 其余留作余量)
+NIC_EFFICIENCY = 0.95
+NIC_BYTES_PER_SECOND: dict[str, float] = {
+    "1GbE": 1e9 / 8 * NIC_EFFICIENCY,
+    "2.5GbE": 2.5e9 / 8 * NIC_EFFICIENCY,
+    "5GbE": 5e9 / 8 * NIC_EFFICIENCY,
+    "10GbE": 10e9 / 8 * NIC_EFFICIENCY,
+}
+
+
+def timeit(func: typing.Callable, *args, repeat: int = 20, warmup: int = 2, **kwargs) -> float:
+    """
+    测量函数耗时
+    :param func:
+    :param args:
+    :param repeat:  测量次数
+    :param warmup:  预热次数, 不计入结果
+    :param kwargs:
+    :return: 耗时中位数, 秒
+    """
+    for _ in range(warmup):
+        func(*args, **kwargs)
+    costs = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        costs.append(time.perf_counter() - start)
+    return float(np.median(costs))
+
+
+def make_row(name: str, cost: float, pixels: int, **kwargs) -> dict:
+    """
+    测量结果
+    :param name:
+    :param cost:    耗时, 秒
+    :param pixels:  像素个数
+    :param kwargs:  其他列
+    :return:
+    """
+    mega_pixels = pixels / 1e6
+    return {
+        "name": name,
+        **kwargs,
+        "ms": cost * 1000,
+        "ms/MP": cost * 1000 / mega_pixels,
+        "MP/s": mega_pixels / cost,
+    }
+
+
+def pack_pixels(pixels: np.ndarray, bits: int) -> np.ndarray:
+    """
+    将 uint16 像素打包为 GigE Vision Packed 格式, 用于生成测试数据
+    :param pixels:  一维 uint16, 长度为偶数
+    :param bits:    10 或 12
+    :return: 一维 uint8
+    """
+    p0 = pixels[0::2].astype(np.uint16)
+    p1 = pixels[1::2].astype(np.uint16)
+    shift = bits - 8
+    mask = (1 << shift) - 1
+    triplets = np.empty((len(p0), 3), dtype=np.uint8)
+    triplets[:, 0] = p0 >> shift
+    triplets[:, 1] = (p0 & mask) | ((p1 & mask) << 4)
+    triplets[:, 2] = p1 >> shift
+    return triplets.ravel()
+
+
+def benchmark_unpack(width: int = 2448, height: int = 2048, repeat: int = 20) -> pd.DataFrame:
+    """
+    Packed 解码核吞吐量
+    :param width:
+    :param height:
+    :param repeat:
+    :return:
+    """
+    pixels = width * height
+    rng = np.random.default_rng(0)
+    rows = list()
+    for bits, kernel in ((10, unpack_10_packed), (12, unpack_12_packed)):
+        values = rng.integers(0, 1 << bits, pixels, dtype=np.uint16)
+        raw = pack_pixels(values, bits)
+        out16 = np.empty((height, width), dtype=np.uint16)
+        out8 = np.empty((height, width), dtype=np.uint8)
+
+        # 正确性校验
+        if not np.array_equal(kernel(raw, height, width, out16).ravel(), values):
+            raise AssertionError(f"{kernel.__name__} mismatch")
+
+        rows.append(make_row(f"{kernel.__name__} -> uint16", timeit(kernel, raw, height, width, out16, repeat=repeat), pixels, bits=bits, wire_bytes=raw.nbytes))
+        rows.append(make_row(f"{unpack_packed_to_8.__name__} -> uint8", timeit(unpack_packed_to_8, raw, height, width, out8, repeat=repeat), pixels, bits=bits, wire_bytes=raw.nbytes))
+
+        # 对照: 未打包的 16 位格式缩放到 8 位
+        plan = DecodePlan(f"Mono{bits}", dtype=np.uint16, bits=bits)
+        unpacked = values.view(np.uint8)
+        rows.append(make_row(f"Mono{bits} (unpacked) -> uint8", timeit(plan.decode, unpacked, height, width, out8, repeat=repeat), pixels, bits=bits, wire_bytes=unpacked.nbytes))
+
+    return pd.DataFrame(rows)
+
+
+def make_scene(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """
+    生成平滑的随机 RGB 场景, 作为画质对比的真值
+    :param width:
+    :param height:
+    :param seed:
+    :return: (height, width, 3) uint8
+    """
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(height // 16, 2), max(width // 16, 2), 3), dtype=np.uint8)
+    scene = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    # 叠加细节, 避免场景过于平滑
+    detail = rng.integers(-12, 13, (height, width, 3), dtype=np.int16)
+    return np.clip(scene.astype(np.int16) + detail, 0, 255).astype(np.uint8)
+
+
+def mosaic_scene(scene: np.ndarray, order: str) -> np.ndarray:
+    """
+    按 Bayer 排列对 RGB 场景采样
+    :param scene:   (height, width, 3) RGB
+    :param order:   GenICam 排列名称
+    :return: (height, width) uint8
+    """
+    height, width = scene.shape[:2]
+    mosaic = np.empty((height, width), dtype=scene.dtype)
+    # 2x2 单元内位置: 0 -> (0,0), 1 -> (0,1), 2 -> (1,0), 3 -> (1,1)
+    r, g1, g2, b = BAYER_SUPERPIXEL_INDEX[order]
+    for index, channel in ((r, 0), (g1, 1), (g2, 1), (b, 2)):
+        y, x = divmod(index, 2)
+        mosaic[y::2, x::2] = scene[y::2, x::2, channel]
+    return mosaic
+
+
+def benchmark_superpixel(width: int = 2448, height: int = 2048, repeat: int = 20) -> pd.DataFrame:
+    """
+    Bayer 缩放解码: 全分辨率插值 + INTER_AREA 缩小 对比 超像素解码(+ 剩余比例缩小)
+    画质以对真值场景直接缩小的 PSNR 衡量
+    :param width:
+    :param height:
+    :param repeat:
+    :return:
+    """
+    # GenICam 排列 -> OpenCV 插值代码
+    cvt_codes = {"RG": cv2.COLOR_BAYER_BG2RGB, "BG": cv2.COLOR_BAYER_RG2RGB, "GR": cv2.COLOR_BAYER_GB2RGB, "GB": cv2.COLOR_BAYER_GR2RGB}
+    scene = make_scene(width, height)
+    pixels = width * height
+    rows = list()
+    for order, cvt_code in cvt_codes.items():
+        mosaic = mosaic_scene(scene, order)
+        for ratio in (0.5, 0.25):
+            size = (round(width * ratio), round(height * ratio))
+            truth = cv2.resize(scene, size, interpolation=cv2.INTER_AREA)
+
+            def full(size=size):
+                return cv2.resize(cv2.cvtColor(mosaic, cvt_code), size, interpolation=cv2.INTER_AREA)
+
+            def superpixel(size=size):
+                image_data = superpixel_demosaic(mosaic, order)
+                if (image_data.shape[1], image_data.shape[0]) != size:
+                    image_data = cv2.resize(image_data, size, interpolation=cv2.INTER_AREA)
+                return image_data
+
+            for name, func in (("demosaic + resize", full), ("superpixel", superpixel)):
+                rows.append(make_row(name, timeit(func, repeat=repeat), pixels, order=order, ratio=ratio, psnr=cv2.PSNR(truth, func())))
+
+    return pd.DataFrame(rows)
+
+
+def benchmark_transport(width: int = 2448, height: int = 2048, repeat: int = 20) -> pd.DataFrame:
+    """
+    彩色传输格式的端到端帧率: min(网卡可传输的帧率, 主机解码帧率)
+    解码均输出 RGB, 与 HikrobotCamera 的解码方案一致; RGB8_Packed 无需转换, 解码为零拷贝视图
+    :param width:
+    :param height:
+    :param repeat:
+    :return:
+    """
+    pixels = width * height
+    plans = (
+        (DecodePlan("RGB8_Packed", channels=3, out_channels=3), 3),
+        (DecodePlan("BayerRG8", cvt_code=cv2.COLOR_BAYER_BG2RGB, out_channels=3), 1),
+        (DecodePlan("YUV422_Packed", channels=2, cvt_code=cv2.COLOR_YUV2RGB_UYVY, out_channels=3), 2),
+        (DecodePlan("YUV422_YUYV_Packed", channels=2, cvt_code=cv2.COLOR_YUV2RGB_YUYV, out_channels=3), 2),
+        (DecodePlan("YCBCR709_422_8", channels=3, out_channels=3, kernel=functools.partial(yuv422_to_rgb, layout="YUYV", matrix=YCBCR_709)), 2),
+    )
+    rng = np.random.default_rng(0)
+    out = np.empty((height, width, 3), dtype=np.uint8)
+    rows = list()
+    for plan, bytes_per_pixel in plans:
+        frame_bytes = pixels * bytes_per_pixel
+        raw = rng.integers(0, 256, frame_bytes, dtype=np.uint8)
+        cost = timeit(plan.decode, raw, height, width, out, repeat=repeat)
+        decode_fps = 1 / cost
+        rows.append(make_row(
+            plan.name, cost, pixels, bytes_per_pixel=bytes_per_pixel, decode_fps=decode_fps,
+            **{f"fps@{nic}": min(decode_fps, rate / frame_bytes) for nic, rate in NIC_BYTES_PER_SECOND.items()},
+        ))
+    return pd.DataFrame(rows)
+
+
+# 后端测试的像素格式及每像素位数, 与 HikrobotCamera 的解码方案一致
+BACKEND_CASES: tuple[tuple[DecodePlan, int], ...] = (
+    (DecodePlan("Mono8"), 8),
+    (DecodePlan("Mono12_Packed", dtype=np.uint16, bits=12, kernel=unpack_12_packed, kernel8=unpack_packed_to_8), 12),
+    (DecodePlan("BayerRG8", cvt_code=cv2.COLOR_BAYER_BG2RGB, out_channels=3, bayer="RG"), 8),
+    (DecodePlan("RGB8_Packed", channels=3, out_channels=3), 24),
+    (DecodePlan("BGR8_Packed", channels=3, cvt_code=cv2.COLOR_BGR2RGB, out_channels=3), 24),
+    (DecodePlan("YUV422_Packed", channels=2, cvt_code=cv2.COLOR_YUV2RGB_UYVY, out_channels=3), 16),
+)
+
+
+def benchmark_backends(
+        width: int = 2448,
+        height: int = 2048,
+        repeat: int = 20,
+        resize_ratio: typing.Optional[float] = None,
+        rotate_code: typing.Optional[int] = None,
+        camera=None,
+) -> pd.DataFrame:
+    """
+    各后端 解码 + resize/rotation 的耗时, 输出写入预分配的数组
+    不支持的组合(后端会回退到 OpenCV)不计入
+    :param width:
+    :param height:
+    :param repeat:
+    :param resize_ratio:
+    :param rotate_code:     cv2.ROTATE_*
+    :param camera:          已创建句柄的 HikrobotCamera, 给出时同时测试 sdk 后端
+    :return:
+    """
+    transform_plan = TransformPlan.compile(resize_ratio, rotate_code)
+    names = [name for name in BACKENDS if camera is not None or name != "sdk"]
+    backends = [create_backend(name, camera=camera) for name in names]
+    # sdk 后端需要 enPixelType
+    pixel_types = dict()
+    if camera is not None:
+        from .hikrobot_camera import DECODE_PLANS
+        pixel_types = {plan.name: pixel_type for pixel_type, plan in DECODE_PLANS.items()}
+
+    rng = np.random.default_rng(0)
+    pixels = width * height
+    rows = list()
+    for plan, bits in BACKEND_CASES:
+        raw = rng.integers(0, 256, pixels * bits // 8, dtype=np.uint8)
+        pixel_type = pixel_types.get(plan.name)
+        out = np.empty((*transform_plan.out_size(height, width), *plan.out_shape(height, width)[2:]), dtype=np.uint8)
+        for backend in backends:
+            if not backend.supports(plan):
+                continue
+
+            def convert(backend=backend):
+                image_data = backend.decode(plan, raw, pixel_type, height, width)
+                return backend.transform(transform_plan, image_data, dst=out)
+
+            rows.append(make_row(plan.name, timeit(convert, repeat=repeat), pixels, backend=backend.name))
+    return pd.DataFrame(rows)
+
+
+def pick_backends(result: pd.DataFrame) -> dict[str, str]:
+    """
+    每种像素格式最快的后端, 可直接作为 camera_params.yml 中的 conversion_backend
+    :param result: benchmark_backends() 的结果
+    :return:
+    """
+    fastest = result.loc[result.groupby("name")["ms"].idxmin()]
+    return dict(zip(fastest["name"], fastest["backend"]))
+
+
+def run(
+        width: int = 2448,
+        height: int = 2048,
+        repeat: int = 20,
+        resize_ratio: typing.Optional[float] = None,
+        rotate_code: typing.Optional[int] = None,
+        camera=None,
+):
+    """
+    运行全部测试并打印结果
+    :param width:
+    :param height:
+    :param repeat:
+    :param resize_ratio:    后端测试的 resize
+    :param rotate_code:     后端测试的旋转, cv2.ROTATE_*
+    :param camera:          已创建句柄的 HikrobotCamera, 给出时同时测试 sdk 后端
+    :return:
+    """
+    print(f"opencv {cv2.__version__}, numpy {np.__version__}, {width}x{height}, repeat {repeat}")
+    print("\n[unpack]")
+    print(benchmark_unpack(width, height, repeat).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print("\n[bayer resize]")
+    print(benchmark_superpixel(width, height, repeat).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print("\n[transport fps per NIC]")
+    print(benchmark_transport(width, height, repeat).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print(f"\n[conversion backends] resize_ratio[{resize_ratio}] rotate_code[{rotate_code}]")
+    result = benchmark_backends(width, height, repeat, resize_ratio, rotate_code, camera)
+    print(result.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print(f"\nconversion_backend: {pick_backends(result)}")
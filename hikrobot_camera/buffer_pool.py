@@ -0,0 +1,97 @@
+import ctypes
+import typing
+import logging
+import weakref
+import collections
+import numpy as np
+from threading import RLock
+
+_logger = logging.getLogger(__name__)
+
+
+class BufferPool:
+    """
+    预分配的对齐缓存池, 按字节数分组
+    acquire() 返回由 numpy 持有内存的数组, 消费者可以一直持有;
+    该数组及其所有视图都被回收后, 缓存自动归还缓存池, 供下一帧复用
+
+    稳态取流时不再分配内存, 也不需要防御性 copy
+    一帧的处理会用到多种尺寸(原始帧、解码结果、变换中间结果、平场校正、金字塔各层等), 每种尺寸一个分组
+    帧长度变化(ROI / PixelFormat 修改)时按新的字节数分组, 旧分组按 LRU 淘汰;
+    分组个数上限须不少于每帧用到的尺寸种数, 否则各分组被轮流淘汰, 每帧都重新分配
+    """
+
+    def __init__(self, max_buffers: int = 8, alignment: int = 64, max_sizes: int = 16):
+        """
+        :param max_buffers: 每种字节数最多缓存的 buffer 个数, 超出时临时分配, 归还后直接丢弃
+        :param alignment:   内存对齐字节数
+        :param max_sizes:   最多保留的字节数分组个数
+        """
+        self.max_buffers = max_buffers
+        self.alignment = alignment
+        self.max_sizes = max_sizes
+        # 空闲缓存 {nbytes: [block, ...]}
+        self._free: collections.OrderedDict[int, list[np.ndarray]] = collections.OrderedDict()
+        # 已分配缓存个数 {nbytes: count}
+        self._allocated: dict[int, int] = dict()
+        # 回收回调可能在任意线程的 gc 中触发, 使用可重入锁
+        self._lock = RLock()
+
+    def acquire(self, shape: typing.Union[int, tuple[int, ...]], dtype=np.uint8) -> np.ndarray:
+        """
+        从缓存池中取出一块缓存
+        :param shape:
+        :param dtype:
+        :return: 形状为 shape 的 numpy 数组
+        """
+        dtype = np.dtype(dtype)
+        shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+
+        with self._lock:
+            free = self._free.get(nbytes)
+            if free is None:
+                free = self._free[nbytes] = list()
+                self._allocated[nbytes] = 0
+                # 淘汰最久未使用的分组
+                while len(self._free) > self.max_sizes:
+                    old_nbytes, _ = self._free.popitem(last=False)
+                    self._allocated.pop(old_nbytes, None)
+                    _logger.debug(f"buffer pool[{old_nbytes}] evicted, more than {self.max_sizes} sizes in use")
+            else:
+                self._free.move_to_end(nbytes)
+
+            if free:
+                block = free.pop()
+            else:
+                block = self._allocate(nbytes)
+                if self._allocated[nbytes] < self.max_buffers:
+                    self._allocated[nbytes] += 1
+                else:
+                    _logger.debug(f"buffer pool[{nbytes}] exhausted, allocate temporary buffer")
+
+        # 每次取出都包一层 ctypes 数组作为所有权标记:
+        # numpy 视图链都会引用它, 最后一个视图被回收时触发归还
+        token = (ctypes.c_ubyte * nbytes).from_buffer(block)
+        weakref.finalize(token, self._release, block)
+        return np.frombuffer(token, dtype=dtype).reshape(shape)
+
+    def _allocate(self, nbytes: int) -> np.ndarray:
+        """分配对齐内存"""
+        raw = np.empty(nbytes + self.alignment, dtype=np.uint8)
+        offset = -raw.ctypes.data % self.alignment
+        return raw[offset: offset + nbytes]
+
+    def _release(self, block: np.ndarray):
+        """归还缓存"""
+        with self._lock:
+            free = self._free.get(block.nbytes)
+            # 分组已被淘汰或清空, 或临时分配的缓存, 直接丢弃
+            if free is not None and len(free) < self._allocated[block.nbytes]:
+                free.append(block)
+
+    def clear(self):
+        """清空缓存池, 仍被消费者持有的缓存归还时将被丢弃"""
+        with self._lock:
+            self._free.clear()
+            self._allocated.clear()
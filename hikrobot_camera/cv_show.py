@@ -1,10 +1,13 @@
 import cv2
 
+from .frame import Frame
+from .pixel_format import ChannelOrder
+
 
 class CvShow:
     """
     A context manager for displaying images and capturing keyboard input using OpenCV.
-    Supports both RGB and grayscale images.
+    Supports grayscale, RGB and BGR images; only RGB images are converted before display.
     """
     _destroyed = False
 
@@ -28,16 +31,23 @@ class CvShow:
         cv2.destroyAllWindows()
 
     @staticmethod
-    def imshow(image, window="default"):
+    def imshow(image, window="default", channel_order=None):
         """
         Display an image in a named window, converting RGB to BGR if needed.
-        :param image:
+        :param image:   np.ndarray or Frame, the channel order of a Frame is taken from frame.channel_order
         :param window:
+        :param channel_order:   ChannelOrder of an np.ndarray, default RGB (the library's default output order)
         :return:
         """
-        if image.ndim == 3 and image.shape[-1] == 3:
+        if isinstance(image, Frame):
+            if channel_order is None:
+                channel_order = image.channel_order
+            image = image.image
+        if channel_order is None:
+            channel_order = ChannelOrder.RGB
+
+        if image.ndim == 3 and image.shape[-1] == 3 and ChannelOrder(channel_order) == ChannelOrder.RGB:
             # RGB to BGR
-            # image = image[..., ::-1]
             image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
         cv2.imshow(window, image)
 
@@ -0,0 +1,167 @@
+import json
+import typing
+import numpy as np
+import cv2
+
+# 增益的定点小数位数, uint16 增益最大约为 16 倍
+GAIN_SHIFT = 12
+GAIN_MAX = (1 << 16) - 1
+
+
+class FlatFieldCorrection:
+    """
+    平场及暗场校正
+      corrected = (image - dark) * mean(flat - dark) / (flat - dark)
+    校正图以定点数保存: offset 为暗场(与图像同类型), gain 为 uint16 增益, 小数位数为 shift
+    应用时只做整数运算: 饱和减 offset, 乘 gain, 四舍五入右移 shift 位, 截断到图像类型的最大值
+    彩色图像按通道分别以各自的平均值为目标, 不改变白平衡
+
+    校正图与图像几何一一对应, signature 记录学习时的 ROI、Binning/Decimation、rotation、resize_ratio、PixelFormat 及输出形状,
+    相机几何与之不一致时不应使用
+    """
+
+    def __init__(self, offset: np.ndarray, gain: np.ndarray, shift: int = GAIN_SHIFT, signature: typing.Optional[dict] = None):
+        """
+        :param offset:      暗场, 与图像形状、类型相同
+        :param gain:        定点增益, 与图像形状相同, uint16
+        :param shift:       增益的小数位数
+        :param signature:   学习时的几何参数
+        """
+        if offset.shape != gain.shape:
+            raise ValueError(f"flat field offset shape{offset.shape} and gain shape{gain.shape} are different")
+        if offset.dtype not in (np.uint8, np.uint16):
+            raise TypeError(f"flat field offset dtype[{offset.dtype}] should be uint8 or uint16")
+        self.offset = np.ascontiguousarray(offset)
+        self.gain = np.ascontiguousarray(gain, dtype=np.uint16)
+        self.shift = int(shift)
+        # 与 save()/load() 往返后一致, tuple 统一为 list
+        self.signature = None if signature is None else json.loads(json.dumps(signature))
+        # 最大值及四舍五入的偏置
+        self.max_value = np.iinfo(offset.dtype).max
+        self.half = 1 << (self.shift - 1) if self.shift > 0 else 0
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.offset.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.offset.dtype
+
+    @staticmethod
+    def average(grab: typing.Callable[[], np.ndarray], n: int) -> np.ndarray:
+        """
+        连续获取 n 帧并求平均
+        :param grab:    获取一帧的函数, 如 camera.get_one_frame
+        :param n:       帧数
+        :return: float64 平均图像
+        """
+        if n <= 0:
+            raise ValueError(f"average frames n[{n}] must be positive")
+        image = grab()
+        # uint8/uint16 累加 n 帧不会超出 uint64
+        total = image.astype(np.uint64)
+        for _ in range(n - 1):
+            image = grab()
+            if image.shape != total.shape:
+                raise ValueError(f"frame shape changed from {total.shape} to {image.shape} while averaging")
+            np.add(total, image, out=total)
+        return total / n
+
+    @classmethod
+    def from_frames(
+            cls,
+            flat: np.ndarray,
+            dark: typing.Optional[np.ndarray] = None,
+            dtype: typing.Union[np.dtype, type] = np.uint8,
+            signature: typing.Optional[dict] = None,
+    ) -> typing.Self:
+        """
+        由平均后的平场、暗场计算校正图
+        :param flat:        均匀照明下的平均图像
+        :param dark:        无光照时的平均图像, None 表示不做暗场校正
+        :param dtype:       图像类型, uint8 或 uint16
+        :param signature:   几何参数
+        :return:
+        """
+        dtype = np.dtype(dtype)
+        if dark is None:
+            dark = np.zeros_like(flat, dtype=np.float64)
+        elif dark.shape != flat.shape:
+            raise ValueError(f"dark frame shape{dark.shape} and flat frame shape{flat.shape} are different")
+
+        offset = np.clip(np.rint(dark), 0, np.iinfo(dtype).max).astype(dtype)
+        response = flat - offset
+        # 按通道取平均值为目标, 无响应的像素增益为 1
+        target = response.mean(axis=(0, 1), keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gain = np.where(response > 0, target / response, 1.0)
+        gain = np.clip(np.rint(gain * (1 << GAIN_SHIFT)), 0, GAIN_MAX).astype(np.uint16)
+        return cls(offset, gain, GAIN_SHIFT, signature)
+
+    def save(self, path: str):
+        """
+        保存校正图, np.savez 格式
+        :param path:
+        :return:
+        """
+        np.savez(
+            path, offset=self.offset, gain=self.gain, shift=np.array(self.shift),
+            signature=np.array(json.dumps(self.signature)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> typing.Self:
+        """
+        读取 save() 保存的校正图
+        :param path:
+        :return:
+        """
+        with np.load(path) as data:
+            return cls(data["offset"], data["gain"], int(data["shift"]), json.loads(str(data["signature"])))
+
+    def mismatch(self, signature: dict) -> dict[str, tuple]:
+        """
+        与当前几何参数不一致的项
+        :param signature:
+        :return: {key: (学习时, 当前)}, 为空表示一致
+        """
+        if self.signature is None:
+            return dict()
+        current = json.loads(json.dumps(signature))
+        return {
+            key: (self.signature.get(key), value) for key, value in current.items()
+            if self.signature.get(key) != value
+        }
+
+    def apply(
+            self,
+            image: np.ndarray,
+            dst: typing.Optional[np.ndarray] = None,
+            alloc: typing.Optional[typing.Callable[..., np.ndarray]] = None,
+    ) -> np.ndarray:
+        """
+        校正图像
+        :param image:   与校正图形状、类型相同
+        :param dst:     输出数组, 可以是 image 本身, 缺省由 alloc 分配
+        :param alloc:   中间结果及输出数组的分配函数 alloc(shape, dtype), 缺省为 np.empty
+        :return:
+        """
+        if image.shape != self.offset.shape or image.dtype != self.offset.dtype:
+            raise ValueError(
+                f"image{image.shape}[{image.dtype}] doesn't match flat field{self.offset.shape}[{self.offset.dtype}]"
+            )
+        if alloc is None:
+            alloc = np.empty
+        if dst is None:
+            dst = alloc(image.shape, image.dtype)
+
+        # 饱和减法, 低于暗场的像素为 0
+        diff = cv2.subtract(np.ascontiguousarray(image), self.offset, dst=alloc(image.shape, image.dtype))
+        product = alloc(image.shape, np.uint32)
+        np.multiply(diff, self.gain, out=product, dtype=np.uint32)
+        product += self.half
+        product >>= self.shift
+        np.minimum(product, self.max_value, out=product)
+        np.copyto(dst, product, casting="unsafe")
+        return dst
@@ -0,0 +1,369 @@
+import time
+import typing
+import logging
+import numpy as np
+import cv2
+
+from .pixel_format import ChannelOrder
+
+_logger = logging.getLogger(__name__)
+
+
+class Frame:
+    """
+    一帧图像及其帧信息
+    将 MV_FRAME_OUT_INFO_EX 中常用字段解码为紧凑的 __slots__ 属性, 不再依赖被逐帧覆盖的 camera.stFrameInfo,
+    下游处理无需持有相机锁即可获取时间戳、丢包数等信息
+
+    惰性解码:
+        取流时只保存原始数据 raw, 首次访问 image / decoded / gray / bgr / rois / level() 时才解码并缓存结果,
+        只归档原始数据或被丢弃的帧不消耗解码 CPU
+        解码使用取流时的几何快照 geometry (ROI 裁剪、resize/rotation、命名区域、平场校正图), 取流后修改相机设置不影响已取到的帧;
+        多线程同时首次访问时可能重复解码, 结果相同
+
+    通道顺序:
+        channel_order 标记 image / decoded 的通道顺序 (GRAY / RGB / BGR), 消费者(如 CvShow)据此只在需要时转换
+    """
+    __slots__ = (
+        "raw", "_camera", "_channel_order", "geometry",
+        "_image", "_decoded", "_gray", "_bgr", "_rois", "_pyramid",
+        "frame_num", "width", "height", "pixel_type", "frame_len",
+        "dev_timestamp", "host_timestamp", "arrival",
+        "exposure_time", "gain", "average_brightness",
+        "frame_counter", "trigger_index", "lost_packet",
+        "offset_x", "offset_y",
+    )
+
+    # 帧信息结构化数组类型, 用于连拍等批量保存帧信息
+    INFO_DTYPE = np.dtype([
+        ("frame_num", np.uint32), ("width", np.uint32), ("height", np.uint32),
+        ("pixel_type", np.int64), ("frame_len", np.uint64),
+        ("dev_timestamp", np.uint64), ("host_timestamp", np.int64), ("arrival", np.float64),
+        ("exposure_time", np.float32), ("gain", np.float32), ("average_brightness", np.uint32),
+        ("frame_counter", np.uint32), ("trigger_index", np.uint32), ("lost_packet", np.uint32),
+        ("offset_x", np.uint32), ("offset_y", np.uint32),
+    ])
+
+    def __init__(
+            self,
+            image: typing.Optional[np.ndarray],
+            stFrameInfo,
+            raw: typing.Optional[np.ndarray] = None,
+            camera=None,
+            channel_order: typing.Optional[ChannelOrder] = None,
+            geometry=None,
+    ):
+        """
+        :param image:       调整后的图像, 为 None 时由 raw 惰性解码
+        :param stFrameInfo: MV_FRAME_OUT_INFO_EX, 只读取字段, 不保留引用
+        :param raw:         一维 uint8 原始数据, 长度为 nFrameLen
+        :param camera:      HikrobotCamera, 提供解码方案及 resize/rotation 设置
+        :param channel_order:   image 的通道顺序, 缺省由相机的解码方案确定
+        :param geometry:    FrameGeometry, 取流时相机的几何快照, 缺省为解码时相机的当前设置
+        """
+        # 原始数据
+        self.raw = raw
+        self._camera = camera
+        self.geometry = geometry
+        self._channel_order = channel_order
+        # 惰性计算的结果
+        self._image = image
+        self._decoded: typing.Optional[np.ndarray] = None
+        self._gray: typing.Optional[np.ndarray] = None
+        self._bgr: typing.Optional[np.ndarray] = None
+        self._rois: typing.Optional[dict[str, np.ndarray]] = None
+        self._pyramid: typing.Optional[list[np.ndarray]] = None
+        # 帧号
+        self.frame_num: int = stFrameInfo.nFrameNum
+        # 原始图像宽高、像素格式、帧长度
+        self.width: int = stFrameInfo.nWidth
+        self.height: int = stFrameInfo.nHeight
+        self.pixel_type: int = stFrameInfo.enPixelType
+        self.frame_len: int = stFrameInfo.nFrameLen
+        # 设备时间戳 (高32位 + 低32位)
+        self.dev_timestamp: int = (stFrameInfo.nDevTimeStampHigh << 32) | stFrameInfo.nDevTimeStampLow
+        # 主机生成的时间戳, 毫秒
+        self.host_timestamp: int = stFrameInfo.nHostTimeStamp
+        # 本进程收到该帧的时间, time.monotonic()
+        self.arrival: float = time.monotonic()
+        # 曝光时间、增益、平均亮度
+        self.exposure_time: float = stFrameInfo.fExposureTime
+        self.gain: float = stFrameInfo.fGain
+        self.average_brightness: int = stFrameInfo.nAverageBrightness
+        # 帧计数、触发计数、本帧丢包数
+        self.frame_counter: int = stFrameInfo.nFrameCounter
+        self.trigger_index: int = stFrameInfo.nTriggerIndex
+        self.lost_packet: int = stFrameInfo.nLostPacket
+        # ROI 偏移
+        self.offset_x: int = stFrameInfo.nOffsetX
+        self.offset_y: int = stFrameInfo.nOffsetY
+
+    def __repr__(self):
+        return f"Frame(frame_num={self.frame_num}, size={self.width}x{self.height}, dev_timestamp={self.dev_timestamp}, lost_packet={self.lost_packet})"
+
+    def info_record(self) -> tuple:
+        """
+        帧信息元组, 字段顺序与 INFO_DTYPE 一致, 可直接赋值给结构化数组: info[i] = frame.info_record()
+        :return:
+        """
+        return (
+            self.frame_num, self.width, self.height,
+            self.pixel_type, self.frame_len,
+            self.dev_timestamp, self.host_timestamp, self.arrival,
+            self.exposure_time, self.gain, self.average_brightness,
+            self.frame_counter, self.trigger_index, self.lost_packet,
+            self.offset_x, self.offset_y,
+        )
+
+    @property
+    def age_ms(self) -> float:
+        """距收到该帧的时间, 毫秒"""
+        return (time.monotonic() - self.arrival) * 1000
+
+    def _require_raw(self):
+        if self.raw is None or self._camera is None:
+            raise RuntimeError(f"frame[{self.frame_num}] has no raw data to decode")
+
+    @property
+    def channel_order(self) -> ChannelOrder:
+        """
+        image / decoded 的通道顺序
+        没有相机时按 image 推断: 单通道为 GRAY, 否则为本库的缺省顺序 RGB
+        """
+        if self._channel_order is None:
+            if self.geometry is not None and self.geometry.decode_plan is not None:
+                self._channel_order = self.geometry.decode_plan.out_order()
+            elif self._camera is not None:
+                self._channel_order = self._camera.get_channel_order(self.pixel_type)
+            elif self._image is not None and self._image.ndim == 2:
+                self._channel_order = ChannelOrder.GRAY
+            else:
+                self._channel_order = ChannelOrder.RGB
+        return self._channel_order
+
+    @property
+    def is_decoded(self) -> bool:
+        """image 是否已计算"""
+        return self._image is not None
+
+    @property
+    def image(self) -> typing.Optional[np.ndarray]:
+        """调整后(resize, rotation)的图像, 与 get_one_frame() 返回值一致"""
+        if self._image is None and self.raw is not None:
+            self._image = self.render()
+        return self._image
+
+    @image.setter
+    def image(self, image: typing.Optional[np.ndarray]):
+        self._image = image
+        self._pyramid = None
+        self._rois = None
+
+    @property
+    def resized(self) -> typing.Optional[np.ndarray]:
+        """同 image"""
+        return self.image
+
+    @property
+    def contiguous(self) -> typing.Optional[np.ndarray]:
+        """
+        C 连续的 image
+        视图模式(geometry_views)下 image 可能是跨步视图, 需要连续内存时在此复制一次并替换缓存
+        """
+        image = self.image
+        if image is not None and not image.flags.c_contiguous:
+            image = np.ascontiguousarray(image)
+            self._image = image
+        return image
+
+    def level(self, n: int) -> typing.Optional[np.ndarray]:
+        """
+        图像金字塔第 n 层, 尺寸为 image 的 1/2**n, 第 0 层即 image
+        惰性计算并缓存, 每层由上一层 2x2 平均(INTER_AREA)得到, 不再从全分辨率缩小; 奇数尺寸舍弃最后一行/列
+        :param n:
+        :return:
+        """
+        if n < 0:
+            raise ValueError(f"pyramid level[{n}] should not be negative")
+        pyramid = self._pyramid
+        if pyramid is None:
+            image = self.image
+            if image is None:
+                return None
+            pyramid = self._pyramid = [image]
+        while len(pyramid) <= n:
+            previous = pyramid[-1]
+            height, width = previous.shape[0] // 2, previous.shape[1] // 2
+            if height == 0 or width == 0:
+                raise ValueError(f"pyramid level[{len(pyramid)}] of frame[{self.frame_num}] is empty")
+            shape = (height, width, *previous.shape[2:])
+            if self._camera is None:
+                dst = np.empty(shape, previous.dtype)
+            else:
+                dst = self._camera.buffer_pool.acquire(shape, previous.dtype)
+            pyramid.append(cv2.resize(previous[: height * 2, : width * 2], (width, height), dst=dst, interpolation=cv2.INTER_AREA))
+        return pyramid[n]
+
+    @property
+    def preview(self) -> typing.Optional[np.ndarray]:
+        """预览图, 即金字塔第 preview_level 层 (camera_params.yml), 未设置时为 image"""
+        preview_level = None if self._camera is None else self._camera.preview_level
+        return self.image if not preview_level else self.level(preview_level)
+
+    @property
+    def decoded(self) -> np.ndarray:
+        """原始尺寸(设置 ROI 时为 ROI 尺寸)的解码图像, 通道顺序见 channel_order"""
+        if self._decoded is None:
+            self._require_raw()
+            self._decoded = self._camera.decode_raw(self.raw, self.pixel_type, self.height, self.width, geometry=self.geometry)
+        return self._decoded
+
+    @property
+    def gray(self) -> np.ndarray:
+        """原始尺寸的灰度图, Bayer 格式直接由原始数据计算, 不经过彩色插值"""
+        if self._gray is None:
+            decoded = self._decoded
+            if decoded is not None and decoded.ndim == 2:
+                self._gray = decoded
+            else:
+                self._require_raw()
+                self._gray = self._camera.decode_raw(
+                    self.raw, self.pixel_type, self.height, self.width, gray=True, geometry=self.geometry
+                )
+        return self._gray
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """原始尺寸的 BGR 图像, 可直接用于 OpenCV; 已解码为 BGR 时不再转换"""
+        if self._bgr is None:
+            decoded = self.decoded
+            channel_order = self.channel_order
+            if channel_order == ChannelOrder.BGR:
+                self._bgr = decoded
+            else:
+                dst = self._camera.buffer_pool.acquire((*decoded.shape[:2], 3), decoded.dtype)
+                code = cv2.COLOR_GRAY2BGR if channel_order == ChannelOrder.GRAY else cv2.COLOR_RGB2BGR
+                self._bgr = cv2.cvtColor(decoded, code, dst=dst)
+        return self._bgr
+
+    @property
+    def rois(self) -> dict[str, np.ndarray]:
+        """
+        命名区域 (camera_params.yml 中的 named_rois), 坐标已经过 resize/rotation 映射
+        为 image 上的零拷贝视图; roi_only 模式且尚未计算 image 时只处理各区域的外接矩形
+        """
+        if self._rois is None:
+            camera = self._camera
+            if camera is None:
+                raise RuntimeError(f"frame[{self.frame_num}] has no camera to locate named rois")
+            if camera.roi_only and self._image is None:
+                self._require_raw()
+                self._rois = camera.render_rois(self.raw, self.pixel_type, self.height, self.width, geometry=self.geometry)
+            else:
+                self._rois = camera.crop_named_rois(self.image, self.height, self.width, geometry=self.geometry)
+        return self._rois
+
+    def render(self, dst: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        计算调整后的图像
+        :param dst: 输出数组, 如连拍数组 out[i]; 已计算 image 时复制到 dst
+        :return:
+        """
+        if self._image is not None:
+            if dst is None:
+                return self._image
+            np.copyto(dst, self._image)
+            return dst
+        self._require_raw()
+        if self._decoded is not None:
+            return self._camera.adjust_image(self._decoded, dst=dst, geometry=self.geometry)
+        # 未缓存 decoded 时由原始数据直接计算, 可使用超像素等快速路径
+        return self._camera.render_raw(self.raw, self.pixel_type, self.height, self.width, dst=dst, geometry=self.geometry)
+
+
+class FrameLease:
+    """
+    SDK 图像缓存租约 (GrabMethod.GetImageBuffer)
+    将 MV_CC_GetImageBuffer 取到的 SDK 缓存直接包装为 numpy 视图, 不做 memcpy
+    只有在 release() 时才调用 MV_CC_FreeImageBuffer 归还缓存
+
+    注意:
+        - 租约释放后, raw / image 等视图指向的内存将被 SDK 复用, 不得再访问
+        - 未释放的租约会占用 SDK 缓存节点, 节点耗尽后将无法继续取流, 可通过 image_node_num 调整节点个数
+
+    用法:
+        with camera.get_one_frame_lease() as lease:
+            process(lease.image)
+    """
+    __slots__ = ("_camera", "_stOutFrame", "_generation", "_raw", "_released")
+
+    def __init__(self, camera, stOutFrame, generation: int = 0):
+        """
+        :param camera:      HikrobotCamera
+        :param stOutFrame:  MV_CC_GetImageBuffer 填充后的 MV_FRAME_OUT
+        :param generation:  取得租约时相机的取流代数, 停止取流后的租约不再归还
+        """
+        self._camera = camera
+        self._stOutFrame = stOutFrame
+        self._generation = generation
+        self._released = False
+        # 直接引用 SDK 缓存, 零拷贝
+        self._raw: np.ndarray = np.ctypeslib.as_array(stOutFrame.pBufAddr, shape=(stOutFrame.stFrameInfo.nFrameLen,))
+
+    def __enter__(self) -> typing.Self:
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.release()
+
+    def __del__(self):
+        # 兜底: 租约被回收时仍未释放
+        # gc 可能发生在已持有相机取流锁的线程中, 不能加锁, 交由下一次取流归还
+        if not self._released:
+            _logger.warning(f"{self._camera.identity} frame lease[{self.stFrameInfo.nFrameNum}] is garbage collected without release")
+            self._released = True
+            self._raw = None
+            self._camera.defer_free_frame_lease(self._stOutFrame, self._generation)
+
+    def release(self):
+        """归还 SDK 缓存, 可重复调用"""
+        if self._released:
+            return
+        self._released = True
+        self._raw = None
+        self._camera.free_frame_lease(self._stOutFrame, self._generation)
+
+    @property
+    def released(self) -> bool:
+        """租约是否已释放"""
+        return self._released
+
+    @property
+    def stFrameInfo(self):
+        """帧信息 MV_FRAME_OUT_INFO_EX"""
+        return self._stOutFrame.stFrameInfo
+
+    @property
+    def raw(self) -> np.ndarray:
+        """SDK 缓存的一维 uint8 视图, 长度为 nFrameLen"""
+        if self._released:
+            raise RuntimeError("frame lease has been released")
+        return self._raw
+
+    @property
+    def image(self) -> np.ndarray:
+        """
+        转换并调整后的图像
+        Mono8/RGB8_Packed 且无需 resize/rotation 时为 SDK 缓存上的视图, 其余情况为新数组
+        """
+        stFrameInfo = self.stFrameInfo
+        return self._camera.render_raw(self.raw, stFrameInfo.enPixelType, stFrameInfo.nHeight, stFrameInfo.nWidth)
+
+    @property
+    def frame(self) -> Frame:
+        """转换后的图像及帧信息, 图像为 SDK 缓存上的视图时复制一次, 租约释放后仍可使用"""
+        stFrameInfo = self.stFrameInfo
+        image = self.image
+        if np.may_share_memory(image, self._raw):
+            image = image.copy()
+        return Frame(image, stFrameInfo, channel_order=self._camera.get_channel_order(stFrameInfo.enPixelType))
@@ -0,0 +1,127 @@
+import enum
+import queue
+import asyncio
+import typing
+import collections
+from threading import Condition
+
+
+class DropPolicy(enum.IntEnum):
+    """
+    帧队列已满时的处理策略
+    0 -> 丢弃最旧的帧, 1 -> 丢弃最新的帧, 2 -> 阻塞生产者直到有空位
+    """
+    DropOldest = 0
+    DropNewest = 1
+    Block = 2
+
+
+class FrameQueue:
+    """
+    线程安全的有界帧队列
+    被动取流(GrabMethod.RegisterImageCallBackEx)时由 SDK 回调线程写入, 消费者线程读取
+    """
+
+    def __init__(self, maxsize: int = 4, policy: DropPolicy = DropPolicy.DropOldest):
+        """
+        :param maxsize: 队列长度, 须大于0
+        :param policy:  队列已满时的处理策略
+        """
+        if maxsize <= 0:
+            raise ValueError(f"frame queue maxsize[{maxsize}] must be positive")
+        self.maxsize = maxsize
+        self.policy = DropPolicy(policy)
+        # 丢弃的帧数
+        self.dropped = 0
+        self._items: collections.deque = collections.deque()
+        self._cond = Condition()
+
+    def put(self, item: typing.Any, timeout: typing.Optional[float] = None) -> bool:
+        """
+        写入一帧
+        :param item:
+        :param timeout: 仅 DropPolicy.Block 有效, 等待空位的超时时间(秒), None 表示一直等待, 超时后丢弃该帧
+        :return: 该帧是否写入队列
+        """
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == DropPolicy.DropOldest:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.policy == DropPolicy.DropNewest:
+                    self.dropped += 1
+                    return False
+                else:
+                    if not self._cond.wait_for(lambda: len(self._items) < self.maxsize, timeout=timeout):
+                        self.dropped += 1
+                        return False
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout: typing.Optional[float] = None) -> typing.Any:
+        """
+        读取最早的一帧
+        :param timeout: 超时时间(秒), None 表示一直等待
+        :return:
+        :raise queue.Empty: 超时
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: len(self._items) > 0, timeout=timeout):
+                raise queue.Empty
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def clear(self):
+        """清空队列"""
+        with self._cond:
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class AsyncFrameQueue:
+    """
+    取流线程 -> asyncio 事件循环 的帧队列
+    put_threadsafe() 在取流线程(SDK回调线程或后台取流线程)中调用, 通过 loop.call_soon_threadsafe 投递帧;
+    队列已满时丢弃最旧的帧, 不会阻塞取流线程
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = 4):
+        """
+        :param loop:    事件循环
+        :param maxsize: 队列长度, 须大于0
+        """
+        if maxsize <= 0:
+            raise ValueError(f"frame queue maxsize[{maxsize}] must be positive")
+        self.loop = loop
+        # 丢弃的帧数
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def put_threadsafe(self, item: typing.Any):
+        """
+        在其他线程中写入一帧
+        :param item:
+        :return:
+        """
+        self.loop.call_soon_threadsafe(self._put, item)
+
+    def _put(self, item: typing.Any):
+        """在事件循环中写入一帧"""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    async def get(self, timeout: typing.Optional[float] = None) -> typing.Any:
+        """
+        读取最早的一帧
+        :param timeout: 超时时间(秒), None 表示一直等待
+        :return:
+        :raise asyncio.TimeoutError: 超时
+        """
+        return await asyncio.wait_for(self._queue.get(), timeout=timeout)
@@ -0,0 +1,65 @@
+import typing
+from threading import Condition
+
+from .frame import Frame
+
+
+class LatestFrameSlot:
+    """
+    双缓冲的最新帧槽
+    取流线程写入后台槽位后翻转索引, 读者只拿到引用, 不持有锁处理图像;
+    因此读者不必等待曝光和传输, 取流线程也不会被慢速读者阻塞
+    """
+
+    def __init__(self):
+        self._slots: list[typing.Optional[Frame]] = [None, None]
+        # 当前最新帧所在槽位
+        self._index = 0
+        self._cond = Condition()
+
+    def publish(self, frame: Frame):
+        """
+        发布一帧
+        :param frame:
+        :return:
+        """
+        back = self._index ^ 1
+        self._slots[back] = frame
+        with self._cond:
+            self._index = back
+            self._cond.notify_all()
+
+    def latest(self, max_age_ms: typing.Optional[float] = None) -> typing.Optional[Frame]:
+        """
+        获取最新帧, 不阻塞
+        :param max_age_ms: 最大帧龄, 超过时返回 None; None 表示不限制
+        :return:
+        """
+        frame = self._slots[self._index]
+        if frame is None:
+            return None
+        if max_age_ms is not None and frame.age_ms > max_age_ms:
+            return None
+        return frame
+
+    def wait_newer(self, than_frame_num: int, timeout: typing.Optional[float] = None) -> typing.Optional[Frame]:
+        """
+        等待帧号大于 than_frame_num 的帧
+        :param than_frame_num:  重新开始取流后帧号从头计数, 此时可传入 -1
+        :param timeout:         超时时间(秒), None 表示一直等待
+        :return: 超时返回 None
+        """
+        def newer() -> bool:
+            frame = self._slots[self._index]
+            return frame is not None and frame.frame_num > than_frame_num
+
+        with self._cond:
+            if not self._cond.wait_for(newer, timeout=timeout):
+                return None
+            return self._slots[self._index]
+
+    def clear(self):
+        """清空"""
+        with self._cond:
+            self._slots = [None, None]
+            self._index = 0
@@ -1,19 +1,35 @@
 import sys
 import os
+import time
+import queue
+import asyncio
 import subprocess
 import typing
 import ctypes
 import enum
+import functools
 import pandas as pd
 import numpy as np
 import cv2
 import yaml
 import logging
 import dataclasses
-from threading import Lock
+import contextlib
+import collections
+import threading
+from threading import Lock, Thread, Event
 
 from .multi_hikrobot_cameras import MultiHikrobotCameras
 from .hik_error_map import HikErrorMap
+from .frame import Frame, FrameLease
+from .buffer_pool import BufferPool
+from .frame_queue import FrameQueue, AsyncFrameQueue, DropPolicy
+from .grabber import LatestFrameSlot
+from .transform import TransformPlan, write_into
+from .pixel_format import ChannelOrder, DecodePlan, unpack_10_packed, unpack_12_packed, unpack_packed_to_8, tone_lut, tone_map, build_adjust_lut, apply_lut
+from .pixel_format import yuv422_to_rgb, YCBCR_FULL_601, YCBCR_709
+from .backend import ConversionBackend, OpenCVBackend, SDKBackend, BACKENDS, create_backend
+from .flat_field import FlatFieldCorrection
 from . import utils
 
 _logger = logging.getLogger(__name__)
@@ -119,6 +135,22 @@ class CreateHandleMethod(enum.IntEnum):
     Direct = 0
     Enum = 1
 
+def _check_adjust_params(gamma: typing.Optional[float], contrast: typing.Optional[float], sdk_gamma: bool):
+    """
+    校验查找表参数
+    :param gamma:
+    :param contrast:
+    :param sdk_gamma:
+    :return:
+    """
+    if gamma is not None and gamma <= 0:
+        raise ValueError(f"gamma[{gamma}] must be positive")
+    if contrast is not None and contrast < 0:
+        raise ValueError(f"contrast[{contrast}] should not be negative")
+    # MV_CC_SetGammaValue 的取值范围
+    if sdk_gamma and gamma is not None and not 0.1 <= gamma <= 4.0:
+        raise ValueError(f"gamma[{gamma}] should be in [0.1, 4.0] when sdk_gamma is enabled")
+
 @dataclasses.dataclass
 class CameraCustomParams:
     # 相机ip
@@ -143,6 +175,44 @@ class CameraCustomParams:
     multicast_ip: str = None
     # 组播port
     multicast_port: int = 1042
+    # SDK 图像缓存节点个数, 为 None 时使用 SDK 默认值; 使用 FrameLease 同时持有多帧时需要调大
+    image_node_num: typing.Optional[int] = None
+    # 帧缓存池中每种帧长度最多缓存的 buffer 个数
+    buffer_pool_size: int = 8
+    # 帧缓存池最多保留的字节数分组个数, 须不少于每帧用到的数组尺寸种数(原始帧、解码、变换中间结果、平场校正、金字塔各层等)
+    buffer_pool_groups: int = 16
+    # 被动取流帧队列长度
+    frame_queue_size: int = 4
+    # 被动取流帧队列已满时的处理策略, 0 -> 丢弃最旧的帧, 1 -> 丢弃最新的帧, 2 -> 阻塞SDK回调线程
+    frame_queue_policy: DropPolicy = DropPolicy.DropOldest
+    # 高位深模式, Mono10/12/16、Bayer10/12/16 等格式保持 uint16 完成解码、resize、rotation, 按需调用 tone_map 转为 8 位
+    high_bit_depth: bool = False
+    # 视图模式, 旋转为 np.rot90 跨步视图, 整数倍缩小为 [::k, ::k] 切片, 不复制数据
+    geometry_views: bool = False
+    # 相机端变换, 180° 旋转由 ReverseX/ReverseY 完成, 缩小由 Binning(优先) 或 Decimation 完成, 主机只处理剩余部分
+    sensor_offload: bool = False
+    # 感兴趣区域 (offset_x, offset_y, width, height), 以未 binning 的传感器像素计, 为 None 时使用整幅图像
+    roi: typing.Optional[tuple[int, int, int, int]] = None
+    # 彩色图像输出的通道顺序, "RGB" 或 "BGR", 通道交换融合到解码中
+    output_channel_order: ChannelOrder = ChannelOrder.RGB
+    # 解码及变换后端, "opencv" / "numpy" / "sdk", 或按像素格式名称指定 {"BayerRG8": "sdk", "default": "opencv"}
+    conversion_backend: typing.Union[str, dict[str, str]] = OpenCVBackend.name
+    # SDK 后端的 Bayer 插值质量, 0 -> 快速, 1 -> 均衡, 2 -> 最优, 3 -> 最优+, 为 None 时使用 SDK 默认值
+    sdk_bayer_cvt_quality: typing.Optional[int] = None
+    # 命名区域 {name: (x, y, width, height)}, 以解码后(硬件 ROI 裁剪后, resize/rotation 前)的图像坐标计, 由 Frame.rois 以视图给出
+    named_rois: typing.Optional[dict[str, tuple[int, int, int, int]]] = None
+    # 只处理命名区域, Frame.rois 只解码、变换各区域的外接矩形, 不计算整幅图像
+    roi_only: bool = False
+    # 预览图的金字塔层数, Frame.preview 为 image 的 1/2**preview_level, 由 Frame.level() 逐层缩小并缓存; 为 None 时预览图即 image
+    preview_level: typing.Optional[int] = None
+    # 查找表调整, 在 resize/rotation 之后对输出图像逐像素查表, 不做浮点运算; 均为 None 时跳过
+    # gamma 大于 1 提亮暗部, contrast 为以中灰为中心的对比度倍数, 1.0 均为不变
+    gamma: typing.Optional[float] = None
+    contrast: typing.Optional[float] = None
+    # gamma 交给 SDK 完成 (MV_CC_SetGammaValue), 只在 SDK 后端解码 Mono8 或 Bayer -> RGB/BGR 时生效, 其余情况仍查表完成
+    sdk_gamma: bool = False
+    # 平场校正图路径 (FlatFieldCorrection.save 保存的 .npz), 在 resize/rotation 之后、查表之前校正; 为 None 时不校正
+    flat_field: typing.Optional[str] = None
 
     def __post_init__(self):
         if isinstance(self.access_mode, int):
@@ -157,6 +227,34 @@ class CameraCustomParams:
         if isinstance(self.rotation, int):
             self.rotation = Rotation(self.rotation)
 
+        if isinstance(self.frame_queue_policy, int):
+            self.frame_queue_policy = DropPolicy(self.frame_queue_policy)
+
+        if self.roi is not None:
+            self.roi = tuple(int(v) for v in self.roi)
+
+        self.output_channel_order = ChannelOrder(self.output_channel_order)
+        if self.output_channel_order == ChannelOrder.GRAY:
+            raise ValueError(f"output_channel_order[{self.output_channel_order.value}] should be RGB or BGR")
+
+        if self.named_rois is not None:
+            self.named_rois = {str(name): tuple(int(v) for v in rect) for name, rect in self.named_rois.items()}
+            for name, rect in self.named_rois.items():
+                if len(rect) != 4 or rect[0] < 0 or rect[1] < 0 or rect[2] <= 0 or rect[3] <= 0:
+                    raise ValueError(f"named roi[{name}]{rect} error, expected (x, y, width, height)")
+        if self.roi_only and not self.named_rois:
+            raise ValueError("roi_only requires named_rois")
+
+        if self.preview_level is not None and self.preview_level < 0:
+            raise ValueError(f"preview_level[{self.preview_level}] should not be negative")
+
+        _check_adjust_params(self.gamma, self.contrast, self.sdk_gamma)
+
+        names = self.conversion_backend.values() if isinstance(self.conversion_backend, dict) else (self.conversion_backend,)
+        for name in names:
+            if name not in BACKENDS:
+                raise ValueError(f"conversion_backend[{name}] should be one of {list(BACKENDS)}")
+
         # 根据 ip 确定 host ip
         if isinstance(self.host_ip, str):
             self.host_ip = self.host_ip.strip()
@@ -168,6 +266,111 @@ class CameraCustomParams:
             self.multicast_ip = f"239.192.1.{self._ip.split('.')[3]}"
 
 
+def _bayer_plans(order: str, cv_order: str) -> dict[int, DecodePlan]:
+    """
+    同一 Bayer 排列的 8/10/12/16 位及 10/12 位 Packed 解码方案
+    :param order:       GenICam 排列名称, 以 (0,0) 像素起
+    :param cv_order:    OpenCV 排列名称, 以 (1,1) 像素起
+    :return:
+    """
+    cvt_code = getattr(cv2, f"COLOR_BAYER_{cv_order}2RGB")
+    gray_code = getattr(cv2, f"COLOR_BAYER_{cv_order}2GRAY")
+    plans = {getattr(HIK, f"PixelType_Gvsp_Bayer{order}8"): DecodePlan(
+        f"Bayer{order}8", cvt_code=cvt_code, out_channels=3, gray_code=gray_code, bayer=order
+    )}
+    for bits in (10, 12, 16):
+        plans[getattr(HIK, f"PixelType_Gvsp_Bayer{order}{bits}")] = DecodePlan(
+            f"Bayer{order}{bits}", dtype=np.uint16, bits=bits, cvt_code=cvt_code, out_channels=3, gray_code=gray_code, bayer=order
+        )
+    for bits, kernel in ((10, unpack_10_packed), (12, unpack_12_packed)):
+        plans[getattr(HIK, f"PixelType_Gvsp_Bayer{order}{bits}_Packed")] = DecodePlan(
+            f"Bayer{order}{bits}_Packed", dtype=np.uint16, bits=bits, cvt_code=cvt_code, out_channels=3, gray_code=gray_code, bayer=order,
+            kernel=kernel, kernel8=unpack_packed_to_8
+        )
+    return plans
+
+
+def _yuv422_plans(layout: str, names: tuple[str, str, str, str]) -> dict[int, DecodePlan]:
+    """
+    同一排列的 YUV422 / YCbCr422 解码方案, 每像素 2 字节
+    :param layout:  "UYVY" / "YUYV"
+    :param names:   (YUV422, 全范围 BT.601 YCbCr, 有限范围 BT.601 YCbCr, 有限范围 BT.709 YCbCr) 的 PixelType 名称
+    :return:
+    """
+    yuv, ycbcr, ycbcr601, ycbcr709 = names
+    cvt_code = getattr(cv2, f"COLOR_YUV2RGB_{layout}")
+    gray_code = getattr(cv2, f"COLOR_YUV2GRAY_{layout}")
+    plans = {
+        # OpenCV 的 YUV422 转换即有限范围 BT.601, 一次 cvtColor 完成
+        getattr(HIK, f"PixelType_Gvsp_{name}"): DecodePlan(name, channels=2, cvt_code=cvt_code, out_channels=3, gray_code=gray_code)
+        for name in (yuv, ycbcr601)
+    }
+    # 其余色彩标准由解码核以仿射矩阵转换, 解码核直接输出 RGB
+    for name, matrix in ((ycbcr, YCBCR_FULL_601), (ycbcr709, YCBCR_709)):
+        plans[getattr(HIK, f"PixelType_Gvsp_{name}")] = DecodePlan(
+            name, channels=3, out_channels=3, gray_code=cv2.COLOR_RGB2GRAY,
+            kernel=functools.partial(yuv422_to_rgb, layout=layout, matrix=matrix)
+        )
+    return plans
+
+
+"""
+像素格式解码方案表, enPixelType -> DecodePlan
+彩色图像缺省输出 RGB 顺序 (与 RGB8_Packed 一致), output_channel_order 为 BGR 时由 DecodePlan.reorder 换为输出 BGR 的转换代码
+OpenCV 的 Bayer 排列以 (1,1) 像素起命名, 与 GenICam 以 (0,0) 起命名相差一个对角:
+    GenICam BayerRG (RGGB) -> COLOR_BAYER_BG2RGB (即原先使用的 COLOR_BAYER_RG2BGR)
+"""
+DECODE_PLANS: dict[int, DecodePlan] = {
+    # 灰度图
+    HIK.PixelType_Gvsp_Mono8: DecodePlan("Mono8"),
+    HIK.PixelType_Gvsp_Mono10: DecodePlan("Mono10", dtype=np.uint16, bits=10),
+    HIK.PixelType_Gvsp_Mono12: DecodePlan("Mono12", dtype=np.uint16, bits=12),
+    HIK.PixelType_Gvsp_Mono14: DecodePlan("Mono14", dtype=np.uint16, bits=14),
+    HIK.PixelType_Gvsp_Mono16: DecodePlan("Mono16", dtype=np.uint16, bits=16),
+    HIK.PixelType_Gvsp_Mono10_Packed: DecodePlan("Mono10_Packed", dtype=np.uint16, bits=10, kernel=unpack_10_packed, kernel8=unpack_packed_to_8),
+    HIK.PixelType_Gvsp_Mono12_Packed: DecodePlan("Mono12_Packed", dtype=np.uint16, bits=12, kernel=unpack_12_packed, kernel8=unpack_packed_to_8),
+    # Bayer -> 原始传感器数据
+    **_bayer_plans("RG", "BG"),
+    **_bayer_plans("BG", "RG"),
+    **_bayer_plans("GR", "GB"),
+    **_bayer_plans("GB", "GR"),
+    # 解码后的彩色图像
+    HIK.PixelType_Gvsp_RGB8_Packed: DecodePlan("RGB8_Packed", channels=3, out_channels=3, gray_code=cv2.COLOR_RGB2GRAY),
+    HIK.PixelType_Gvsp_BGR8_Packed: DecodePlan("BGR8_Packed", channels=3, cvt_code=cv2.COLOR_BGR2RGB, out_channels=3, gray_code=cv2.COLOR_BGR2GRAY),
+    HIK.PixelType_Gvsp_RGBA8_Packed: DecodePlan("RGBA8_Packed", channels=4, cvt_code=cv2.COLOR_RGBA2RGB, out_channels=3, gray_code=cv2.COLOR_RGBA2GRAY),
+    HIK.PixelType_Gvsp_BGRA8_Packed: DecodePlan("BGRA8_Packed", channels=4, cvt_code=cv2.COLOR_BGRA2RGB, out_channels=3, gray_code=cv2.COLOR_BGRA2GRAY),
+    # 每通道 16 位容器
+    HIK.PixelType_Gvsp_RGB10_Packed: DecodePlan("RGB10_Packed", dtype=np.uint16, channels=3, bits=10, out_channels=3, gray_code=cv2.COLOR_RGB2GRAY),
+    HIK.PixelType_Gvsp_RGB12_Packed: DecodePlan("RGB12_Packed", dtype=np.uint16, channels=3, bits=12, out_channels=3, gray_code=cv2.COLOR_RGB2GRAY),
+    HIK.PixelType_Gvsp_RGB16_Packed: DecodePlan("RGB16_Packed", dtype=np.uint16, channels=3, bits=16, out_channels=3, gray_code=cv2.COLOR_RGB2GRAY),
+    HIK.PixelType_Gvsp_BGR10_Packed: DecodePlan("BGR10_Packed", dtype=np.uint16, channels=3, bits=10, cvt_code=cv2.COLOR_BGR2RGB, out_channels=3, gray_code=cv2.COLOR_BGR2GRAY),
+    HIK.PixelType_Gvsp_BGR12_Packed: DecodePlan("BGR12_Packed", dtype=np.uint16, channels=3, bits=12, cvt_code=cv2.COLOR_BGR2RGB, out_channels=3, gray_code=cv2.COLOR_BGR2GRAY),
+    HIK.PixelType_Gvsp_BGR16_Packed: DecodePlan("BGR16_Packed", dtype=np.uint16, channels=3, bits=16, cvt_code=cv2.COLOR_BGR2RGB, out_channels=3, gray_code=cv2.COLOR_BGR2GRAY),
+    # YUV422, 每像素 2 字节, 带宽为 RGB8 的 2/3
+    **_yuv422_plans("UYVY", ("YUV422_Packed", "YCBCR422_8_CBYCRY", "YCBCR601_422_8_CBYCRY", "YCBCR709_422_8_CBYCRY")),
+    **_yuv422_plans("YUYV", ("YUV422_YUYV_Packed", "YCBCR422_8", "YCBCR601_422_8", "YCBCR709_422_8")),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class FrameGeometry:
+    """
+    帧的几何快照, 取流时随 Frame 保存
+    惰性解码使用取流时的设置, 取流后再修改 ROI / resize_ratio / rotation 不会作用于已取到的帧
+    """
+    # 像素格式及解码方案, 未知像素格式时为 None
+    pixel_type: typing.Optional[int]
+    decode_plan: typing.Optional[DecodePlan]
+    # 硬件 ROI 对齐后剩余的裁剪 (x, y, width, height)
+    roi_crop: typing.Optional[tuple[int, int, int, int]]
+    # resize/rotation 变换方案
+    transform_plan: TransformPlan
+    # 命名区域
+    named_rois: typing.Optional[dict[str, tuple[int, int, int, int]]]
+    # 与取流时几何参数一致的平场校正图, 不校正时为 None
+    flat_field: typing.Optional[FlatFieldCorrection]
+
+
 """
 stFrameInfo: MV_FRAME_OUT_INFO_EX
     ('nWidth', c_ushort),               ## @~chinese 图像宽(最大65535，超出请用nExtendWidth)    @~english Image Width (over 65535, use nExtendWidth)
@@ -273,6 +476,25 @@ class HikrobotCamera(HIK.MvCamera):
         :param multicast_ip:    组播ip
         :param multicast_port:  组播port
         :param to_ping:     是否在初始化时ping相机
+        :param image_node_num:  SDK 图像缓存节点个数
+        :param buffer_pool_size:    帧缓存池中每种帧长度最多缓存的 buffer 个数
+        :param buffer_pool_groups:  帧缓存池最多保留的字节数分组个数
+        :param frame_queue_size:    被动取流帧队列长度
+        :param frame_queue_policy:  被动取流帧队列已满时的处理策略
+        :param high_bit_depth:  高位深模式
+        :param geometry_views:  resize/rotation 视图模式
+        :param sensor_offload:  相机端变换
+        :param roi:             感兴趣区域
+        :param output_channel_order:    彩色图像输出的通道顺序
+        :param conversion_backend:      解码及变换后端
+        :param sdk_bayer_cvt_quality:   SDK 后端的 Bayer 插值质量
+        :param named_rois:      命名区域
+        :param roi_only:        只处理命名区域
+        :param preview_level:   预览图的金字塔层数
+        :param gamma:           查找表 gamma
+        :param contrast:        查找表对比度
+        :param sdk_gamma:       gamma 交给 SDK 完成
+        :param flat_field:      平场校正图路径
         """
         super().__init__()
 
@@ -308,19 +530,54 @@ class HikrobotCamera(HIK.MvCamera):
                 self.custom_params[k] = v
 
         # 线程锁
+        # 取流锁, 只保护 SDK 取流、复制到缓存池和归还 SDK 缓存; 解码和调整图片在锁外进行
         self.lock = Lock()
+        # 参数锁, 相机参数读写(GVCP)之间互斥, 不与取流互斥
+        self.param_lock = Lock()
+        # 取流代数, 每次停止取流后加 1; 租约只在同一代取流中归还 SDK 缓存
+        self.stream_generation = 0
+        # 被回收的租约 (stOutFrame, generation), FrameLease.__del__ 不能加锁, 由下一次取流在锁内归还
+        self.pending_lease_frees: collections.deque = collections.deque()
 
         # 计算机系统
         self.is_win = utils.is_win()
 
         # 相机用户自定义参数
         self.__dict__.update(dataclasses.asdict(CameraCustomParams(**self.custom_params)))
+        # 相机端变换状态, 180° 旋转是否由相机完成、相机端缩小倍数及节点
+        self.sensor_reverse = False
+        self.sensor_factor = 1
+        self.sensor_factor_node: typing.Optional[str] = None
+        # ROI 对齐后剩余的裁剪 (x, y, width, height), 以相机输出像素计, 为 None 时不裁剪
+        self.roi_crop: typing.Optional[tuple[int, int, int, int]] = None
+        # resize/rotation 变换方案, 修改 resize_ratio/rotation 时重新编译
+        self.transform_plan = self.compile_transform_plan(self.resize_ratio, self.rotation)
+        # 解码及变换后端实例, 按 conversion_backend 预先创建, 解码时只读取
+        names = self.conversion_backend.values() if isinstance(self.conversion_backend, dict) else (self.conversion_backend,)
+        self.backends: dict[str, ConversionBackend] = {
+            name: create_backend(name, camera=self) for name in {OpenCVBackend.name, *names}
+        }
 
         # memcpy 函数
         self.memcpy_func = ctypes.cdll.msvcrt.memcpy if self.is_win else ctypes.CDLL("libc.so.6").memcpy
 
         # 被动取流回调函数
         self.CALL_BACK_FUN = None
+        # 被动取流帧队列
+        self.frame_queue = FrameQueue(maxsize=self.frame_queue_size, policy=self.frame_queue_policy)
+        # 帧处理函数, 每一帧在取流线程中依次调用 handler(frame)
+        self.frame_handlers: list[typing.Callable[[Frame], typing.Any]] = list()
+        # 最新帧槽
+        self.latest_frame_slot = LatestFrameSlot()
+        # 后台取流线程
+        self.grabber_thread: typing.Optional[Thread] = None
+        self.grabber_stop_event = Event()
+        # 引用后台取流线程的异步消费者个数, 及线程是否由异步消费者启动
+        self.grabber_users = 0
+        self.grabber_auto_started = False
+        self.grabber_users_lock = Lock()
+        # 单帧异步接口(agrab_frame)是否已引用后台取流线程, 停止取流时释放
+        self.async_grabber_acquired = False
 
         # 结构体
         # 设备信息
@@ -332,11 +589,20 @@ class HikrobotCamera(HIK.MvCamera):
 
         # 相机帧数据指针
         self.data_buffer = None
-        # 相机frame指针
-        self.frame_buffer = None
+        # 相机frame指针, 指向最近一帧使用的缓存池 buffer
+        self.frame_buffer: typing.Optional[np.ndarray] = None
+        # 帧缓存池, 返回的图像各自持有 buffer, 不会被下一帧覆盖
+        self.buffer_pool = BufferPool(max_buffers=self.buffer_pool_size, max_sizes=self.buffer_pool_groups)
 
         # payload size
         self.nPayloadSize = 0
+        # 当前流的解码方案 (enPixelType, DecodePlan), 开始取流及修改 PixelFormat 时由 resolve_decode_plan 选定
+        self.decode_plan: typing.Optional[tuple[int, DecodePlan]] = None
+        # 当前查找表 ((dtype, bits, gamma, contrast), lut), 参数变化时重新生成
+        self.adjust_lut: typing.Optional[tuple[tuple, typing.Optional[np.ndarray]]] = None
+        # 平场校正图, 及其与当前几何参数是否一致 (None 表示几何参数已修改、尚未由 validate_flat_field 校验, 不校正)
+        self.flat_field_correction: typing.Optional[FlatFieldCorrection] = None
+        self.flat_field_valid: typing.Optional[bool] = None
 
         # 初始化SDK
         self.sdk_initialize()
@@ -503,6 +769,22 @@ class HikrobotCamera(HIK.MvCamera):
         # Mark the camera as open
         self.is_opened_flag = True
 
+        # SDK 后端的 Bayer 插值质量
+        if self.sdk_bayer_cvt_quality is not None:
+            self.set_bayer_cvt_quality(self.sdk_bayer_cvt_quality)
+
+        # 相机端变换
+        if self.sensor_offload:
+            self.apply_transform(self.resize_ratio, self.rotation)
+
+        # ROI
+        if self.roi is not None:
+            self.set_roi(self.roi)
+
+        # 平场校正图, 须在几何参数设置完成后校验
+        if self.flat_field is not None:
+            self.set_flat_field(self.flat_field)
+
     def set_transmission_type(self) -> int:
         """设置组播"""
         # 获取 组播 ip 和 port
@@ -584,6 +866,14 @@ class HikrobotCamera(HIK.MvCamera):
     # #################### 开始/停止取流 ####################
     def start_grabbing(self) -> int:
         """开始取流"""
+        # 设置 SDK 图像缓存节点个数
+        if self.image_node_num is not None:
+            res = self.MV_CC_SetImageNodeNum(self.image_node_num)
+            if res != HIK.MV_OK:
+                raise HikCameraError(f"set image node num[{self.image_node_num}] failed, error code[{self.mvs_error_code(res)}]")
+            else:
+                _logger.debug(f"{self.identity} set image node num[{self.image_node_num}] successfully")
+
         # method 3 -> 被动取流, MV_CC_RegisterImageCallBackEx
         if self.grab_method == GrabMethod.RegisterImageCallBackEx:
             # 初始化回调函数
@@ -595,16 +885,21 @@ class HikrobotCamera(HIK.MvCamera):
             else:
                 _logger.debug(f"{self.identity} register image callback successfully")
 
+        # 清空帧队列和最新帧
+        self.frame_queue.clear()
+        self.latest_frame_slot.clear()
+        # PixelFormat 可能已修改, 重新选择解码方案, 重新校验平场校正图
+        self.resolve_decode_plan()
+        self.validate_flat_field()
+
         # Start grabbing frames from the camera
         res = self.MV_CC_StartGrabbing()
         if res == HIK.MV_OK:
             # method 1 -> 主动取流, MV_CC_GetOneFrameTimeout
             if self.grab_method == GrabMethod.GetOneFrameTimeout:
                 # Get the payload size from the camera and store it in the payload size structure by reference
+                # 帧数据直接写入缓存池 buffer, 在 get_one_frame 中按 self.nPayloadSize 申请
                 self.nPayloadSize = self.getitem("PayloadSize")
-                # Allocate a buffer to store the frame data.
-                # You'll need memory for self.nPayloadSize unsigned 8-bit integers (0-255)
-                self.data_buffer = (ctypes.c_ubyte * self.nPayloadSize)()
                 # Instantiate a structure to hold the frame information
                 self.stFrameInfo = HIK.MV_FRAME_OUT_INFO_EX()
                 # Initialize the frame information structure to zero
@@ -622,85 +917,181 @@ class HikrobotCamera(HIK.MvCamera):
 
     def stop_grabbing(self) -> int:
         """停止取流"""
+        # 停止后台取流线程, 单帧异步接口的引用随之释放
+        if self.async_grabber_acquired:
+            self.async_grabber_acquired = False
+            self.release_grabber()
+        self.stop_grabber()
+
         # 停止取流
         res = self.MV_CC_StopGrabbing()
 
-        # 复位变量
+        # 复位变量, SDK 缓存已全部回收, 之前的租约不再归还
         self.is_grabbing_flag = False
+        self.stream_generation += 1
+        self.pending_lease_frees.clear()
 
         del self.frame_buffer
         del self.data_buffer
         self.data_buffer = None
         self.frame_buffer = None
+        # 帧长度可能随参数修改而变化, 重新开始取流时重新分配
+        self.buffer_pool.clear()
 
         return res
 
     # #################### 获取帧 ####################
     def get_one_frame(self) -> np.ndarray:
         """获取一帧画面, 需要循环调用, 可以重载"""
+        return self.grab_frame().image
+
+    def grab_frame(self) -> Frame:
+        """获取一帧画面及帧信息, 需要循环调用"""
+        # method 3 或后台取流线程运行时, 从帧队列中读取
+        # 不能持有 self.lock, 否则回调函数无法写入
+        if self.grab_method.is_passive() or self.is_grabber_running:
+            try:
+                return self.frame_queue.get(timeout=self.get_one_frame_timeout_ms / 1000)
+            except queue.Empty:
+                raise HikCameraError(f"get one frame failed, no frame in {self.get_one_frame_timeout_ms}ms") from None
+
+        return self.poll_one_frame()
+
+    def poll_one_frame(self) -> Frame:
+        """主动取流获取一帧画面, GrabMethod.GetOneFrameTimeout/GetImageBuffer"""
         with self.lock:
-            if self.grab_method == GrabMethod.GetOneFrameTimeout:
-                # method 1
-                # Frame acquisition:
-                # SDK C API will save the frame data to the buffer by reference (byref(self.data_buf))
-                # and will save the frame information to the frame information structure by reference
-                # (self.stFrameInfo, called by reference in the python wrapper for the C API)
-                res = self.MV_CC_GetOneFrameTimeout(
-                    pData=ctypes.byref(self.data_buffer),
-                    nDataSize=self.nPayloadSize,
-                    stFrameInfo=self.stFrameInfo,
-                    nMsec=self.get_one_frame_timeout_ms,
-                )
-                if res != HIK.MV_OK:
-                    raise HikCameraError(f"get one frame failed, error code[{self.mvs_error_code(res)}]")
+            frame_buffer, stFrameInfo = self.poll_frame_buffer()
 
-                # 给 self.frame_buffer 开辟空间
-                if self.frame_buffer is None:
-                    self.frame_buffer = (ctypes.c_ubyte * self.stFrameInfo.nFrameLen)()
+        # 只保留原始数据, 首次访问 Frame.image 等属性时才解码
+        return Frame(None, stFrameInfo, raw=frame_buffer, camera=self, geometry=self.snapshot_geometry(stFrameInfo.enPixelType))
 
-                # 将 self.data_buffer 复制到 self.image_buffer
-                self.memcpy_func(ctypes.byref(self.frame_buffer), self.data_buffer, self.stFrameInfo.nFrameLen)
+    def poll_frame_buffer(self) -> tuple[np.ndarray, HIK.MV_FRAME_OUT_INFO_EX]:
+        """
+        主动取流获取一帧原始数据, 保存在缓存池 buffer self.frame_buffer 中, 帧信息保存在 self.stFrameInfo 中
+        调用者需持有 self.lock
+        :return: (self.frame_buffer, self.stFrameInfo 的副本), 副本不会被下一帧覆盖, 可在锁外使用
+        """
+        if self.grab_method == GrabMethod.GetOneFrameTimeout:
+            # method 1
+            # Frame acquisition:
+            # SDK C API will save the frame data to the buffer by reference
+            # and will save the frame information to the frame information structure by reference
+            # (self.stFrameInfo, called by reference in the python wrapper for the C API)
+            # SDK 直接写入缓存池 buffer, 无需再复制到 self.frame_buffer
+            self.data_buffer = self.buffer_pool.acquire(self.nPayloadSize)
+            res = self.MV_CC_GetOneFrameTimeout(
+                pData=ctypes.c_void_p(self.data_buffer.ctypes.data),
+                nDataSize=self.nPayloadSize,
+                stFrameInfo=self.stFrameInfo,
+                nMsec=self.get_one_frame_timeout_ms,
+            )
+            if res != HIK.MV_OK:
+                raise HikCameraError(f"get one frame failed, error code[{self.mvs_error_code(res)}]")
 
-                # 转换为numpy数组
-                image_data = self.convert_frame_buf_2_numpy_arr()
-                # 调整图片 -> resize, rotation
-                image_data = self.adjust_image(image_data)
+            self.frame_buffer = self.data_buffer[:self.stFrameInfo.nFrameLen]
 
-                return image_data
+        elif self.grab_method == GrabMethod.GetImageBuffer:
+            # method 2
+            self.drain_lease_frees()
+            res = self.MV_CC_GetImageBuffer(
+                stFrame=self.stOutFrame,
+                nMsec=self.get_one_frame_timeout_ms
+            )
+            if res != HIK.MV_OK:
+                raise HikCameraError(f"get one frame failed, error code[{self.mvs_error_code(res)}]")
 
-            elif self.grab_method == GrabMethod.GetImageBuffer:
-                # method 2
-                res = self.MV_CC_GetImageBuffer(
-                    stFrame=self.stOutFrame,
-                    nMsec=self.get_one_frame_timeout_ms
-                )
-                if res != HIK.MV_OK:
-                    raise HikCameraError(f"get one frame failed, error code[{self.mvs_error_code(res)}]")
+            self.stFrameInfo = self.stOutFrame.stFrameInfo
+
+            # 从缓存池中取出 self.frame_buffer
+            self.frame_buffer = self.buffer_pool.acquire(self.stFrameInfo.nFrameLen)
+
+            # 将 SDK 缓存复制到 self.frame_buffer
+            self.memcpy_func(ctypes.c_void_p(self.frame_buffer.ctypes.data), self.stOutFrame.pBufAddr, self.stFrameInfo.nFrameLen)
+
+            # 复制完成后即可归还 SDK 缓存
+            self.MV_CC_FreeImageBuffer(self.stOutFrame)
 
-                self.stFrameInfo = self.stOutFrame.stFrameInfo
+        else:
+            raise HikCameraError(f"poll_frame_buffer() shouldn't be called in grab method[{self.grab_method.name}]")
 
-                # 给 self.frame_buffer 开辟空间
-                if self.frame_buffer is None:
-                    self.frame_buffer = (ctypes.c_ubyte * self.stFrameInfo.nFrameLen)()
+        return self.frame_buffer, HIK.MV_FRAME_OUT_INFO_EX.from_buffer_copy(self.stFrameInfo)
 
-                # 将 self.data_buffer 复制到 self.image_buffer
-                self.memcpy_func(ctypes.byref(self.frame_buffer), self.stOutFrame.pBufAddr, self.stFrameInfo.nFrameLen)
+    def get_one_frame_lease(self) -> FrameLease:
+        """
+        获取一帧画面的 SDK 缓存租约, 仅支持 GrabMethod.GetImageBuffer
+        与 get_one_frame 不同, 不会将 SDK 缓存复制到 self.frame_buffer, 需要调用 FrameLease.release() 归还缓存
+        :return:
+        """
+        if self.grab_method != GrabMethod.GetImageBuffer:
+            raise HikCameraError(f"get_one_frame_lease() shouldn't be called in grab method[{self.grab_method.name}]")
 
-                # 转换为numpy数组
-                image_data = self.convert_frame_buf_2_numpy_arr()
-                # 调整图片 -> resize, rotation
-                image_data = self.adjust_image(image_data)
+        # 每个租约独占一个 MV_FRAME_OUT, 允许同时持有多帧
+        stOutFrame = HIK.MV_FRAME_OUT()
+        ctypes.memset(ctypes.byref(stOutFrame), 0, ctypes.sizeof(stOutFrame))
 
-                self.MV_CC_FreeImageBuffer(self.stOutFrame)
+        with self.lock:
+            self.drain_lease_frees()
+            res = self.MV_CC_GetImageBuffer(
+                stFrame=stOutFrame,
+                nMsec=self.get_one_frame_timeout_ms
+            )
+            generation = self.stream_generation
+        if res != HIK.MV_OK:
+            raise HikCameraError(f"get one frame lease failed, error code[{self.mvs_error_code(res)}]")
 
-                return image_data
+        return FrameLease(self, stOutFrame, generation)
 
-            else:
-                raise HikCameraError(f"get_one_frame() shouldn't be called in grab method[{self.grab_method.name}]")
+    def free_frame_lease(self, stOutFrame: HIK.MV_FRAME_OUT, generation: int):
+        """
+        归还 FrameLease 持有的 SDK 缓存, 由 FrameLease.release() 调用
+        :param stOutFrame:
+        :param generation:  取得租约时的取流代数
+        :return:
+        """
+        with self.lock:
+            self.free_lease_buffer(stOutFrame, generation)
+
+    def defer_free_frame_lease(self, stOutFrame: HIK.MV_FRAME_OUT, generation: int):
+        """
+        推迟归还 SDK 缓存, 由 FrameLease.__del__ 调用
+        gc 可能在已持有 self.lock 的线程中回收租约, 此处不加锁, 由下一次取流在锁内归还
+        :param stOutFrame:
+        :param generation:
+        :return:
+        """
+        self.pending_lease_frees.append((stOutFrame, generation))
+
+    def drain_lease_frees(self):
+        """
+        归还被回收的租约持有的 SDK 缓存, 调用者需持有 self.lock
+        :return:
+        """
+        while self.pending_lease_frees:
+            try:
+                stOutFrame, generation = self.pending_lease_frees.popleft()
+            except IndexError:
+                break
+            self.free_lease_buffer(stOutFrame, generation)
+
+    def free_lease_buffer(self, stOutFrame: HIK.MV_FRAME_OUT, generation: int):
+        """
+        MV_CC_FreeImageBuffer, 调用者需持有 self.lock
+        停止取流后 SDK 缓存已全部回收, 租约来自之前的取流(如 paused_grabbing 前取得)时跳过, 避免归还到新的取流
+        :param stOutFrame:
+        :param generation:
+        :return:
+        """
+        if not self.is_grabbing_flag or generation != self.stream_generation:
+            _logger.debug(f"{self.identity} frame lease[{stOutFrame.stFrameInfo.nFrameNum}] belongs to a stopped stream, skip free")
+            return
+        res = self.MV_CC_FreeImageBuffer(stOutFrame)
+        if res != HIK.MV_OK:
+            _logger.warning(f"{self.identity} free frame lease[{stOutFrame.stFrameInfo.nFrameNum}] failed, error code[{self.mvs_error_code(res)}]")
 
-    def get_one_frame_callback(self, pData, pFrameInfo, pUser) -> np.ndarray:
+    def get_one_frame_callback(self, pData, pFrameInfo, pUser) -> Frame:
         """
         回调函数，处理图像数据
+        只复制原始数据, 解码推迟到消费者首次访问 Frame.image 等属性时, 被丢弃的帧不再消耗 CPU
         可重载
         :param pData:
         :param pFrameInfo:
@@ -708,31 +1099,282 @@ class HikrobotCamera(HIK.MvCamera):
         :return:
         """
         with self.lock:
-            # 用户自定义信息
-            # obj -> obj = ctypes.cast(pUser, ctypes.POINTER(ctypes.py_object)).contents.value
-            # str -> string = str(cast(pUser, ctypes.c_char_p).value, encoding="utf-8")
-            # int -> number = pUser
-            # 帧信息 MV_FRAME_OUT_INFO_EX结构体 指针
-            self.stFrameInfo = ctypes.cast(pFrameInfo, ctypes.POINTER(HIK.MV_FRAME_OUT_INFO_EX)).contents
-            # 帧数据指针，保存每一帧的画面numpy数组，长度为st_frame_info.nFrameLen，类型为c_ubyte
-            self.data_buffer = ctypes.cast(pData, ctypes.POINTER(ctypes.c_ubyte * self.stFrameInfo.nFrameLen)).contents
-
-            # 给 self.frame_buffer 开辟空间
-            if self.frame_buffer is None:
-                self.frame_buffer = (ctypes.c_ubyte * self.stFrameInfo.nFrameLen)()
-
-            # 将 self.data_buffer 复制到 self.image_buffer
-            self.memcpy_func(ctypes.byref(self.frame_buffer), self.data_buffer, self.stFrameInfo.nFrameLen)
-
-            # 转换为numpy数组
-            image_data = self.convert_frame_buf_2_numpy_arr()
-            # 调整图片 -> resize, rotation
-            image_data = self.adjust_image(image_data)
+            frame_buffer, stFrameInfo = self.copy_callback_frame(pData, pFrameInfo)
 
-            return image_data
+        frame = Frame(None, stFrameInfo, raw=frame_buffer, camera=self, geometry=self.snapshot_geometry(stFrameInfo.enPixelType))
+
+        # 写入帧队列并调用帧处理函数
+        self.dispatch_frame(frame)
+
+        return frame
+
+    def copy_callback_frame(self, pData, pFrameInfo) -> tuple[np.ndarray, HIK.MV_FRAME_OUT_INFO_EX]:
+        """
+        将回调函数中的帧数据复制到缓存池, 调用者需持有 self.lock
+        :param pData:
+        :param pFrameInfo:
+        :return: (self.frame_buffer, self.stFrameInfo)
+        """
+        # 用户自定义信息
+        # obj -> obj = ctypes.cast(pUser, ctypes.POINTER(ctypes.py_object)).contents.value
+        # str -> string = str(cast(pUser, ctypes.c_char_p).value, encoding="utf-8")
+        # int -> number = pUser
+        # 帧信息 MV_FRAME_OUT_INFO_EX结构体 指针
+        # 回调返回后 SDK 会复用该结构体, 保存副本
+        self.stFrameInfo = HIK.MV_FRAME_OUT_INFO_EX.from_buffer_copy(ctypes.cast(pFrameInfo, ctypes.POINTER(HIK.MV_FRAME_OUT_INFO_EX)).contents)
+        # 帧数据指针，保存每一帧的画面numpy数组，长度为st_frame_info.nFrameLen，类型为c_ubyte
+        self.data_buffer = ctypes.cast(pData, ctypes.POINTER(ctypes.c_ubyte * self.stFrameInfo.nFrameLen)).contents
+
+        # 从缓存池中取出 self.frame_buffer
+        self.frame_buffer = self.buffer_pool.acquire(self.stFrameInfo.nFrameLen)
+
+        # 将 self.data_buffer 复制到 self.frame_buffer
+        self.memcpy_func(ctypes.c_void_p(self.frame_buffer.ctypes.data), self.data_buffer, self.stFrameInfo.nFrameLen)
+
+        return self.frame_buffer, self.stFrameInfo
+
+    def dispatch_frame(self, frame: Frame):
+        """
+        将一帧写入帧队列和最新帧槽, 并依次调用帧处理函数
+        在取流线程中调用, 帧处理函数应尽快返回; 帧处理函数抛出的异常只记录日志
+        :param frame:
+        :return:
+        """
+        self.latest_frame_slot.publish(frame)
+
+        # DropPolicy.Block 时回调线程最多阻塞 get_one_frame_timeout_ms; 后台取流线程不阻塞, 队列已满时丢弃该帧
+        timeout = 0 if threading.current_thread() is self.grabber_thread else self.get_one_frame_timeout_ms / 1000
+        if not self.frame_queue.put(frame, timeout=timeout):
+            _logger.debug(f"{self.identity} frame queue full, frame dropped[{self.frame_queue.dropped}]")
+
+        for handler in tuple(self.frame_handlers):
+            try:
+                handler(frame)
+            except Exception:
+                _logger.exception(f"{self.identity} frame handler[{getattr(handler, '__name__', handler)}] raised error")
+
+    def add_frame_handler(self, handler: typing.Callable[[Frame], typing.Any]):
+        """
+        注册帧处理函数 on_frame, 每一帧都会调用 handler(frame)
+        :param handler:
+        :return:
+        """
+        if handler not in self.frame_handlers:
+            self.frame_handlers.append(handler)
+
+    def remove_frame_handler(self, handler: typing.Callable[[Frame], typing.Any]):
+        """
+        注销帧处理函数
+        :param handler:
+        :return:
+        """
+        if handler in self.frame_handlers:
+            self.frame_handlers.remove(handler)
+
+    on_frame = add_frame_handler
+
+    # #################### 后台取流线程 ####################
+    def start_grabber(self):
+        """
+        启动后台取流线程, 持续取流并发布到最新帧槽、帧队列和帧处理函数
+        被动取流时由 SDK 回调线程发布, 不需要额外线程
+        :return:
+        """
+        if self.grab_method.is_passive() or self.is_grabber_running:
+            return
+        if not self.is_grabbing_flag:
+            raise HikCameraError(f"start_grabber() should be called after start grabbing")
+
+        self.frame_queue.clear()
+        self.grabber_stop_event.clear()
+        self.grabber_thread = Thread(target=self.grabber_loop, name=f"grabber-{self.ip}", daemon=True)
+        self.grabber_thread.start()
+        _logger.debug(f"{self.identity} start grabber successfully")
+
+    def stop_grabber(self):
+        """停止后台取流线程"""
+        if self.grabber_thread is None:
+            return
+        self.grabber_stop_event.set()
+        self.grabber_thread.join()
+        self.grabber_thread = None
+        _logger.debug(f"{self.identity} stop grabber successfully")
+
+    def grabber_loop(self):
+        """后台取流线程"""
+        while not self.grabber_stop_event.is_set():
+            try:
+                frame = self.poll_one_frame()
+            except HikCameraError as err:
+                _logger.warning(f"{self.identity} grabber: {err}")
+                # 避免设备异常时空转
+                self.grabber_stop_event.wait(0.1)
+                continue
+            except Exception:
+                # 其他异常也不能结束线程, 否则 grab_frame 会静默退回主动取流
+                _logger.exception(f"{self.identity} grabber raised error")
+                self.grabber_stop_event.wait(0.1)
+                continue
+            try:
+                self.dispatch_frame(frame)
+            except Exception:
+                _logger.exception(f"{self.identity} grabber dispatch frame[{frame.frame_num}] raised error")
+
+    def acquire_grabber(self):
+        """
+        异步消费者引用后台取流线程, 线程未运行时启动
+        :return:
+        """
+        with self.grabber_users_lock:
+            if self.grabber_users == 0 and not self.grab_method.is_passive() and not self.is_grabber_running:
+                self.start_grabber()
+                self.grabber_auto_started = True
+            self.grabber_users += 1
+
+    def release_grabber(self):
+        """
+        异步消费者释放后台取流线程, 最后一个消费者退出时停止由 acquire_grabber() 启动的线程
+        调用者自行 start_grabber() 启动的线程不受影响
+        :return:
+        """
+        with self.grabber_users_lock:
+            self.grabber_users -= 1
+            if self.grabber_users == 0 and self.grabber_auto_started:
+                self.grabber_auto_started = False
+                self.stop_grabber()
+
+    @property
+    def is_grabber_running(self) -> bool:
+        """后台取流线程是否运行"""
+        return self.grabber_thread is not None and self.grabber_thread.is_alive()
+
+    def latest(self, max_age_ms: typing.Optional[float] = None) -> typing.Optional[Frame]:
+        """
+        获取最新帧, 不阻塞, 需要先调用 start_grabber() 或使用被动取流
+        :param max_age_ms: 最大帧龄(毫秒), 超过时返回 None
+        :return:
+        """
+        return self.latest_frame_slot.latest(max_age_ms=max_age_ms)
+
+    def wait_newer(self, than_frame_num: int, timeout_ms: typing.Optional[int] = None) -> Frame:
+        """
+        等待帧号大于 than_frame_num 的新帧, 需要先调用 start_grabber() 或使用被动取流
+        :param than_frame_num:
+        :param timeout_ms: 超时时间, 缺省为 get_one_frame_timeout_ms
+        :return:
+        """
+        if timeout_ms is None:
+            timeout_ms = self.get_one_frame_timeout_ms
+        frame = self.latest_frame_slot.wait_newer(than_frame_num, timeout=timeout_ms / 1000)
+        if frame is None:
+            raise HikCameraError(f"wait newer than frame[{than_frame_num}] failed, no frame in {timeout_ms}ms")
+        return frame
+
+    # #################### asyncio ####################
+    async def aget_one_frame(self) -> np.ndarray:
+        """获取一帧画面, get_one_frame 的 asyncio 版本, 在取流线程中解码"""
+        frame = await self.agrab_frame(decode=True)
+        return frame.image
+
+    async def agrab_frame(self, decode: bool = False) -> Frame:
+        """
+        获取一帧画面及帧信息, grab_frame 的 asyncio 版本
+        等待调用之后到达的下一帧由取流线程投递到 AsyncFrameQueue, 不经过线程池, 超时时间为 get_one_frame_timeout_ms
+        主动取流时首次调用引用后台取流线程(acquire_grabber), 直到停止取流
+        :param decode:  是否在取流线程中解码, 返回时 frame.image 已计算; 否则返回惰性解码的帧, 由调用者决定何时解码
+        :return:
+        """
+        self.acquire_async_grabber()
+
+        aqueue = AsyncFrameQueue(asyncio.get_running_loop(), maxsize=1)
+        delivered = False
+
+        def deliver(frame: Frame):
+            # 只投递一帧, 之后到达的帧不再解码; 解码异常投递给等待者
+            nonlocal delivered
+            if delivered:
+                return
+            delivered = True
+            if decode:
+                try:
+                    frame.image
+                except Exception as err:
+                    aqueue.put_threadsafe(err)
+                    return
+            aqueue.put_threadsafe(frame)
+
+        self.add_frame_handler(deliver)
+        try:
+            item = await aqueue.get(timeout=self.get_one_frame_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            raise HikCameraError(f"get one frame failed, no frame in {self.get_one_frame_timeout_ms}ms") from None
+        finally:
+            self.remove_frame_handler(deliver)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def acquire_async_grabber(self):
+        """
+        单帧异步接口引用后台取流线程, 只引用一次, 停止取流时释放
+        被动取流时由 SDK 回调投递, 不启动线程
+        :return:
+        """
+        with self.grabber_users_lock:
+            if self.async_grabber_acquired:
+                return
+            self.async_grabber_acquired = True
+        try:
+            self.acquire_grabber()
+        except BaseException:
+            self.async_grabber_acquired = False
+            raise
+
+    async def aframes(self, maxsize: typing.Optional[int] = None, timeout_ms: typing.Optional[int] = None) -> typing.AsyncIterator[Frame]:
+        """
+        异步帧迭代器: async for frame in camera.aframes()
+        主动取流时引用后台取流线程(acquire_grabber), 迭代结束后最后一个异步消费者停止由此启动的线程
+        :param maxsize:     异步帧队列长度, 缺省为 frame_queue_size, 消费过慢时丢弃最旧的帧
+        :param timeout_ms:  等待每一帧的超时时间, None 表示一直等待
+        :return:
+        """
+        aqueue = AsyncFrameQueue(asyncio.get_running_loop(), maxsize=maxsize or self.frame_queue_size)
+        self.add_frame_handler(aqueue.put_threadsafe)
+        try:
+            self.acquire_grabber()
+        except BaseException:
+            self.remove_frame_handler(aqueue.put_threadsafe)
+            raise
+        try:
+            while True:
+                try:
+                    frame = await aqueue.get(timeout=None if timeout_ms is None else timeout_ms / 1000)
+                except asyncio.TimeoutError:
+                    raise HikCameraError(f"get one frame failed, no frame in {timeout_ms}ms") from None
+                yield frame
+        finally:
+            self.remove_frame_handler(aqueue.put_threadsafe)
+            # stop_grabber 会等待取流线程退出, 不阻塞事件循环
+            await asyncio.to_thread(self.release_grabber)
+
+    def convert_frame_buf_2_numpy_arr(
+            self,
+            frame_buffer=None,
+            stFrameInfo: typing.Optional[HIK.MV_FRAME_OUT_INFO_EX] = None,
+            dst: typing.Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        将 frame_buf 转变为 numpy数组
+        :param frame_buffer:    帧数据缓存, 缺省为 self.frame_buffer
+        :param stFrameInfo:     帧信息, 缺省为 self.stFrameInfo
+        :param dst:             输出数组, 缺省时无需转换的 8 位格式(Mono8/RGB8_Packed)返回 frame_buffer 上的视图, 其余从缓存池中分配
+        :return:
+        """
+        if frame_buffer is None:
+            frame_buffer = self.frame_buffer
+        if stFrameInfo is None:
+            stFrameInfo = self.stFrameInfo
 
-    def convert_frame_buf_2_numpy_arr(self) -> np.ndarray:
-        """将 frame_buf 转变为 numpy数组"""
         # 帧信息
         # nWidth = stFrameInfo.nWidth
         # nHeight = stFrameInfo.nHeight
@@ -751,44 +1393,832 @@ class HikrobotCamera(HIK.MvCamera):
                 count： 代表返回的ndarray的长度。默认值为-1。
                 offset：偏移量，代表读取的起始位置。默认值为0。
         '''
-        # numpy 数组长度为 [nWidth * nHeight], 数据类型为np.uint8
-        image_data: np.ndarray = np.frombuffer(buffer=self.frame_buffer, count=self.stFrameInfo.nFrameLen, dtype=np.uint8, offset=0)
-
-        # 灰度图
-        if self.stFrameInfo.enPixelType == HIK.PixelType_Gvsp_Mono8:
-            image_data = np.reshape(image_data, (self.stFrameInfo.nHeight, self.stFrameInfo.nWidth))
-        # RGB8_Packed -> 解码后的彩色图像
-        elif self.stFrameInfo.enPixelType == HIK.PixelType_Gvsp_RGB8_Packed:
-            image_data = np.reshape(image_data, (self.stFrameInfo.nHeight, self.stFrameInfo.nWidth, -1))
-        # BayerRG8 -> 原始传感器数据
-        elif self.stFrameInfo.enPixelType == HIK.PixelType_Gvsp_BayerRG8:
-            image_data = np.reshape(image_data, (self.stFrameInfo.nHeight, self.stFrameInfo.nWidth))
-            image_data = cv2.cvtColor(image_data, cv2.COLOR_BAYER_RG2BGR)
+        # numpy 数组长度为 [nFrameLen], 数据类型为np.uint8
+        image_data: np.ndarray = np.frombuffer(buffer=frame_buffer, count=stFrameInfo.nFrameLen, dtype=np.uint8, offset=0)
+
+        image_data = self.decode_raw(image_data, stFrameInfo.enPixelType, stFrameInfo.nHeight, stFrameInfo.nWidth, dst=dst)
+
+        return self.write_into(image_data, dst)
+
+    def decode_raw(
+            self,
+            raw: np.ndarray,
+            pixel_type: int,
+            height: int,
+            width: int,
+            dst: typing.Optional[np.ndarray] = None,
+            gray: bool = False,
+            geometry: typing.Optional[FrameGeometry] = None,
+    ) -> np.ndarray:
+        """
+        按解码方案解码一维原始数据, 中间结果及输出从缓存池中分配
+        :param raw:         一维 uint8 原始数据
+        :param pixel_type:  enPixelType
+        :param height:
+        :param width:
+        :param dst:         输出数组, 形状须与 ROI 裁剪后的图片一致
+        :param gray:        是否直接解码为灰度图
+        :param geometry:    取流时的几何快照, 缺省为当前设置
+        :return: 设置 ROI 且相机无法精确对齐时为裁剪后的视图
+        """
+        if geometry is None:
+            geometry = self.snapshot_geometry(pixel_type)
+        plan = geometry.decode_plan or self.get_decode_plan(pixel_type)
+        backend = self.select_backend(plan, gray)
+        roi_crop = geometry.roi_crop
+        if roi_crop is None:
+            return backend.decode(
+                plan, raw, pixel_type, height, width,
+                dst=dst, alloc=self.buffer_pool.acquire, keep_depth=self.high_bit_depth, gray=gray
+            )
+        # ROI 剩余部分以视图裁剪
+        image_data = backend.decode(
+            plan, raw, pixel_type, height, width,
+            alloc=self.buffer_pool.acquire, keep_depth=self.high_bit_depth, gray=gray
+        )
+        return self.write_into(self.crop_roi(image_data, roi_crop), dst)
+
+    def render_raw(
+            self,
+            raw: np.ndarray,
+            pixel_type: int,
+            height: int,
+            width: int,
+            dst: typing.Optional[np.ndarray] = None,
+            geometry: typing.Optional[FrameGeometry] = None,
+    ) -> np.ndarray:
+        """
+        一维原始数据 -> 调整后(resize, rotation)的图像
+        Bayer 格式、OpenCV 后端且 resize_ratio <= 0.5 时使用超像素解码直接得到半尺寸图像, 再缩放剩余比例
+        设置 ROI 时先裁剪再缩放
+        :param raw:         一维 uint8 原始数据
+        :param pixel_type:  enPixelType
+        :param height:
+        :param width:
+        :param dst:         输出数组, 形状须与调整后的图片一致
+        :param geometry:    取流时的几何快照, 缺省为当前设置
+        :return:
+        """
+        if geometry is None:
+            geometry = self.snapshot_geometry(pixel_type)
+        plan = geometry.decode_plan or self.get_decode_plan(pixel_type)
+        transform_plan = geometry.transform_plan
+        resize_ratio = transform_plan.resize_ratio
+        roi_crop = geometry.roi_crop
+        # 超像素解码后只能按偶数坐标裁剪
+        if (
+                plan.bayer is None or resize_ratio is None or resize_ratio > 0.5
+                or (roi_crop is not None and any(v % 2 for v in roi_crop))
+                or self.select_backend(plan).name != OpenCVBackend.name
+        ):
+            return self.adjust_image(self.decode_raw(raw, pixel_type, height, width, geometry=geometry), dst=dst, geometry=geometry)
+
+        image_data = plan.decode_half(raw, height, width, alloc=self.buffer_pool.acquire, keep_depth=self.high_bit_depth)
+        if roi_crop is not None:
+            image_data = self.crop_roi(image_data, tuple(v // 2 for v in roi_crop))
+            height, width = roi_crop[3], roi_crop[2]
+        # 以原始尺寸计算目标尺寸, 只缩放剩余比例
+        image_data = transform_plan.apply(image_data, height, width, dst=dst, alloc=self.buffer_pool.acquire)
+        # 结果位于 dst 或缓存池 buffer 中, 原地查表
+        return self.adjust_tone(image_data, in_place=True, plan=plan, flat_field=geometry.flat_field)
+
+    def resolve_decode_plan(self):
+        """
+        按相机当前的 PixelFormat 选定解码方案, 开启 sdk_gamma 且由 SDK 后端解码时同时设置 SDK gamma
+        在开始取流及修改 PixelFormat 时调用, 解码路径只读取结果, 不修改相机状态也不调用 SDK
+        :return:
+        """
+        pixel_type = self["PixelFormat"]
+        plan = DECODE_PLANS.get(pixel_type)
+        if plan is None:
+            _logger.warning(f"{self.identity} enPixelType[{pixel_type}] is not supported to convert to numpy array now")
+        else:
+            plan = plan.reorder(self.output_channel_order)
+            _logger.debug(f"{self.identity} decode plan[{plan.name}] selected")
+        with self.param_lock:
+            self.decode_plan = None if plan is None else (pixel_type, plan)
+            if plan is not None and self.sdk_gamma_applies(plan):
+                self.set_sdk_gamma(pixel_type, self.gamma)
+
+    def get_decode_plan(self, pixel_type: int) -> DecodePlan:
+        """
+        获得像素格式的解码方案, 不修改相机状态
+        与当前流一致时直接返回 resolve_decode_plan 选定的方案, 否则查表
+        彩色格式按 output_channel_order 调整转换代码, 直接解码为所需的通道顺序
+        :param pixel_type: enPixelType
+        :return:
+        """
+        decode_plan = self.decode_plan
+        if decode_plan is not None and decode_plan[0] == pixel_type:
+            return decode_plan[1]
+
+        plan = DECODE_PLANS.get(pixel_type)
+        if plan is None:
+            raise NotImplementedError(f"frame enPixelType[{pixel_type}] is not supported to convert to numpy array now")
+        return plan.reorder(self.output_channel_order)
+
+    def find_decode_plan(self, pixel_type: int) -> typing.Optional[DecodePlan]:
+        """
+        同 get_decode_plan, 不支持的像素格式返回 None
+        :param pixel_type: enPixelType
+        :return:
+        """
+        try:
+            return self.get_decode_plan(pixel_type)
+        except NotImplementedError:
+            return None
+
+    def get_channel_order(self, pixel_type: int, gray: bool = False) -> ChannelOrder:
+        """
+        获得像素格式解码后的通道顺序
+        :param pixel_type:  enPixelType
+        :param gray:        是否直接解码为灰度图
+        :return:
+        """
+        return self.get_decode_plan(pixel_type).out_order(gray)
+
+    def get_backend(self, plan: DecodePlan) -> ConversionBackend:
+        """
+        按 conversion_backend 获得像素格式的后端
+        :param plan:
+        :return:
+        """
+        name = self.conversion_backend
+        if isinstance(name, dict):
+            name = name.get(plan.name, name.get("default", OpenCVBackend.name))
+        return self.backends[name]
+
+    def select_backend(self, plan: DecodePlan, gray: bool = False) -> ConversionBackend:
+        """
+        获得解码使用的后端, 不支持该方案时回退到 OpenCV
+        :param plan:
+        :param gray:
+        :return:
+        """
+        backend = self.get_backend(plan)
+        if backend.supports(plan, gray=gray, keep_depth=self.high_bit_depth):
+            return backend
+        return self.backends[OpenCVBackend.name]
+
+    def adjust_image(
+            self,
+            image_data: np.ndarray,
+            dst: typing.Optional[np.ndarray] = None,
+            geometry: typing.Optional[FrameGeometry] = None,
+    ) -> np.ndarray:
+        """
+        调整图片 -> resize, rotation, 按预先编译的变换方案执行, 再平场校正、按 gamma/contrast 查表
+        后端按像素格式选择
+        :param image_data:
+        :param dst:         输出数组, 形状须与调整后的图片一致, 缺省从缓存池中分配
+        :param geometry:    取流时的几何快照, 缺省为当前设置
+        :return:
+        """
+        if geometry is None:
+            decode_plan = self.decode_plan
+            geometry = self.snapshot_geometry(None if decode_plan is None else decode_plan[0])
+        # 尚未解码过帧或像素格式不支持时没有解码方案, 使用 OpenCV 后端
+        plan = geometry.decode_plan
+        backend = self.backends[OpenCVBackend.name] if plan is None else self.get_backend(plan)
+        adjusted = backend.transform(geometry.transform_plan, image_data, dst=dst, alloc=self.buffer_pool.acquire)
+        # 变换为空操作或视图时结果与输入共享内存, 查表写入新的 buffer
+        return self.adjust_tone(
+            adjusted,
+            sdk_gamma=plan is not None and self.sdk_gamma_applies(plan),
+            in_place=dst is not None or not np.may_share_memory(adjusted, image_data),
+            plan=plan,
+            flat_field=geometry.flat_field,
+        )
+
+    def snapshot_geometry(self, pixel_type: typing.Optional[int]) -> FrameGeometry:
+        """
+        当前几何设置的快照, 取流时随 Frame 保存
+        :param pixel_type:  enPixelType, None 表示未知
+        :return:
+        """
+        return FrameGeometry(
+            pixel_type=pixel_type,
+            # 不支持的像素格式在解码时报错, 不影响取流
+            decode_plan=None if pixel_type is None else self.find_decode_plan(pixel_type),
+            roi_crop=self.roi_crop,
+            transform_plan=self.transform_plan,
+            named_rois=self.named_rois,
+            flat_field=self.get_flat_field(),
+        )
+
+    # #################### 命名区域 ####################
+    def decoded_size(self, height: int, width: int, geometry: typing.Optional[FrameGeometry] = None) -> tuple[int, int]:
+        """
+        解码后(硬件 ROI 裁剪后)的图像尺寸
+        :param height:      帧的原始尺寸
+        :param width:
+        :param geometry:    取流时的几何快照, 缺省为当前设置
+        :return: height, width
+        """
+        roi_crop = self.roi_crop if geometry is None else geometry.roi_crop
+        return (height, width) if roi_crop is None else (roi_crop[3], roi_crop[2])
+
+    def get_rois_union(
+            self,
+            height: int,
+            width: int,
+            named_rois: typing.Optional[dict[str, tuple[int, int, int, int]]] = None,
+    ) -> tuple[int, int, int, int]:
+        """
+        命名区域的外接矩形, 限制在图像内
+        :param height:      解码后的图像尺寸
+        :param width:
+        :param named_rois:  缺省为当前设置
+        :return: (x, y, width, height)
+        """
+        rects = (self.named_rois if named_rois is None else named_rois).values()
+        x0 = min(rect[0] for rect in rects)
+        y0 = min(rect[1] for rect in rects)
+        x1 = min(width, max(rect[0] + rect[2] for rect in rects))
+        y1 = min(height, max(rect[1] + rect[3] for rect in rects))
+        if x0 >= x1 or y0 >= y1:
+            raise ValueError(f"named rois are outside the image[{width}x{height}]")
+        return x0, y0, x1 - x0, y1 - y0
+
+    def crop_named_rois(
+            self,
+            image_data: np.ndarray,
+            height: int,
+            width: int,
+            geometry: typing.Optional[FrameGeometry] = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        从调整后的图像中以视图取出命名区域, 坐标经 resize/rotation 映射
+        :param image_data:  调整后的图像
+        :param height:      帧的原始尺寸
+        :param width:
+        :param geometry:    取流时的几何快照, 缺省为当前设置
+        :return: {name: 视图}
+        """
+        if geometry is None:
+            geometry = self.snapshot_geometry(None)
+        if not geometry.named_rois:
+            return dict()
+        transform_plan = geometry.transform_plan
+        height, width = self.decoded_size(height, width, geometry)
+        rois = dict()
+        for name, rect in geometry.named_rois.items():
+            x, y, w, h = transform_plan.map_rect(rect, height, width)
+            rois[name] = image_data[y: y + h, x: x + w]
+        return rois
+
+    def render_rois(
+            self,
+            raw: np.ndarray,
+            pixel_type: int,
+            height: int,
+            width: int,
+            geometry: typing.Optional[FrameGeometry] = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        只解码、变换命名区域的外接矩形, 再以视图取出各区域
+        可按像素切片的格式只解码外接矩形, Bayer 及 YUV422 对齐到偶数坐标保持 CFA/色度相位, Bayer 额外保留 2 像素边距使边缘插值与整幅解码一致
+        Packed 格式解码整幅后裁剪, 只省去外接矩形以外的 resize/rotation
+        缩放时区域边界与整幅变换可能相差 1 像素
+        :param raw:         一维 uint8 原始数据
+        :param pixel_type:  enPixelType
+        :param height:      帧的原始尺寸
+        :param width:
+        :param geometry:    取流时的几何快照, 缺省为当前设置
+        :return: {name: 视图}
+        """
+        if geometry is None:
+            geometry = self.snapshot_geometry(pixel_type)
+        named_rois = geometry.named_rois
+        if not named_rois:
+            return dict()
+        plan = geometry.decode_plan or self.get_decode_plan(pixel_type)
+        backend = self.select_backend(plan)
+        roi_crop = geometry.roi_crop
+        offset_x, offset_y = (0, 0) if roi_crop is None else roi_crop[:2]
+        union_x, union_y, union_width, union_height = self.get_rois_union(*self.decoded_size(height, width, geometry), named_rois)
+
+        # 外接矩形在原始帧中的范围
+        x0, y0 = union_x + offset_x, union_y + offset_y
+        x1, y1 = x0 + union_width, y0 + union_height
+        if plan.bayer is not None or plan.channels == 2:
+            margin = 2 if plan.bayer is not None else 0
+            x0, y0 = max(0, x0 - margin) // 2 * 2, max(0, y0 - margin) // 2 * 2
+            x1, y1 = min(width, -(-(x1 + margin) // 2) * 2), min(height, -(-(y1 + margin) // 2) * 2)
+
+        alloc = self.buffer_pool.acquire
+        if plan.kernel is None:
+            sub_raw = np.ascontiguousarray(plan.raw_view(raw, height, width)[y0:y1, x0:x1]).view(np.uint8).reshape(-1)
+            image_data = backend.decode(plan, sub_raw, pixel_type, y1 - y0, x1 - x0, alloc=alloc, keep_depth=self.high_bit_depth)
         else:
-            raise NotImplementedError(f"frame enPixelType[{self.stFrameInfo.enPixelType}] is not supported to convert to numpy array now")
+            image_data = backend.decode(plan, raw, pixel_type, height, width, alloc=alloc, keep_depth=self.high_bit_depth)
+            image_data = image_data[y0:y1, x0:x1]
+
+        # 外接矩形
+        left, top = union_x + offset_x - x0, union_y + offset_y - y0
+        image_data = image_data[top: top + union_height, left: left + union_width]
+        transform_plan = geometry.transform_plan
+        image_data = backend.transform(transform_plan, image_data, alloc=alloc) if not transform_plan.is_identity else image_data
+        # 外接矩形已复制出原始数据, 原地查表
+        # 校正图对应整幅图像, 外接矩形不做平场校正
+        image_data = self.adjust_tone(image_data, sdk_gamma=self.sdk_gamma_applies(plan), in_place=True, plan=plan)
+
+        rois = dict()
+        for name, (x, y, w, h) in named_rois.items():
+            x, y, w, h = transform_plan.map_rect((x - union_x, y - union_y, w, h), union_height, union_width)
+            rois[name] = image_data[y: y + h, x: x + w]
+        return rois
+
+    # #################### SDK 图像处理 ####################
+    def sdk_convert_pixel_type(
+            self,
+            raw: np.ndarray,
+            pixel_type: int,
+            height: int,
+            width: int,
+            dst: np.ndarray,
+            order: ChannelOrder,
+    ) -> np.ndarray:
+        """
+        MV_CC_ConvertPixelTypeEx, 直接写入 dst
+        :param raw:         一维 uint8 连续原始数据
+        :param pixel_type:  enPixelType
+        :param height:
+        :param width:
+        :param dst:         C 连续 uint8 数组, Mono8 为 (height, width), 彩色为 (height, width, 3)
+        :param order:       输出通道顺序, GRAY -> Mono8, RGB -> RGB8_Packed, BGR -> BGR8_Packed
+        :return: dst
+        """
+        dst_pixel_type = {
+            ChannelOrder.GRAY: HIK.PixelType_Gvsp_Mono8,
+            ChannelOrder.RGB: HIK.PixelType_Gvsp_RGB8_Packed,
+            ChannelOrder.BGR: HIK.PixelType_Gvsp_BGR8_Packed,
+        }[order]
+        stConvertParam = HIK.MV_CC_PIXEL_CONVERT_PARAM_EX()
+        ctypes.memset(ctypes.byref(stConvertParam), 0, ctypes.sizeof(stConvertParam))
+        stConvertParam.nWidth = width
+        stConvertParam.nHeight = height
+        stConvertParam.enSrcPixelType = pixel_type
+        stConvertParam.pSrcData = raw.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+        stConvertParam.nSrcDataLen = raw.nbytes
+        stConvertParam.enDstPixelType = dst_pixel_type
+        stConvertParam.pDstBuffer = dst.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+        stConvertParam.nDstBufferSize = dst.nbytes
+        res = self.MV_CC_ConvertPixelTypeEx(stConvertParam)
+        if res != HIK.MV_OK:
+            raise HikCameraError(f"convert pixel type[{pixel_type}] to [{order.value}] failed, error code[{self.mvs_error_code(res)}]")
+        return dst
+
+    def sdk_rotate_image(self, image_data: np.ndarray, turns: int, dst: np.ndarray) -> np.ndarray:
+        """
+        MV_CC_RotateImage, 直接写入 dst
+        :param image_data:  C 连续的 Mono8 (height, width) 或 RGB24/BGR24 (height, width, 3)
+        :param turns:       1 -> MV_IMAGE_ROTATE_90, 2 -> MV_IMAGE_ROTATE_180, 3 -> MV_IMAGE_ROTATE_270
+        :param dst:         C 连续 uint8 数组
+        :return: dst
+        """
+        stRotateParam = HIK.MV_CC_ROTATE_IMAGE_PARAM()
+        ctypes.memset(ctypes.byref(stRotateParam), 0, ctypes.sizeof(stRotateParam))
+        # 旋转只与字节布局有关, RGB24 与 BGR24 相同
+        stRotateParam.enPixelType = HIK.PixelType_Gvsp_Mono8 if image_data.ndim == 2 else HIK.PixelType_Gvsp_RGB8_Packed
+        stRotateParam.nWidth = image_data.shape[1]
+        stRotateParam.nHeight = image_data.shape[0]
+        stRotateParam.pSrcData = image_data.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+        stRotateParam.nSrcDataLen = image_data.nbytes
+        stRotateParam.pDstBuf = dst.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
+        stRotateParam.nDstBufSize = dst.nbytes
+        stRotateParam.enRotationAngle = (HIK.MV_IMAGE_ROTATE_90, HIK.MV_IMAGE_ROTATE_180, HIK.MV_IMAGE_ROTATE_270)[turns - 1]
+        res = self.MV_CC_RotateImage(stRotateParam)
+        if res != HIK.MV_OK:
+            raise HikCameraError(f"rotate image[{turns * 90}] failed, error code[{self.mvs_error_code(res)}]")
+        return dst
+
+    def set_bayer_cvt_quality(self, quality: int):
+        """
+        MV_CC_SetBayerCvtQuality, SDK 后端 Bayer 插值质量
+        :param quality: 0 -> 快速, 1 -> 均衡, 2 -> 最优, 3 -> 最优+
+        :return:
+        """
+        res = self.MV_CC_SetBayerCvtQuality(quality)
+        if res != HIK.MV_OK:
+            raise HikCameraError(f"set bayer cvt quality[{quality}] failed, error code[{self.mvs_error_code(res)}]")
+        _logger.debug(f"{self.identity} set bayer cvt quality[{quality}] successfully")
+
+    def tone_map(self, image_data: np.ndarray, dst: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        高位深图像 -> uint8, 使用按当前像素格式有效位数预先计算的 65536 项查找表
+        :param image_data:
+        :param dst: 输出数组, 缺省从缓存池中分配
+        :return:
+        """
+        if image_data.dtype == np.uint8:
+            return self.write_into(image_data, dst)
+        decode_plan = self.decode_plan
+        bits = decode_plan[1].bits if decode_plan is not None else 16
+        if dst is None:
+            dst = self.buffer_pool.acquire(image_data.shape)
+        return tone_map(image_data, tone_lut(bits), dst=dst)
+
+    write_into = staticmethod(write_into)
+
+    # #################### 查找表 ####################
+    def get_adjust_lut(
+            self,
+            dtype: np.dtype,
+            sdk_gamma: bool = False,
+            plan: typing.Optional[DecodePlan] = None,
+    ) -> typing.Optional[np.ndarray]:
+        """
+        gamma/contrast 查找表, 只在参数、有效位数或元素类型变化时重新生成
+        :param dtype:       图像元素类型
+        :param sdk_gamma:   gamma 已由 SDK 完成, 查找表只做 contrast
+        :param plan:        图像的解码方案, 决定高位深图像的有效位数, 缺省为当前流的解码方案
+        :return: 无需调整时为 None
+        """
+        gamma = None if sdk_gamma else self.gamma
+        if plan is None and self.decode_plan is not None:
+            plan = self.decode_plan[1]
+        bits = plan.bits if plan is not None and dtype == np.uint16 else 8
+        key = (np.dtype(dtype), bits, gamma, self.contrast)
+        adjust_lut = self.adjust_lut
+        if adjust_lut is not None and adjust_lut[0] == key:
+            return adjust_lut[1]
+
+        lut = None
+        if gamma not in (None, 1.0) or self.contrast not in (None, 1.0):
+            lut = build_adjust_lut(*key)
+            _logger.debug(f"{self.identity} adjust lut[{key[0]}, bits={bits}, gamma={gamma}, contrast={self.contrast}] built")
+        self.adjust_lut = (key, lut)
+        return lut
+
+    def adjust_tone(
+            self,
+            image_data: np.ndarray,
+            sdk_gamma: bool = False,
+            in_place: bool = False,
+            plan: typing.Optional[DecodePlan] = None,
+            flat_field: typing.Optional[FlatFieldCorrection] = None,
+    ) -> np.ndarray:
+        """
+        平场校正后按 gamma/contrast 查表, uint8 使用 cv2.LUT, 高位深 uint16 使用 np.take, 无需调整时原样返回
+        :param image_data:
+        :param sdk_gamma:   gamma 已由 SDK 完成
+        :param in_place:    直接写回 image_data, 否则从缓存池中分配
+        :param plan:        图像的解码方案
+        :param flat_field:  平场校正图, None 表示不校正
+        :return:
+        """
+        if flat_field is not None:
+            corrected = self.correct_flat_field(image_data, flat_field, in_place)
+            # 校正结果已位于新的 buffer 中时, 查表可原地进行
+            in_place = in_place or corrected is not image_data
+            image_data = corrected
+        lut = self.get_adjust_lut(image_data.dtype, sdk_gamma, plan)
+        if lut is None:
+            return image_data
+        dst = image_data if in_place else self.buffer_pool.acquire(image_data.shape, image_data.dtype)
+        return apply_lut(image_data, lut, dst=dst)
+
+    def sdk_gamma_applies(self, plan: DecodePlan, gray: bool = False) -> bool:
+        """
+        gamma 是否由 SDK 完成: 需开启 sdk_gamma 且由 SDK 后端解码 Mono8 -> Mono8 或 Bayer -> RGB/BGR
+        SDK gamma 只为 resolve_decode_plan 选定的方案设置, 其余方案由查找表完成
+        :param plan:
+        :param gray:    是否直接解码为灰度图
+        :return:
+        """
+        decode_plan = self.decode_plan
+        if not self.sdk_gamma or decode_plan is None or decode_plan[1] != plan:
+            return False
+        if self.select_backend(plan, gray).name != SDKBackend.name:
+            return False
+        return plan.name == "Mono8" or (plan.bayer is not None and not gray)
+
+    def set_sdk_gamma(self, pixel_type: int, gamma: typing.Optional[float]):
+        """
+        MV_CC_SetGammaValue, SDK 后端转换该像素格式时的 gamma
+        :param pixel_type:  enPixelType, Mono8 / Bayer8/10/12/16
+        :param gamma:       0.1 ~ 4.0, None 时恢复为 1.0
+        :return:
+        """
+        gamma = 1.0 if gamma is None else gamma
+        res = self.MV_CC_SetGammaValue(pixel_type, gamma)
+        if res != HIK.MV_OK:
+            raise HikCameraError(f"set sdk gamma[{gamma}] of pixel type[{pixel_type}] failed, error code[{self.mvs_error_code(res)}]")
+        _logger.debug(f"{self.identity} set sdk gamma[{gamma}] of pixel type[{pixel_type}] successfully")
 
-        return image_data
+    def set_gamma(self, gamma: typing.Optional[float]):
+        """
+        设置查找表 gamma, 查找表在下一帧重新生成; 开启 sdk_gamma 且当前由 SDK 后端解码时同时设置 SDK
+        :param gamma:   None 表示不校正
+        :return:
+        """
+        _check_adjust_params(gamma, self.contrast, self.sdk_gamma)
+        with self.param_lock:
+            decode_plan = self.decode_plan
+            if decode_plan is not None and self.sdk_gamma_applies(decode_plan[1]):
+                self.set_sdk_gamma(decode_plan[0], gamma)
+            self.gamma = gamma
+        _logger.debug(f"{self.identity} set_gamma({gamma}) done")
+
+    def set_contrast(self, contrast: typing.Optional[float]):
+        """
+        设置查找表对比度, 查找表在下一帧重新生成
+        :param contrast:    None 表示不调整
+        :return:
+        """
+        _check_adjust_params(self.gamma, contrast, self.sdk_gamma)
+        self.contrast = contrast
+        _logger.debug(f"{self.identity} set_contrast({contrast}) done")
+
+    # #################### 平场校正 ####################
+    def get_flat_field_signature(self) -> dict:
+        """
+        平场校正图对应的几何参数: ROI、Binning/Decimation、rotation、resize_ratio、PixelFormat 及输出形状
+        :return:
+        """
+        signature = {
+            "roi": self.roi,
+            "rotation": self.rotation.value,
+            "resize_ratio": self.resize_ratio,
+            "pixel_format": self["PixelFormat"],
+            "shape": self.get_image_shape(),
+        }
+        for node in ("BinningHorizontal", "BinningVertical", "DecimationHorizontal", "DecimationVertical"):
+            # 不支持的节点不参与比较
+            with contextlib.suppress(HikCameraError, IndexError):
+                signature[node] = self[node]
+        return signature
+
+    def set_flat_field(self, flat_field: typing.Union[None, str, FlatFieldCorrection]):
+        """
+        设置平场校正图, 与当前几何参数不一致时抛出异常
+        :param flat_field:  FlatFieldCorrection 或 save() 保存的路径, None 表示不校正
+        :return:
+        """
+        if isinstance(flat_field, str):
+            flat_field = FlatFieldCorrection.load(flat_field)
+        if flat_field is not None:
+            mismatch = flat_field.mismatch(self.get_flat_field_signature())
+            if mismatch:
+                raise HikCameraError(f"flat field doesn't match current geometry {mismatch}")
+        self.flat_field_valid = None if flat_field is None else True
+        self.flat_field_correction = flat_field
+        _logger.debug(f"{self.identity} set flat field[{None if flat_field is None else flat_field.shape}] done")
+
+    def validate_flat_field(self):
+        """
+        几何参数修改后计算当前的几何参数并校验平场校正图, 结果供 get_flat_field 读取
+        在 set_roi / apply_transform / start_grabbing (PixelFormat、Binning/Decimation 修改后) 中调用, 取流路径不读取相机节点
+        不一致时告警并跳过校正, 直到几何参数恢复或重新设置校正图
+        :return:
+        """
+        correction = self.flat_field_correction
+        if correction is None:
+            self.flat_field_valid = None
+            return
+        mismatch = correction.mismatch(self.get_flat_field_signature())
+        if mismatch:
+            _logger.warning(f"{self.identity} flat field doesn't match current geometry {mismatch}, correction skipped")
+        self.flat_field_valid = not mismatch
 
-    def adjust_image(self, image_data: np.ndarray) -> np.ndarray:
+    def get_flat_field(self) -> typing.Optional[FlatFieldCorrection]:
+        """
+        与当前几何参数一致的平场校正图, 取流时随几何快照保存
+        只读取 validate_flat_field 的校验结果, 几何参数修改后尚未校验时不校正
+        :return: 不校正时为 None
         """
-        调整图片
+        correction = self.flat_field_correction
+        return correction if correction is not None and self.flat_field_valid else None
+
+    def correct_flat_field(
+            self,
+            image_data: np.ndarray,
+            correction: FlatFieldCorrection,
+            in_place: bool = False,
+    ) -> np.ndarray:
+        """
+        平场及暗场校正, 整数运算; 图像形状或类型与校正图不一致时原样返回
         :param image_data:
+        :param correction:
+        :param in_place:    直接写回 image_data, 否则从缓存池中分配
         :return:
         """
-        # resize
-        if self.resize_ratio != 1.0 or self.resize_ratio is not None:
-            image_data = cv2.resize(
-                image_data, None, None,
-                fx=self.resize_ratio,
-                fy=self.resize_ratio,
-                interpolation=cv2.INTER_AREA
+        if image_data.shape != correction.shape or image_data.dtype != correction.dtype:
+            return image_data
+        return correction.apply(image_data, dst=image_data if in_place else None, alloc=self.buffer_pool.acquire)
+
+    def average_frames(self, n: int) -> np.ndarray:
+        """
+        通过 grab_frame 连续获取 n 帧调用之后到达的新帧求平均, 遮光时得到暗场, 均匀照明时得到平场
+        从帧队列读取时先清空队列并丢弃调用前到达的帧, 避免混入上一阶段(如暗场)的帧
+        各帧按取流时的几何快照单独计算不做平场校正的图像, 不修改相机的校正设置, 其他线程取到的帧照常校正
+        :param n:
+        :return: float64 平均图像
+        """
+        start = time.monotonic()
+        if self.grab_method.is_passive() or self.is_grabber_running:
+            self.frame_queue.clear()
+
+        def grab() -> np.ndarray:
+            frame = self.grab_frame()
+            while frame.arrival < start:
+                frame = self.grab_frame()
+            geometry = frame.geometry
+            if geometry is None:
+                geometry = self.snapshot_geometry(frame.pixel_type)
+            return self.render_raw(
+                frame.raw, frame.pixel_type, frame.height, frame.width,
+                geometry=dataclasses.replace(geometry, flat_field=None),
             )
 
-        # rotation
-        if self.rotation.is_rotate():
-            image_data = cv2.rotate(image_data, self.rotation.value)
+        return FlatFieldCorrection.average(grab, n)
+
+    def learn_flat_field(
+            self,
+            n: int = 16,
+            dark: typing.Optional[np.ndarray] = None,
+            path: typing.Optional[str] = None,
+    ) -> FlatFieldCorrection:
+        """
+        在均匀照明下学习平场校正图并立即启用
+        :param n:       平均的帧数
+        :param dark:    遮光时 average_frames() 得到的暗场, None 表示不做暗场校正
+        :param path:    保存路径 (.npz), None 表示不保存
+        :return:
+        """
+        if self.gamma not in (None, 1.0) or self.contrast not in (None, 1.0):
+            _logger.warning(f"{self.identity} learning flat field with gamma/contrast enabled, correction will not be linear")
+        flat = self.average_frames(n)
+        correction = FlatFieldCorrection.from_frames(
+            flat, dark, dtype=self.get_image_dtype(), signature=self.get_flat_field_signature()
+        )
+        if path is not None:
+            correction.save(path)
+        self.set_flat_field(correction)
+        return correction
+
+    # #################### 连拍 ####################
+    def get_image_shape(self) -> tuple[int, ...]:
+        """
+        获得 调整后的图片形状
+        :return: (height, width) 或 (height, width, channels)
+        """
+        height, width = self.get_image_size()
+        return self.get_decode_plan(self["PixelFormat"]).out_shape(height, width)
+
+    def get_image_dtype(self) -> np.dtype:
+        """
+        获得 调整后的图片元素类型
+        :return: 高位深模式下高位深格式为 uint16, 其余为 uint8
+        """
+        return self.get_decode_plan(self["PixelFormat"]).out_dtype(self.high_bit_depth)
+
+    def capture_burst(self, n: int, out: typing.Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        连拍 n 帧, 每一帧解码、resize、rotation 后直接写入预分配的连续数组 out[i], 不再 np.stack
+        被动取流或后台取流线程运行时, 从帧队列中读取并复制到 out[i]
+        :param n:   帧数
+        :param out: 形状为 (n, H, W[, C]) 的数组, 缺省时按 PixelFormat 及调整后的图片尺寸分配, 高位深模式下可能为 uint16
+        :return: (out, info), info 为 Frame.INFO_DTYPE 结构化数组, 逐帧保存帧信息
+        """
+        shape = (n, *self.get_image_shape())
+        dtype = self.get_image_dtype()
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape or out.dtype != dtype:
+            raise ValueError(f"burst out array shape{out.shape}|{out.dtype} mismatch, expected {shape}|{dtype}")
+
+        info = np.empty(n, dtype=Frame.INFO_DTYPE)
+        for i in range(n):
+            if self.grab_method.is_passive() or self.is_grabber_running:
+                frame = self.grab_frame()
+                frame.render(dst=out[i])
+            else:
+                with self.lock:
+                    frame_buffer, stFrameInfo = self.poll_frame_buffer()
+                frame = Frame(None, stFrameInfo)
+                self.render_raw(frame_buffer, stFrameInfo.enPixelType, stFrameInfo.nHeight, stFrameInfo.nWidth, dst=out[i])
+            info[i] = frame.info_record()
+
+        _logger.debug(f"{self.identity} capture_burst({n}) done")
+        return out, info
+
+    def get_raw_frame_layout(self) -> tuple[tuple[int, ...], np.dtype]:
+        """
+        根据 Width/Height/PixelFormat 获得一帧原始数据的形状和类型
+        像素位数取自 PixelFormat 的 16-23 位, 单色/彩色标志取自 24-31 位 (GigE Vision PFNC 编码)
+        :return: (shape, dtype)
+            8/24/32 位 -> (height, width[, channels]), uint8
+            16 位单色(Mono/Bayer 10/12/16) -> (height, width), uint16
+            16 位彩色(YUV422/YCbCr422 等, 每像素 2 个 8 位分量) -> (height, width, 2), uint8
+            其他(Packed) -> (frame_bytes,), uint8
+        """
+        width = self["Width"]
+        height = self["Height"]
+        pixel_type = self["PixelFormat"]
+        bits = (pixel_type >> 16) & 0xFF
+        if bits == 8:
+            return (height, width), np.dtype(np.uint8)
+        elif bits in (24, 32):
+            return (height, width, bits // 8), np.dtype(np.uint8)
+        elif bits == 16 and (pixel_type >> 24) & 0xFF == 0x01:
+            # PFNC 单色标志, Bayer 格式同样带有该标志
+            return (height, width), np.dtype(np.uint16)
+        elif bits == 16:
+            return (height, width, 2), np.dtype(np.uint8)
+        else:
+            return (height * width * bits // 8,), np.dtype(np.uint8)
+
+    def capture_burst_to_file(self, path: str, n: int) -> tuple[np.memmap, np.ndarray]:
+        """
+        连拍 n 帧原始数据直接写入预分配的 np.memmap 文件(.npy), 适用于超出内存的长时间连拍
+        帧信息索引保存在同名的 .index.npy 文件中, 可通过 load_burst() 立即重新打开
+            GetOneFrameTimeout -> SDK 直接写入映射页; PayloadSize 大于帧大小(如开启 chunk 数据)时经 poll_frame_buffer 写入 self.frame_buffer 后复制
+            GetImageBuffer     -> SDK 缓存直接复制到映射页, 不经过 self.frame_buffer
+        被动取流不支持
+        :param path: .npy 文件路径
+        :param n:    帧数
+        :return: (frames, info), frames 为 (n, ...) 的 np.memmap, info 为 Frame.INFO_DTYPE 结构化数组
+        """
+        if self.grab_method.is_passive() or self.is_grabber_running:
+            raise HikCameraError(f"capture_burst_to_file() shouldn't be called in grab method[{self.grab_method.name}] or with grabber running")
+
+        frame_shape, dtype = self.get_raw_frame_layout()
+        frame_bytes = int(np.prod(frame_shape)) * dtype.itemsize
+
+        # 文件夹
+        saved_dir = os.path.dirname(path)
+        if saved_dir:
+            os.makedirs(saved_dir, exist_ok=True)
+
+        # 预分配文件, 并预留磁盘空间, 避免连拍过程中分配磁盘块或空间不足
+        frames = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n, *frame_shape))
+        if hasattr(os, "posix_fallocate"):
+            with open(path, "r+b") as f:
+                os.posix_fallocate(f.fileno(), 0, os.path.getsize(path))
+
+        # SDK 写入长度可能达到 PayloadSize, 超出帧大小时不能直接写入映射页
+        direct = self.grab_method == GrabMethod.GetOneFrameTimeout and self.nPayloadSize <= frame_bytes
+
+        info = np.empty(n, dtype=Frame.INFO_DTYPE)
+        count = 0
+        try:
+            for i in range(n):
+                address = frames[i].ctypes.data
+                with self.lock:
+                    if direct:
+                        res = self.MV_CC_GetOneFrameTimeout(
+                            pData=ctypes.c_void_p(address),
+                            nDataSize=frame_bytes,
+                            stFrameInfo=self.stFrameInfo,
+                            nMsec=self.get_one_frame_timeout_ms,
+                        )
+                        if res != HIK.MV_OK:
+                            raise HikCameraError(f"get one frame failed, error code[{self.mvs_error_code(res)}]")
+                        if self.stFrameInfo.nFrameLen != frame_bytes:
+                            raise HikCameraError(f"frame length[{self.stFrameInfo.nFrameLen}] mismatch, expected {frame_bytes}")
+                    elif self.grab_method == GrabMethod.GetImageBuffer:
+                        res = self.MV_CC_GetImageBuffer(stFrame=self.stOutFrame, nMsec=self.get_one_frame_timeout_ms)
+                        if res != HIK.MV_OK:
+                            raise HikCameraError(f"get one frame failed, error code[{self.mvs_error_code(res)}]")
+                        self.stFrameInfo = self.stOutFrame.stFrameInfo
+                        nFrameLen = self.stFrameInfo.nFrameLen
+                        if nFrameLen == frame_bytes:
+                            self.memcpy_func(ctypes.c_void_p(address), self.stOutFrame.pBufAddr, nFrameLen)
+                        self.MV_CC_FreeImageBuffer(self.stOutFrame)
+                        if nFrameLen != frame_bytes:
+                            raise HikCameraError(f"frame length[{nFrameLen}] mismatch, expected {frame_bytes}")
+                    else:
+                        frame_buffer, _ = self.poll_frame_buffer()
+                        if frame_buffer.nbytes != frame_bytes:
+                            raise HikCameraError(f"frame length[{frame_buffer.nbytes}] mismatch, expected {frame_bytes}")
+                        self.memcpy_func(ctypes.c_void_p(address), ctypes.c_void_p(frame_buffer.ctypes.data), frame_bytes)
+                    info[i] = Frame(None, self.stFrameInfo).info_record()
+                count += 1
+        finally:
+            frames.flush()
+            # 只保存已拍摄帧的索引
+            np.save(self.burst_index_path(path), info[:count])
+
+        _logger.debug(f"{self.identity} capture_burst_to_file({path}, {n}) done")
+        return frames, info
+
+    @staticmethod
+    def burst_index_path(path: str) -> str:
+        """连拍文件对应的帧信息索引文件路径"""
+        return f"{os.path.splitext(path)[0]}.index.npy"
 
-        return image_data
+    @classmethod
+    def load_burst(cls, path: str) -> tuple[np.memmap, np.ndarray]:
+        """
+        以只读内存映射方式重新打开 capture_burst_to_file() 保存的连拍文件
+        :param path:
+        :return: (frames, info), 连拍未完成时 frames 只有前 len(info) 帧有效
+        """
+        frames = np.load(path, mmap_mode="r")
+        info = np.load(cls.burst_index_path(path))
+        return frames, info
 
     # #################### 获取/设置参数 ####################
     def getitem(self, key: str) -> typing.Any:
@@ -797,7 +2227,7 @@ class HikrobotCamera(HIK.MvCamera):
         :param key:
         :return:
         """
-        if key in ["rotation", "resize_ratio", "image_size"]:
+        if key in ["rotation", "resize_ratio", "image_size", "roi", "gamma", "contrast"]:
             return self.get_custom_param(key=key)
         else:
             # Get key setting data type
@@ -836,7 +2266,7 @@ class HikrobotCamera(HIK.MvCamera):
                 raise TypeError(f"illegal dtype[{dtype}] in getitem({key})")
 
             # get parameter from the camera
-            with self.lock:
+            with self.param_lock:
                 res = get_func(key, stValue)
                 if res != HIK.MV_OK:
                     raise HikCameraError(f"{get_func.__name__}({key}) failed, error code[{self.mvs_error_code(res)}]")
@@ -863,10 +2293,10 @@ class HikrobotCamera(HIK.MvCamera):
         :param value:
         :return:
         """
-        if value is None and key != "resize_ratio":
+        if value is None and key not in ["resize_ratio", "roi", "gamma", "contrast"]:
             return
 
-        if key in ["rotation", "resize_ratio"]:
+        if key in ["rotation", "resize_ratio", "roi", "gamma", "contrast"]:
             self.set_custom_param(key=key, value=value)
         else:
             if not self.access_mode.has_control_permission():
@@ -904,11 +2334,18 @@ class HikrobotCamera(HIK.MvCamera):
                 raise TypeError(f"illegal dtype[{dtype}] in setitem({key})")
 
             # set parameter of the camera
-            with self.lock:
+            with self.param_lock:
                 res = set_func(*params)
                 if res != HIK.MV_OK:
                     raise HikCameraError(f"{set_func.__name__}{params} failed, error code[{self.mvs_error_code(res)}]")
 
+            # 平场校正图须重新校验, 这些节点只能在停止取流时修改, 由 start_grabbing 校验
+            if key == "PixelFormat" or key.startswith(("Binning", "Decimation")):
+                self.flat_field_valid = None
+            # 重新选定解码方案
+            if key == "PixelFormat":
+                self.resolve_decode_plan()
+
             # 更新 userid
             if key == "DeviceUserID":
                 self.DeviceUserID = value
@@ -925,6 +2362,12 @@ class HikrobotCamera(HIK.MvCamera):
             return self.get_resize_ratio()
         elif key == "image_size":
             return self.get_image_size()
+        elif key == "roi":
+            return self.get_roi()
+        elif key == "gamma":
+            return self.gamma
+        elif key == "contrast":
+            return self.contrast
         else:
             raise HikCameraError(f"illegal parameter in get_custom_param({key})")
 
@@ -933,6 +2376,12 @@ class HikrobotCamera(HIK.MvCamera):
             self.set_rotation(int(value))
         elif key == "resize_ratio":
             self.set_resize_ratio(None if value is None else float(value))
+        elif key == "roi":
+            self.set_roi(None if value is None else tuple(int(v) for v in value))
+        elif key == "gamma":
+            self.set_gamma(None if value is None else float(value))
+        elif key == "contrast":
+            self.set_contrast(None if value is None else float(value))
         else:
             raise HikCameraError(f"illegal parameter in set_custom_param({key}, {value})")
 
@@ -941,38 +2390,283 @@ class HikrobotCamera(HIK.MvCamera):
         return self.rotation.value
 
     def set_rotation(self, rotation: int):
-        with self.lock:
-            try:
-                self.rotation = Rotation(rotation)
-                _logger.debug(f"{self.identity} set_rotation({rotation}) done")
-            except Exception as err:
-                raise ValueError(f"set_rotation({rotation}) error") from err
+        try:
+            rotation = Rotation(rotation)
+        except Exception as err:
+            raise ValueError(f"set_rotation({rotation}) error") from err
+        self.apply_transform(self.resize_ratio, rotation)
+        _logger.debug(f"{self.identity} set_rotation({rotation}) done")
 
     def get_resize_ratio(self) -> typing.Optional[float]:
         _logger.debug(f"{self.identity} get_resize_ratio()={self.resize_ratio}")
         return self.resize_ratio
 
     def set_resize_ratio(self, resize_ratio: typing.Optional[float]):
-        with self.lock:
+        self.apply_transform(resize_ratio, self.rotation)
+        _logger.debug(f"{self.identity} set_resize_ratio({self.resize_ratio}) done")
+
+    def apply_transform(self, resize_ratio: typing.Optional[float], rotation: Rotation):
+        """
+        应用 resize/rotation: 相机端完成可完成的部分, 主机端编译剩余部分的变换方案
+        :param resize_ratio:
+        :param rotation:
+        :return:
+        """
+        # 先校验参数, 避免相机端已修改而主机端失败
+        self.compile_transform_plan(resize_ratio, rotation)
+
+        host_resize_ratio, host_rotation = self.offload_transform(resize_ratio, rotation)
+        transform_plan = self.compile_transform_plan(host_resize_ratio, host_rotation)
+        with self.param_lock:
+            self.transform_plan = transform_plan
             self.resize_ratio = resize_ratio
-            _logger.debug(f"{self.identity} set_resize_ratio({self.resize_ratio}) done")
+            self.rotation = rotation
+        self.validate_flat_field()
+
+    def compile_transform_plan(self, resize_ratio: typing.Optional[float], rotation: Rotation) -> TransformPlan:
+        """
+        编译 resize/rotation 变换方案, 取流线程读取 self.transform_plan 时整体替换, 无需加锁
+        :param resize_ratio:
+        :param rotation:
+        :return:
+        """
+        return TransformPlan.compile(
+            resize_ratio=resize_ratio,
+            rotate_code=rotation.value if rotation.is_rotate() else None,
+            views=self.geometry_views,
+        )
+
+    # #################### 相机端变换 ####################
+    def offload_transform(self, resize_ratio: typing.Optional[float], rotation: Rotation) -> tuple[typing.Optional[float], Rotation]:
+        """
+        将相机支持的变换写入相机, 在传输前完成, 同时节省带宽和主机 CPU
+            Rotation.CW180  -> ReverseX + ReverseY
+            resize_ratio    -> BinningHorizontal/Vertical (优先) 或 DecimationHorizontal/Vertical, 倍数 k <= 1 / resize_ratio
+        90° 旋转需要转置, 相机无法完成
+        相机不支持的节点在设置失败后回退到主机处理; 修改 Binning/Decimation 时暂停取流
+        :param resize_ratio:
+        :param rotation:
+        :return: 主机端剩余的 (resize_ratio, rotation)
+        """
+        if not self.sensor_offload or not self.is_opened_flag or not self.access_mode.has_control_permission():
+            return resize_ratio, rotation
+
+        # 相机端缩小倍数上限
+        factor = 1
+        if resize_ratio is not None and resize_ratio < 1.0:
+            factor = min(int(1.0 / resize_ratio + 1e-9), 4)
+
+        if factor != self.sensor_factor:
+            with self.paused_grabbing():
+                self.set_sensor_factor(factor)
+                # ROI 以未 binning 的像素计, 按新的倍数重新设置
+                if self.roi is not None:
+                    self.apply_roi(self.roi)
+
+        reverse = rotation == Rotation.CW180
+        if reverse != self.sensor_reverse:
+            self.set_sensor_reverse(reverse)
+
+        host_resize_ratio = None if resize_ratio is None else resize_ratio * self.sensor_factor
+        host_rotation = Rotation.NONE if reverse and self.sensor_reverse else rotation
+        _logger.debug(
+            f"{self.identity} offload transform: sensor reverse[{self.sensor_reverse}] {self.sensor_factor_node}[{self.sensor_factor}], "
+            f"host resize_ratio[{host_resize_ratio}] rotation[{host_rotation.name}]"
+        )
+        return host_resize_ratio, host_rotation
+
+    def set_sensor_reverse(self, reverse: bool) -> bool:
+        """
+        设置 ReverseX/ReverseY
+        :param reverse:
+        :return: 是否成功
+        """
+        try:
+            self["ReverseX"] = reverse
+            self["ReverseY"] = reverse
+        except HikCameraError as err:
+            _logger.warning(f"{self.identity} set sensor reverse[{reverse}] failed, fall back to host: {err}")
+            # 尽量恢复
+            with contextlib.suppress(HikCameraError):
+                self["ReverseX"] = False
+            self.sensor_reverse = False
+            return False
+        self.sensor_reverse = reverse
+        return True
+
+    def set_sensor_factor(self, factor: int) -> int:
+        """
+        设置相机端缩小倍数, 依次尝试 Binning 和 Decimation 的 factor, factor-1, ..., 2, 需要停止取流
+        :param factor:  倍数上限
+        :return: 实际倍数, 均不支持时为 1
+        """
+        # 先复位当前节点, 两种方式不能同时生效
+        if self.sensor_factor_node is not None:
+            with contextlib.suppress(HikCameraError):
+                self[f"{self.sensor_factor_node}Horizontal"] = 1
+                self[f"{self.sensor_factor_node}Vertical"] = 1
+        self.sensor_factor = 1
+        self.sensor_factor_node = None
+
+        for node in ("Binning", "Decimation"):
+            for k in range(factor, 1, -1):
+                try:
+                    self[f"{node}Horizontal"] = k
+                    self[f"{node}Vertical"] = k
+                except HikCameraError as err:
+                    _logger.debug(f"{self.identity} set {node}[{k}] failed: {err}")
+                    with contextlib.suppress(HikCameraError):
+                        self[f"{node}Horizontal"] = 1
+                    continue
+                self.sensor_factor = k
+                self.sensor_factor_node = node
+                return k
+        if factor > 1:
+            _logger.warning(f"{self.identity} neither Binning nor Decimation is supported, fall back to host resize")
+        return 1
+
+    @contextlib.contextmanager
+    def paused_grabbing(self):
+        """
+        暂停取流, 用于修改 Binning/Decimation/ROI 等取流时不可修改的参数
+        退出时恢复取流及后台取流线程, start_grabbing 会重新读取 PayloadSize
+        """
+        was_grabbing = self.is_grabbing_flag
+        was_grabber_running = self.is_grabber_running
+        if was_grabbing:
+            res = self.stop_grabbing()
+            if res != HIK.MV_OK:
+                raise HikCameraError(f"stop grabbing failed, error code[{self.mvs_error_code(res)}]")
+        try:
+            yield
+        finally:
+            if was_grabbing:
+                res = self.start_grabbing()
+                if res != HIK.MV_OK:
+                    raise HikCameraError(f"start grabbing[{self.grab_method.name}] failed, error code[{self.mvs_error_code(res)}]")
+                if was_grabber_running:
+                    self.start_grabber()
+
+    # #################### ROI ####################
+    def get_roi(self) -> typing.Optional[tuple[int, int, int, int]]:
+        _logger.debug(f"{self.identity} get_roi()={self.roi}")
+        return self.roi
+
+    def set_roi(self, roi: typing.Optional[tuple[int, int, int, int]]):
+        """
+        设置感兴趣区域, 暂停取流后写入 OffsetX/OffsetY/Width/Height
+        PayloadSize 及缓存池 buffer 在恢复取流时按新的帧长度重新获取
+        :param roi: (offset_x, offset_y, width, height), 以未 binning 的传感器像素计, 为 None 时恢复整幅图像
+        :return:
+        """
+        if roi is not None:
+            if len(roi) != 4 or roi[0] < 0 or roi[1] < 0 or roi[2] <= 0 or roi[3] <= 0:
+                raise ValueError(f"set_roi({roi}) error, expected (offset_x, offset_y, width, height)")
+        if not self.access_mode.has_control_permission():
+            raise HikCameraError(f"set_roi({roi}) shouldn't be called in access mode[{self.access_mode.name}]")
+
+        with self.paused_grabbing():
+            self.apply_roi(roi)
+        self.roi = roi
+        self.validate_flat_field()
+        _logger.debug(f"{self.identity} set_roi({roi}) done, crop{self.roi_crop}")
+
+    def apply_roi(self, roi: typing.Optional[tuple[int, int, int, int]]):
+        """
+        将 ROI 对齐到各节点的 nInc/nMin/nMax 后写入相机, 需要停止取流
+        相机端区域包含 ROI, 剩余部分记录在 self.roi_crop 中, 解码后以视图裁剪
+        :param roi:
+        :return:
+        """
+        # 先复位偏移, Width/Height 的 nMax 才是整幅尺寸
+        self["OffsetX"] = 0
+        self["OffsetY"] = 0
+        if roi is None:
+            self["Width"] = self.get_int_range("Width")[1]
+            self["Height"] = self.get_int_range("Height")[1]
+            self.roi_crop = None
+            return
+
+        # 换算到相机输出像素
+        k = self.sensor_factor
+        offset_x, offset_y, width, height = roi
+        x0, y0 = offset_x // k, offset_y // k
+        width, height = -(-(offset_x + width) // k) - x0, -(-(offset_y + height) // k) - y0
+
+        crop_x = self.align_roi_axis(x0, width, "OffsetX", "Width")
+        crop_y = self.align_roi_axis(y0, height, "OffsetY", "Height")
+        if crop_x == 0 and crop_y == 0 and self["Width"] == width and self["Height"] == height:
+            self.roi_crop = None
+        else:
+            self.roi_crop = (crop_x, crop_y, width, height)
+
+    def align_roi_axis(self, offset: int, size: int, offset_key: str, size_key: str) -> int:
+        """
+        对齐 ROI 的一个方向: 偏移向下、尺寸向上对齐到 nInc, 相机端区域包含 [offset, offset + size)
+        :param offset:
+        :param size:
+        :param offset_key:  OffsetX / OffsetY
+        :param size_key:    Width / Height
+        :return: 剩余的裁剪偏移
+        """
+        size_min, size_max, size_inc = self.get_int_range(size_key)
+        offset_min, _, offset_inc = self.get_int_range(offset_key)
+        if offset + size > size_max:
+            raise ValueError(f"roi {offset_key}[{offset}] + {size_key}[{size}] exceeds {size_key} max[{size_max}]")
+
+        def align_up(value: int, base: int, inc: int) -> int:
+            return base + -(-(value - base) // inc) * inc
+
+        cam_offset = offset_min + (offset - offset_min) // offset_inc * offset_inc
+        cam_size = max(size_min, align_up(offset - cam_offset + size, size_min, size_inc))
+        # 超出右/下边界时左移相机区域
+        while cam_offset + cam_size > size_max and cam_offset - offset_inc >= offset_min:
+            cam_offset -= offset_inc
+            cam_size = max(size_min, align_up(offset - cam_offset + size, size_min, size_inc))
+        cam_size = min(cam_size, size_max - cam_offset)
+
+        # 先设置尺寸再设置偏移, 偏移的 nMax 取决于尺寸
+        self[size_key] = cam_size
+        self[offset_key] = cam_offset
+        return offset - cam_offset
+
+    @staticmethod
+    def crop_roi(image_data: np.ndarray, roi_crop: tuple[int, int, int, int]) -> np.ndarray:
+        """
+        以视图裁剪, 不复制数据
+        :param image_data:
+        :param roi_crop: (x, y, width, height)
+        :return:
+        """
+        x, y, width, height = roi_crop
+        return image_data[y: y + height, x: x + width]
+
+    def get_int_range(self, key: str) -> tuple[int, int, int]:
+        """
+        获得整型节点的取值范围
+        :param key:
+        :return: (nMin, nMax, nInc)
+        """
+        stValue = HIK.MVCC_INTVALUE()
+        ctypes.memset(ctypes.byref(stValue), 0, ctypes.sizeof(HIK.MVCC_INTVALUE))
+        with self.param_lock:
+            res = self.MV_CC_GetIntValue(key, stValue)
+            if res != HIK.MV_OK:
+                raise HikCameraError(f"MV_CC_GetIntValue({key}) failed, error code[{self.mvs_error_code(res)}]")
+        return stValue.nMin, stValue.nMax, max(stValue.nInc, 1)
 
     def get_image_size(self) -> tuple[int, int]:
         """
         获得 图片尺寸
         :return:  height, width
         """
-        width = self["Width"]
-        height = self["Height"]
-
-        # resize
-        if self.resize_ratio != 1.0 or self.resize_ratio is not None:
-            width = int(width * self.resize_ratio)
-            height = int(height * self.resize_ratio)
-
-        # rotate 90°
-        if self.rotation.is_90():
-            height, width = width, height
+        roi_crop = self.roi_crop
+        if roi_crop is None:
+            height, width = self["Height"], self["Width"]
+        else:
+            height, width = roi_crop[3], roi_crop[2]
+        # resize, rotate 90°
+        height, width = self.transform_plan.out_size(height, width)
 
         _logger.debug(f"{self.identity} get_image_size()=({height},{width})")
         return height, width
@@ -1034,7 +2728,7 @@ class HikrobotCamera(HIK.MvCamera):
         # 输入数据的像素格式
         stSaveParam.enPixelType = self.stFrameInfo.enPixelType
         # 输入数据缓存
-        stSaveParam.pData = ctypes.cast(self.frame_buffer, ctypes.POINTER(ctypes.c_ubyte))
+        stSaveParam.pData = self.frame_buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte))
         # 输入数据大小
         stSaveParam.nDataLen = self.stFrameInfo.nFrameLen
         # 输入图片格式
@@ -1116,10 +2810,12 @@ class HikrobotCamera(HIK.MvCamera):
     def save_image_by_cv(path: str, image: np.ndarray, **kwargs) -> int:
         """
         保存图片，使用opencv，支持 .jpg, .png, .bmp
+        uint16 图像保存为 .png 时保持 16 位, 保存为 .jpg/.bmp 时查表映射为 8 位
         :param path:
         :param image:       图像 numpy数组
         :param kwargs:      jpg_quality，JPEG图片质量[0,100]，默认100
                             png_compression，PNG压缩等级[0,9]，默认0（0:无压缩，9:最大压缩, 数值越大，文件越小但压缩越慢）
+                            bits，uint16 图像的有效位数，用于映射为 8 位，默认16
         :return:
         """
         # 文件格式
@@ -1144,6 +2840,10 @@ class HikrobotCamera(HIK.MvCamera):
         else:
             params = list()
 
+        # jpg/bmp 不支持 16 位
+        if image.dtype == np.uint16 and file_format != "png":
+            image = tone_map(image, tone_lut(kwargs.get("bits", 16)))
+
         # 保存
         success = cv2.imwrite(path, image, params)
         if success:
@@ -1,5 +1,9 @@
+import typing
+import asyncio
 from threading import Thread, Lock
 
+from .frame_queue import AsyncFrameQueue
+
 
 class MultiHikrobotCameras(dict):
     def __getattr__(self, attr):
@@ -36,6 +40,53 @@ class MultiHikrobotCameras(dict):
 
         return func
 
+    async def aget_one_frame(self) -> dict:
+        """
+        所有相机并发获取一帧画面, asyncio.gather 语义
+        :return: {ip: 图像 或 异常对象}
+        """
+        results = await asyncio.gather(*(camera.aget_one_frame() for camera in self.values()), return_exceptions=True)
+        res = dict(zip(self.keys(), results))
+        # 排序（确保顺序一致）
+        return {ip: res[ip] for ip in sorted(res)}
+
+    async def aframes(self, maxsize: typing.Optional[int] = None, timeout_ms: typing.Optional[int] = None) -> typing.AsyncIterator[tuple]:
+        """
+        所有相机的异步帧迭代器, as_completed 语义, 按到达顺序产出
+        async for ip, frame in cameras.aframes()
+        :param maxsize:     异步帧队列长度, 缺省为各相机 frame_queue_size 之和, 消费过慢时丢弃最旧的帧
+        :param timeout_ms:  等待每一帧的超时时间, None 表示一直等待
+        :return:
+        """
+        if maxsize is None:
+            maxsize = sum(camera.frame_queue_size for camera in self.values())
+        aqueue = AsyncFrameQueue(asyncio.get_running_loop(), maxsize=maxsize)
+
+        # 为每个相机注册帧处理函数, 附带相机 ip
+        handlers = dict()
+        for ip, camera in self.items():
+            handlers[ip] = lambda frame, _ip=ip: aqueue.put_threadsafe((_ip, frame))
+            camera.add_frame_handler(handlers[ip])
+        # 已引用后台取流线程的相机, 退出时只释放这些相机
+        acquired = list()
+        try:
+            for camera in self.values():
+                camera.acquire_grabber()
+                acquired.append(camera)
+            while True:
+                try:
+                    item = await aqueue.get(timeout=None if timeout_ms is None else timeout_ms / 1000)
+                except asyncio.TimeoutError:
+                    # 避免循环导入
+                    from .hikrobot_camera import HikCameraError
+                    raise HikCameraError(f"cameras get one frame failed, no frame in {timeout_ms}ms") from None
+                yield item
+        finally:
+            for ip, camera in self.items():
+                camera.remove_frame_handler(handlers[ip])
+            # stop_grabber 会等待取流线程退出, 不阻塞事件循环
+            await asyncio.gather(*(asyncio.to_thread(camera.release_grabber) for camera in acquired))
+
     def __enter__(self):
         self.__getattr__("__enter__")()
         return self
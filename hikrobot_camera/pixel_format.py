@@ -0,0 +1,484 @@
+import enum
+import typing
+import functools
+import dataclasses
+import numpy as np
+import cv2
+
+
+class ChannelOrder(str, enum.Enum):
+    """解码输出图像的通道顺序"""
+    GRAY = "GRAY"
+    RGB = "RGB"
+    BGR = "BGR"
+
+
+# 输出 RGB 的颜色转换代码 <-> 输出 BGR 的颜色转换代码, 用于将通道交换融合到解码中
+# None (3 通道原始数据直接输出) <-> COLOR_RGB2BGR (== COLOR_BGR2RGB)
+SWAP_RB_CVT_CODES: dict[typing.Optional[int], typing.Optional[int]] = {
+    None: cv2.COLOR_RGB2BGR,
+    cv2.COLOR_RGB2BGR: None,
+    cv2.COLOR_BAYER_BG2RGB: cv2.COLOR_BAYER_BG2BGR,
+    cv2.COLOR_BAYER_BG2BGR: cv2.COLOR_BAYER_BG2RGB,
+    cv2.COLOR_BAYER_RG2RGB: cv2.COLOR_BAYER_RG2BGR,
+    cv2.COLOR_BAYER_RG2BGR: cv2.COLOR_BAYER_RG2RGB,
+    cv2.COLOR_BAYER_GB2RGB: cv2.COLOR_BAYER_GB2BGR,
+    cv2.COLOR_BAYER_GB2BGR: cv2.COLOR_BAYER_GB2RGB,
+    cv2.COLOR_BAYER_GR2RGB: cv2.COLOR_BAYER_GR2BGR,
+    cv2.COLOR_BAYER_GR2BGR: cv2.COLOR_BAYER_GR2RGB,
+    cv2.COLOR_RGBA2RGB: cv2.COLOR_RGBA2BGR,
+    cv2.COLOR_RGBA2BGR: cv2.COLOR_RGBA2RGB,
+    cv2.COLOR_BGRA2RGB: cv2.COLOR_BGRA2BGR,
+    cv2.COLOR_BGRA2BGR: cv2.COLOR_BGRA2RGB,
+    cv2.COLOR_YUV2RGB_UYVY: cv2.COLOR_YUV2BGR_UYVY,
+    cv2.COLOR_YUV2BGR_UYVY: cv2.COLOR_YUV2RGB_UYVY,
+    cv2.COLOR_YUV2RGB_YUYV: cv2.COLOR_YUV2BGR_YUYV,
+    cv2.COLOR_YUV2BGR_YUYV: cv2.COLOR_YUV2RGB_YUYV,
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class DecodePlan:
+    """
+    像素格式解码方案
+    每种像素格式预先确定原始数据的类型、形状及 OpenCV 转换代码(或 numpy 解码核),
+    取流时按 enPixelType 查表得到方案后直接解码, 不再逐帧走 if 分支
+    """
+    # 像素格式名称
+    name: str
+    # 原始数据(或解码核输出)的元素类型
+    dtype: type = np.uint8
+    # 原始数据每个像素的元素个数
+    channels: int = 1
+    # 有效位数, 大于 8 时缩放到 8 位
+    bits: int = 8
+    # OpenCV 颜色转换代码, None 表示不需要转换
+    cvt_code: typing.Optional[int] = None
+    # 输出通道数
+    out_channels: int = 1
+    # 直接解码为灰度图的 OpenCV 颜色转换代码, 用于彩色格式, 灰度格式无需转换
+    gray_code: typing.Optional[int] = None
+    # Bayer 排列 (GenICam 名称, 如 "RG"), 用于超像素解码
+    bayer: typing.Optional[str] = None
+    # 解码核 kernel(raw, height, width, out) -> ndarray, 用于 OpenCV 无法直接处理的格式(如 Packed), 替代 raw_view
+    kernel: typing.Optional[typing.Callable[..., np.ndarray]] = None
+    # 融合解码核 kernel8(raw, height, width, out) -> uint8 ndarray, 一步完成解码和缩放到 8 位
+    kernel8: typing.Optional[typing.Callable[..., np.ndarray]] = None
+    # 彩色输出的通道顺序
+    order: ChannelOrder = ChannelOrder.RGB
+    # 转换代码没有交换 R/B 的对应代码时, 解码后单独交换一次通道
+    swap_rb: bool = False
+
+    def out_order(self, gray: bool = False) -> ChannelOrder:
+        """输出图像的通道顺序"""
+        return ChannelOrder.GRAY if self.out_channels == 1 or gray else self.order
+
+    def reorder(self, order: ChannelOrder) -> typing.Self:
+        """
+        输出指定通道顺序的解码方案, 通道交换融合到 cvtColor 中, 不增加额外的转换
+        SWAP_RB_CVT_CODES 中没有对应代码时回退为解码后单独交换通道
+        :param order:   RGB / BGR, 灰度格式及 GRAY 不改变方案
+        :return:
+        """
+        order = ChannelOrder(order)
+        if self.out_channels == 1 or order == ChannelOrder.GRAY or order == self.order:
+            return self
+        if self.swap_rb:
+            return dataclasses.replace(self, swap_rb=False, order=order)
+        if self.cvt_code not in SWAP_RB_CVT_CODES:
+            return dataclasses.replace(self, swap_rb=True, order=order)
+        return dataclasses.replace(self, cvt_code=SWAP_RB_CVT_CODES[self.cvt_code], order=order)
+
+    def out_shape(self, height: int, width: int, gray: bool = False) -> tuple[int, ...]:
+        """输出图像形状"""
+        return (height, width) if self.out_channels == 1 or gray else (height, width, self.out_channels)
+
+    def out_dtype(self, keep_depth: bool = False) -> np.dtype:
+        """输出图像元素类型"""
+        return np.dtype(self.dtype if keep_depth else np.uint8)
+
+    def raw_view(self, raw: np.ndarray, height: int, width: int) -> np.ndarray:
+        """
+        将一维 uint8 原始数据零拷贝地转换为 (height, width[, channels]) 视图
+        :param raw:
+        :param height:
+        :param width:
+        :return:
+        """
+        count = height * width * self.channels
+        image_data = raw[: count * np.dtype(self.dtype).itemsize].view(self.dtype)
+        if self.channels == 1:
+            return image_data.reshape(height, width)
+        return image_data.reshape(height, width, self.channels)
+
+    def decode(
+            self,
+            raw: np.ndarray,
+            height: int,
+            width: int,
+            dst: typing.Optional[np.ndarray] = None,
+            alloc: typing.Optional[typing.Callable[..., np.ndarray]] = None,
+            fused: bool = True,
+            keep_depth: bool = False,
+            gray: bool = False,
+    ) -> np.ndarray:
+        """
+        解码为 uint8 图像, keep_depth 时高位深格式保持 uint16 (数值范围为 0 ~ 2**bits-1)
+        :param raw:     一维 uint8 原始数据
+        :param height:
+        :param width:
+        :param dst:     输出数组, 无需转换时(如 Mono8)不会写入, 由调用者复制
+        :param alloc:   中间结果及输出数组的分配函数 alloc(shape, dtype), 缺省为 np.empty
+        :param fused:   存在融合解码核时, 是否直接解码为 8 位
+        :param keep_depth:  是否保持高位深, 不缩放到 8 位
+        :param gray:    是否直接解码为灰度图 (Bayer 格式不经过彩色插值)
+        :return:
+        """
+        if alloc is None:
+            alloc = np.empty
+        cvt_code = self.gray_code if gray and self.out_channels != 1 else self.cvt_code
+        swap_rb = self.swap_rb and self.out_channels != 1 and not gray
+        # 之后没有颜色转换时直接写入 dst
+        last = cvt_code is None and not swap_rb
+
+        if fused and not keep_depth and self.kernel8 is not None:
+            shape = (height, width) if self.channels == 1 else (height, width, self.channels)
+            target = dst if last and dst is not None else alloc(shape, np.uint8)
+            image_data = self.kernel8(raw, height, width, target)
+        elif self.kernel is not None:
+            shape = (height, width) if self.channels == 1 else (height, width, self.channels)
+            image_data = self.kernel(raw, height, width, alloc(shape, self.dtype))
+        else:
+            image_data = self.raw_view(raw, height, width)
+
+        # 高位深 -> 8 位
+        if image_data.dtype != np.uint8 and not keep_depth:
+            if last and dst is not None:
+                target = dst
+            else:
+                target = alloc(image_data.shape, np.uint8)
+            image_data = cv2.convertScaleAbs(image_data, target, alpha=1.0 / (1 << (self.bits - 8)))
+
+        # 颜色转换, OpenCV 的 Bayer 及通道转换均支持 uint16
+        if cvt_code is not None:
+            target = dst if dst is not None and not swap_rb else alloc(self.out_shape(height, width, gray), image_data.dtype)
+            image_data = cv2.cvtColor(image_data, cvt_code, dst=target)
+
+        if swap_rb:
+            target = dst if dst is not None else alloc(image_data.shape, image_data.dtype)
+            image_data = cv2.cvtColor(image_data, cv2.COLOR_RGB2BGR, dst=target)
+
+        return image_data
+
+    def decode_half(
+            self,
+            raw: np.ndarray,
+            height: int,
+            width: int,
+            dst: typing.Optional[np.ndarray] = None,
+            alloc: typing.Optional[typing.Callable[..., np.ndarray]] = None,
+            keep_depth: bool = False,
+    ) -> np.ndarray:
+        """
+        Bayer 超像素解码, 每个 2x2 CFA 单元直接输出一个彩色像素, 得到 (height // 2, width // 2, 3) 的图像
+        用于缩放比例不大于 0.5 的场景, 省去全分辨率插值和随后的缩小
+        :param raw:     一维 uint8 原始数据
+        :param height:
+        :param width:
+        :param dst:     输出数组
+        :param alloc:   中间结果及输出数组的分配函数 alloc(shape, dtype), 缺省为 np.empty
+        :param keep_depth:  是否保持高位深, 不缩放到 8 位
+        :return:
+        """
+        if self.bayer is None:
+            raise ValueError(f"pixel format[{self.name}] is not bayer")
+        if alloc is None:
+            alloc = np.empty
+
+        if not keep_depth and self.kernel8 is not None:
+            mosaic = self.kernel8(raw, height, width, alloc((height, width), np.uint8))
+        elif self.kernel is not None:
+            mosaic = self.kernel(raw, height, width, alloc((height, width), self.dtype))
+        else:
+            mosaic = self.raw_view(raw, height, width)
+
+        # 高位深在半尺寸图像上缩放到 8 位, 计算量只有全尺寸的 3/4
+        scale = mosaic.dtype != np.uint8 and not keep_depth
+        shape = (height // 2, width // 2, 3)
+        target = dst if dst is not None and not scale else alloc(shape, mosaic.dtype)
+        image_data = superpixel_demosaic(mosaic, self.bayer, out=target, order=self.order)
+        if scale:
+            target = dst if dst is not None else alloc(shape, np.uint8)
+            image_data = cv2.convertScaleAbs(image_data, target, alpha=1.0 / (1 << (self.bits - 8)))
+        return image_data
+
+
+# #################### Bayer 超像素解码 ####################
+# 2x2 CFA 单元拆分为 [偶数行偶数列, 偶数行奇数列, 奇数行偶数列, 奇数行奇数列], 各排列中 (R, G1, G2, B) 的下标
+BAYER_SUPERPIXEL_INDEX: dict[str, tuple[int, int, int, int]] = {
+    "RG": (0, 1, 2, 3),
+    "BG": (3, 1, 2, 0),
+    "GR": (1, 0, 3, 2),
+    "GB": (2, 0, 3, 1),
+}
+
+
+def superpixel_demosaic(
+        mosaic: np.ndarray,
+        bayer: str,
+        out: typing.Optional[np.ndarray] = None,
+        order: ChannelOrder = ChannelOrder.RGB,
+) -> np.ndarray:
+    """
+    超像素(2x2 CFA 合并)解码: R、B 取自各自像素, G 取两个绿色像素的均值
+    拆分由 cv2.split 在双通道视图上完成, 不做全分辨率插值
+    :param mosaic:  (height, width) Bayer 原始数据, uint8 或 uint16, 奇数尺寸时舍弃最后一行/列
+    :param bayer:   GenICam 排列名称, "RG" / "BG" / "GR" / "GB"
+    :param out:     (height // 2, width // 2, 3) 输出数组
+    :param order:   输出通道顺序, RGB / BGR
+    :return:
+    """
+    half_height, half_width = mosaic.shape[0] // 2, mosaic.shape[1] // 2
+    mosaic = mosaic[: half_height * 2, : half_width * 2]
+    # 偶数行、奇数行分别视为双通道图像, 通道 0/1 为偶数列/奇数列
+    planes = (
+        *cv2.split(mosaic[0::2].reshape(half_height, half_width, 2)),
+        *cv2.split(mosaic[1::2].reshape(half_height, half_width, 2)),
+    )
+    r, g1, g2, b = (planes[i] for i in BAYER_SUPERPIXEL_INDEX[bayer])
+    g = cv2.addWeighted(g1, 0.5, g2, 0.5, 0)
+    return cv2.merge((b, g, r) if order == ChannelOrder.BGR else (r, g, b), dst=out)
+
+
+# #################### 色调映射 ####################
+def build_tone_lut(bits: int = 16, black: int = 0, white: typing.Optional[int] = None, gamma: float = 1.0) -> np.ndarray:
+    """
+    生成 65536 项的 uint16 -> uint8 色调映射查找表
+    :param bits:    有效位数, 决定缺省白点
+    :param black:   黑点, 不大于该值的映射为 0
+    :param white:   白点, 不小于该值的映射为 255, 缺省为 2**bits-1
+    :param gamma:   gamma 校正, 1.0 为线性
+    :return:
+    """
+    if white is None:
+        white = (1 << bits) - 1
+    if white <= black:
+        raise ValueError(f"tone lut white[{white}] must be greater than black[{black}]")
+    x = np.clip((np.arange(65536, dtype=np.float64) - black) / (white - black), 0.0, 1.0)
+    if gamma != 1.0:
+        x **= 1.0 / gamma
+    return np.rint(x * 255).astype(np.uint8)
+
+
+@functools.lru_cache(maxsize=None)
+def tone_lut(bits: int) -> np.ndarray:
+    """按有效位数缓存的线性查找表, 只读"""
+    lut = build_tone_lut(bits)
+    lut.flags.writeable = False
+    return lut
+
+
+def tone_map(image: np.ndarray, lut: np.ndarray, dst: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    uint16 -> uint8 查表映射, 每个像素一次查表, 不做浮点运算
+    :param image:   uint16 图像
+    :param lut:     65536 项 uint8 查找表
+    :param dst:     与 image 形状相同的 uint8 数组
+    :return:
+    """
+    # uint16 索引不会越界, mode="clip" 使 np.take 直接写入 dst 而不经过临时缓存
+    return np.take(lut, image, out=dst, mode="clip")
+
+
+def build_adjust_lut(
+        dtype: typing.Union[np.dtype, type] = np.uint8,
+        bits: int = 8,
+        gamma: typing.Optional[float] = None,
+        contrast: typing.Optional[float] = None,
+) -> np.ndarray:
+    """
+    生成保持位深的 gamma / contrast 查找表, uint8 为 256 项, uint16 为 65536 项
+    先 gamma 校正, 再以中灰为中心按 contrast 拉伸
+    :param dtype:       图像元素类型, uint8 或 uint16
+    :param bits:        uint16 图像的有效位数, 决定满量程, 超出满量程的输入映射为满量程
+    :param gamma:       gamma 值, 大于 1 提亮暗部, None 或 1.0 为线性
+    :param contrast:    对比度倍数, None 或 1.0 不变
+    :return: 与 dtype 相同类型的只读查找表
+    """
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        size, full = 256, 255
+    elif dtype == np.uint16:
+        size, full = 65536, (1 << bits) - 1
+    else:
+        raise TypeError(f"adjust lut dtype[{dtype}] should be uint8 or uint16")
+    x = np.minimum(np.arange(size, dtype=np.float64) / full, 1.0)
+    if gamma is not None and gamma != 1.0:
+        x **= 1.0 / gamma
+    if contrast is not None and contrast != 1.0:
+        x = np.clip((x - 0.5) * contrast + 0.5, 0.0, 1.0)
+    lut = np.rint(x * full).astype(dtype)
+    lut.flags.writeable = False
+    return lut
+
+
+def apply_lut(image: np.ndarray, lut: np.ndarray, dst: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    逐像素查表, uint8 使用 cv2.LUT, uint16 使用 np.take
+    :param image:   uint8 / uint16 图像, 多通道共用同一查找表
+    :param lut:     build_adjust_lut 生成的查找表
+    :param dst:     与 image 形状、类型相同的数组, 可以是 image 本身
+    :return:
+    """
+    if image.dtype == np.uint8:
+        return cv2.LUT(image, lut, dst=dst)
+    return np.take(lut, image, out=dst, mode="clip")
+
+
+# #################### Packed 解码核 ####################
+# GigE Vision Mono10Packed / Mono12Packed (Bayer 同理): 每 2 个像素占 3 个字节
+#   byte0 -> p0 高 8 位
+#   byte1 -> 低 4 位为 p0 低位, 高 4 位为 p1 低位 (10 位时各取最低 2 位)
+#   byte2 -> p1 高 8 位
+def packed_triplets(raw: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    将一维 Packed 原始数据转换为 (height * width / 2, 3) 的字节三元组视图
+    :param raw:
+    :param height:
+    :param width:
+    :return:
+    """
+    count = height * width
+    if count % 2:
+        raise ValueError(f"packed frame pixel count[{count}] must be even")
+    return raw[: count * 3 // 2].reshape(-1, 3)
+
+
+def unpack_12_packed(raw: np.ndarray, height: int, width: int, out: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Mono12_Packed / Bayer*12_Packed -> uint16
+    :param raw:     一维 uint8 连续原始数据
+    :param height:
+    :param width:
+    :param out:     (height, width) uint16 连续数组
+    :return:
+    """
+    triplets = packed_triplets(raw, height, width)
+    if out is None:
+        out = np.empty((height, width), dtype=np.uint16)
+    pairs = out.reshape(-1, 2)
+    # p1 = (byte2 << 4) | (byte1 >> 4), 恰为从 byte1 起的小端 uint16 右移 4 位
+    words = np.ndarray((len(triplets),), dtype="<u2", buffer=raw, offset=1, strides=(3,))
+    np.right_shift(words, 4, out=pairs[:, 1])
+    # p0 = (byte0 << 4) | (byte1 & 0x0F)
+    np.left_shift(triplets[:, 0], 4, out=pairs[:, 0], dtype=np.uint16)
+    pairs[:, 0] |= triplets[:, 1] & 0x0F
+    return out
+
+
+def unpack_10_packed(raw: np.ndarray, height: int, width: int, out: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Mono10_Packed / Bayer*10_Packed -> uint16
+    :param raw:     一维 uint8 原始数据
+    :param height:
+    :param width:
+    :param out:     (height, width) uint16 连续数组
+    :return:
+    """
+    triplets = packed_triplets(raw, height, width)
+    if out is None:
+        out = np.empty((height, width), dtype=np.uint16)
+    pairs = out.reshape(-1, 2)
+    low = triplets[:, 1]
+    # p0 = (byte0 << 2) | (byte1 & 0x03)
+    np.left_shift(triplets[:, 0], 2, out=pairs[:, 0], dtype=np.uint16)
+    pairs[:, 0] |= low & 0x03
+    # p1 = (byte2 << 2) | ((byte1 >> 4) & 0x03)
+    np.left_shift(triplets[:, 2], 2, out=pairs[:, 1], dtype=np.uint16)
+    pairs[:, 1] |= (low >> 4) & 0x03
+    return out
+
+
+def unpack_packed_to_8(raw: np.ndarray, height: int, width: int, out: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Packed -> uint8, 解码与缩放融合
+    byte0/byte2 恰为两个像素的高 8 位, 只需跨步复制, 不读取 byte1
+    :param raw:     一维 uint8 原始数据
+    :param height:
+    :param width:
+    :param out:     (height, width) uint8 连续数组
+    :return:
+    """
+    triplets = packed_triplets(raw, height, width)
+    if out is None:
+        out = np.empty((height, width), dtype=np.uint8)
+    pairs = out.reshape(-1, 2)
+    pairs[:, 0] = triplets[:, 0]
+    pairs[:, 1] = triplets[:, 2]
+    return out
+
+
+# #################### YCbCr 4:2:2 解码核 ####################
+# 每 2 个像素占 4 个字节, 两个像素共用一组 Cb/Cr
+#   UYVY (CbYCrY) -> Cb Y0 Cr Y1
+#   YUYV (YCbYCr) -> Y0 Cb Y1 Cr
+# OpenCV 的 COLOR_YUV2RGB_UYVY/YUYV 为有限范围 BT.601, 其余色彩标准由 ycbcr_matrix 以 cv2.transform 完成
+YUV422_INDEX: dict[str, tuple[int, int, int]] = {
+    # (Y 在像素对中的下标, Cb 在 4 字节组中的下标, Cr 在 4 字节组中的下标)
+    "UYVY": (1, 0, 2),
+    "YUYV": (0, 1, 3),
+}
+
+
+def ycbcr_matrix(kr: float, kb: float, full_range: bool = False) -> np.ndarray:
+    """
+    YCbCr -> RGB 仿射矩阵, 作用于 (Y, Cb, Cr) 三通道图像
+    :param kr:  BT.601 为 0.299, BT.709 为 0.2126
+    :param kb:  BT.601 为 0.114, BT.709 为 0.0722
+    :param full_range:  Y/C 是否为全范围 [0, 255], 否则为有限范围 Y [16, 235], C [16, 240]
+    :return: (3, 4) float32, 最后一列为偏移
+    """
+    kg = 1.0 - kr - kb
+    y_scale, c_scale, y_offset = (1.0, 1.0, 0.0) if full_range else (255 / 219, 255 / 224, 16.0)
+    # 各通道对 (Y, Cb, Cr) 的系数
+    coefficients = np.array([
+        [y_scale, 0.0, 2 * (1 - kr) * c_scale],
+        [y_scale, -2 * kb * (1 - kb) / kg * c_scale, -2 * kr * (1 - kr) / kg * c_scale],
+        [y_scale, 2 * (1 - kb) * c_scale, 0.0],
+    ])
+    offsets = -coefficients @ np.array([y_offset, 128.0, 128.0])
+    return np.hstack([coefficients, offsets[:, None]]).astype(np.float32)
+
+
+# 全范围 BT.601 (GenICam YCbCr422_8), 有限范围 BT.709 (GenICam YCbCr709_422_8)
+YCBCR_FULL_601 = ycbcr_matrix(0.299, 0.114, full_range=True)
+YCBCR_709 = ycbcr_matrix(0.2126, 0.0722)
+
+
+def yuv422_to_rgb(
+        raw: np.ndarray,
+        height: int,
+        width: int,
+        out: typing.Optional[np.ndarray] = None,
+        layout: str = "UYVY",
+        matrix: np.ndarray = YCBCR_709,
+) -> np.ndarray:
+    """
+    YCbCr 4:2:2 -> RGB, 色度按最近邻上采样后与 Y 合并, 再以仿射矩阵一次转换
+    :param raw:     一维 uint8 原始数据
+    :param height:
+    :param width:   偶数
+    :param out:     (height, width, 3) uint8 输出数组
+    :param layout:  "UYVY" / "YUYV"
+    :param matrix:  ycbcr_matrix() 的结果
+    :return:
+    """
+    if width % 2:
+        raise ValueError(f"yuv422 frame width[{width}] must be even")
+    y_index, cb_index, cr_index = YUV422_INDEX[layout]
+    data = raw[: height * width * 2]
+    y = data.reshape(height, width, 2)[..., y_index]
+    groups = data.reshape(height, width // 2, 4)
+    cb = cv2.resize(groups[..., cb_index], (width, height), interpolation=cv2.INTER_NEAREST)
+    cr = cv2.resize(groups[..., cr_index], (width, height), interpolation=cv2.INTER_NEAREST)
+    return cv2.transform(cv2.merge((y, cb, cr)), matrix, dst=out)
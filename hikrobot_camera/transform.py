@@ -0,0 +1,246 @@
+import typing
+import dataclasses
+import numpy as np
+import cv2
+
+
+def write_into(image_data: np.ndarray, dst: typing.Optional[np.ndarray]) -> np.ndarray:
+    """
+    确保结果位于 dst 中, OpenCV 已原地写入 dst 时不再复制
+    :param image_data:
+    :param dst:
+    :return:
+    """
+    if dst is None or image_data.ctypes.data == dst.ctypes.data:
+        return image_data if dst is None else dst
+    np.copyto(dst, image_data)
+    return dst
+
+
+# cv2.rotate 旋转代码 -> np.rot90 的 k (逆时针为正)
+ROT90_K: dict[int, int] = {
+    cv2.ROTATE_90_CLOCKWISE: -1,
+    cv2.ROTATE_180: 2,
+    cv2.ROTATE_90_COUNTERCLOCKWISE: 1,
+}
+
+
+def decimation_step(shape: tuple[int, ...], height: int, width: int) -> typing.Optional[int]:
+    """
+    由 shape 缩小到 (height, width) 的整数抽取步长
+    :param shape:   输入形状
+    :param height:  目标高度
+    :param width:   目标宽度
+    :return: 步长 k, 使 image[:height * k:k, :width * k:k] 的形状恰为 (height, width); 不满足时返回 None
+    """
+    step = round(shape[0] / height)
+    if step < 2 or step != round(shape[1] / width):
+        return None
+    # 只接受整数倍缩小, 余数来自尺寸取整
+    if abs(shape[0] - height * step) >= step or abs(shape[1] - width * step) >= step:
+        return None
+    # 切片长度为 ceil(min(n, size * k) / k)
+    if -(-min(shape[0], height * step) // step) != height or -(-min(shape[1], width * step) // step) != width:
+        return None
+    return step
+
+
+@dataclasses.dataclass(frozen=True)
+class TransformPlan:
+    """
+    图像几何变换方案 (resize + rotation)
+    在 set_resize_ratio / set_rotation 时编译一次, 逐帧只执行必要的操作:
+      - resize_ratio 为 None 或 1.0、不旋转时跳过对应操作
+      - 缩小时先 resize 再旋转, 放大时先旋转再 resize, 旋转处理的像素最少
+      - 中间结果及输出写入缓存池 buffer 或调用者提供的 dst, 稳态时不再分配内存
+
+    视图模式 (views=True):
+      - 旋转为 np.rot90 跨步视图, 整数倍缩小为 [::k, ::k] 切片, 均不复制数据
+      - 非整数倍缩放仍使用 cv2.resize
+      - 需要连续数组的消费者自行调用 np.ascontiguousarray (或 Frame.contiguous), 只在此时复制
+      - 整数倍缩小为最近邻抽取, 不做 INTER_AREA 平均, 有混叠
+    """
+    # 缩放比例, None 表示不缩放
+    resize_ratio: typing.Optional[float] = None
+    # cv2.rotate 旋转代码, None 表示不旋转
+    rotate_code: typing.Optional[int] = None
+    # 插值方式
+    interpolation: int = cv2.INTER_AREA
+    # 视图模式
+    views: bool = False
+
+    @classmethod
+    def compile(
+            cls,
+            resize_ratio: typing.Optional[float] = None,
+            rotate_code: typing.Optional[int] = None,
+            views: bool = False,
+    ) -> typing.Self:
+        """
+        :param resize_ratio:    缩放比例, None 或 1.0 表示不缩放
+        :param rotate_code:     cv2.ROTATE_*, None 表示不旋转
+        :param views:           是否使用视图模式
+        :return:
+        """
+        if resize_ratio is not None:
+            resize_ratio = float(resize_ratio)
+            if resize_ratio <= 0:
+                raise ValueError(f"resize_ratio[{resize_ratio}] must be positive")
+            if resize_ratio == 1.0:
+                resize_ratio = None
+        return cls(resize_ratio=resize_ratio, rotate_code=rotate_code, views=views)
+
+    @property
+    def is_identity(self) -> bool:
+        """是否为空操作"""
+        return self.resize_ratio is None and self.rotate_code is None
+
+    @property
+    def swaps_axes(self) -> bool:
+        """是否交换宽高 (旋转 90°)"""
+        return self.rotate_code in (cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_90_COUNTERCLOCKWISE)
+
+    @property
+    def resize_first(self) -> bool:
+        """是否先 resize 再旋转"""
+        return self.resize_ratio is not None and self.resize_ratio < 1.0
+
+    def resized_size(self, height: int, width: int) -> tuple[int, int]:
+        """
+        resize 后的尺寸
+        :param height:
+        :param width:
+        :return: height, width
+        """
+        if self.resize_ratio is None:
+            return height, width
+        return max(1, round(height * self.resize_ratio)), max(1, round(width * self.resize_ratio))
+
+    def out_size(self, height: int, width: int) -> tuple[int, int]:
+        """
+        变换后的尺寸
+        :param height:
+        :param width:
+        :return: height, width
+        """
+        height, width = self.resized_size(height, width)
+        return (width, height) if self.swaps_axes else (height, width)
+
+    def map_rect(self, rect: tuple[int, int, int, int], height: int, width: int) -> tuple[int, int, int, int]:
+        """
+        将变换前的矩形映射到变换后的图像坐标, 缩放时向外取整, 保证覆盖原区域
+        :param rect:    (x, y, width, height), 变换前的坐标
+        :param height:  变换前的图像尺寸
+        :param width:
+        :return: (x, y, width, height), 变换后的坐标
+        """
+        x, y, w, h = rect
+        resized_height, resized_width = self.resized_size(height, width)
+        if (resized_height, resized_width) != (height, width):
+            scale_y, scale_x = resized_height / height, resized_width / width
+            x0, y0 = int(np.floor(x * scale_x)), int(np.floor(y * scale_y))
+            x1 = min(resized_width, int(np.ceil((x + w) * scale_x)))
+            y1 = min(resized_height, int(np.ceil((y + h) * scale_y)))
+            x, y, w, h = x0, y0, max(1, x1 - x0), max(1, y1 - y0)
+
+        if self.rotate_code == cv2.ROTATE_90_CLOCKWISE:
+            return resized_height - y - h, x, h, w
+        if self.rotate_code == cv2.ROTATE_90_COUNTERCLOCKWISE:
+            return y, resized_width - x - w, h, w
+        if self.rotate_code == cv2.ROTATE_180:
+            return resized_width - x - w, resized_height - y - h, w, h
+        return x, y, w, h
+
+    def apply(
+            self,
+            image_data: np.ndarray,
+            height: typing.Optional[int] = None,
+            width: typing.Optional[int] = None,
+            dst: typing.Optional[np.ndarray] = None,
+            alloc: typing.Optional[typing.Callable[..., np.ndarray]] = None,
+    ) -> np.ndarray:
+        """
+        执行变换
+        :param image_data:
+        :param height:  缩放前的尺寸, 缺省为 image_data 的尺寸; 输入已缩小(如超像素解码)时传入原始尺寸, 只缩放剩余部分
+        :param width:
+        :param dst:     输出数组, 形状须为 out_size; 视图模式下给出 dst 时仍写入 dst
+        :param alloc:   中间结果及输出数组的分配函数 alloc(shape, dtype), 缺省为 np.empty
+        :return:
+        """
+        if alloc is None:
+            alloc = np.empty
+        if height is None or width is None:
+            height, width = image_data.shape[:2]
+
+        resized_height, resized_width = self.resized_size(height, width)
+        to_resize = image_data.shape[:2] != (resized_height, resized_width)
+        to_rotate = self.rotate_code is not None
+        channels = image_data.shape[2:]
+
+        def target(shape: tuple[int, int], last: bool) -> np.ndarray:
+            if last and dst is not None:
+                return dst
+            return alloc((*shape, *channels), image_data.dtype)
+
+        def swapped(shape: tuple[int, ...]) -> tuple[int, int]:
+            return (shape[1], shape[0]) if self.swaps_axes else (shape[0], shape[1])
+
+        if not to_resize and not to_rotate:
+            return write_into(image_data, dst)
+
+        if self.views and dst is None:
+            return self.apply_views(image_data, resized_height, resized_width, alloc)
+
+        if not to_rotate:
+            image_data = cv2.resize(
+                image_data, (resized_width, resized_height),
+                dst=target((resized_height, resized_width), True), interpolation=self.interpolation
+            )
+        elif not to_resize:
+            image_data = cv2.rotate(image_data, self.rotate_code, dst=target(swapped(image_data.shape), True))
+        elif self.resize_first:
+            image_data = cv2.resize(
+                image_data, (resized_width, resized_height),
+                dst=target((resized_height, resized_width), False), interpolation=self.interpolation
+            )
+            image_data = cv2.rotate(image_data, self.rotate_code, dst=target(swapped(image_data.shape), True))
+        else:
+            image_data = cv2.rotate(image_data, self.rotate_code, dst=target(swapped(image_data.shape), False))
+            out_height, out_width = swapped((resized_height, resized_width))
+            image_data = cv2.resize(
+                image_data, (out_width, out_height),
+                dst=target((out_height, out_width), True), interpolation=self.interpolation
+            )
+
+        return write_into(image_data, dst)
+
+    def apply_views(
+            self,
+            image_data: np.ndarray,
+            resized_height: int,
+            resized_width: int,
+            alloc: typing.Callable[..., np.ndarray],
+    ) -> np.ndarray:
+        """
+        以视图执行变换, 只有非整数倍缩放会生成新数组
+        :param image_data:
+        :param resized_height:  resize 后的尺寸
+        :param resized_width:
+        :param alloc:
+        :return:
+        """
+        if image_data.shape[:2] != (resized_height, resized_width):
+            step = decimation_step(image_data.shape, resized_height, resized_width)
+            if step is not None:
+                image_data = image_data[: resized_height * step: step, : resized_width * step: step]
+            else:
+                image_data = cv2.resize(
+                    image_data, (resized_width, resized_height),
+                    dst=alloc((resized_height, resized_width, *image_data.shape[2:]), image_data.dtype),
+                    interpolation=self.interpolation
+                )
+
+        if self.rotate_code is not None:
+            image_data = np.rot90(image_data, ROT90_K[self.rotate_code])
+        return image_data
@@ -0,0 +1,61 @@
+import argparse
+from hikrobot_camera import benchmark
+
+
+#  uv run python -m test.benchmark
+#  uv run python -m test.benchmark --ip 192.168.4.101   (同时测试 sdk 后端, 需要 MVS SDK)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark frame decoding and transforming on this host"
+    )
+    parser.add_argument(
+        "-W", "--width",
+        type=int,
+        help="frame width",
+        default=2448
+    )
+    parser.add_argument(
+        "-H", "--height",
+        type=int,
+        help="frame height",
+        default=2048
+    )
+    parser.add_argument(
+        "-r", "--repeat",
+        type=int,
+        help="repeat times of each case",
+        default=20
+    )
+    parser.add_argument(
+        "--resize",
+        type=float,
+        help="resize ratio of the backend cases",
+        default=None
+    )
+    parser.add_argument(
+        "--rotation",
+        type=int,
+        choices=[0, 1, 2],
+        help="rotate code of the backend cases, 0 -> cw90, 1 -> 180, 2 -> ccw90",
+        default=None
+    )
+    parser.add_argument(
+        "--ip",
+        type=str,
+        help="camera ip, benchmark the sdk backend with its handle",
+        default=None
+    )
+    args = parser.parse_args()
+
+    camera = None
+    if args.ip is not None:
+        from hikrobot_camera import HikrobotCamera
+        camera = HikrobotCamera(ip=args.ip)
+        camera.create_handle()
+    try:
+        benchmark.run(args.width, args.height, args.repeat, args.resize, args.rotation, camera)
+    finally:
+        if camera is not None:
+            camera.destroy_handle()
@@ -0,0 +1,68 @@
+import pytest
+
+
+@pytest.fixture
+def make_camera():
+    """
+    创建不连接设备的相机, 只初始化 SDK, 用于测试解码、变换等主机端逻辑
+    :return: make_camera(**kwargs) -> HikrobotCamera
+    """
+    hikrobot_camera = pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+    def make(**kwargs) -> "hikrobot_camera.HikrobotCamera":
+        kwargs.setdefault("host_ip", "127.0.0.1")
+        return hikrobot_camera.HikrobotCamera(ip="127.0.0.1", **kwargs)
+
+    yield make
+    # 构造参数会写入 load_params 的类级缓存, 每个测试重新加载
+    if hasattr(hikrobot_camera.HikrobotCamera, "_params_cache"):
+        del hikrobot_camera.HikrobotCamera._params_cache
+
+
+@pytest.fixture
+def count_allocations(monkeypatch):
+    """
+    记录缓存池新分配的字节数
+    :return: count_allocations(pool) -> list[int], 之后每次分配追加一项
+    """
+    def count(pool) -> list[int]:
+        allocations = list()
+        allocate = pool._allocate
+
+        def counted(nbytes: int):
+            allocations.append(nbytes)
+            return allocate(nbytes)
+
+        monkeypatch.setattr(pool, "_allocate", counted)
+        return allocations
+
+    return count
+
+
+@pytest.fixture
+def fake_nodes(monkeypatch):
+    """
+    以字典模拟相机节点, 用于不连接设备时测试读写节点的逻辑
+    :return: fake_nodes(camera, nodes, ranges=None, unsupported=()) -> list[(key, value)], 之后每次写入追加一项
+        nodes:          {key: value}, 读写的节点
+        ranges:         {key: (nMin, nMax, nInc)}, get_int_range 的结果
+        unsupported:    写入时报错的节点
+    """
+    def install(camera, nodes: dict, ranges: dict = None, unsupported: tuple = ()) -> list:
+        from hikrobot_camera import HikCameraError
+
+        writes = list()
+
+        def setitem(self, key, value):
+            if key in unsupported:
+                raise HikCameraError(f"set {key} failed")
+            writes.append((key, value))
+            nodes[key] = value
+
+        monkeypatch.setattr(type(camera), "__getitem__", lambda self, key: nodes[key])
+        monkeypatch.setattr(type(camera), "__setitem__", setitem)
+        if ranges is not None:
+            monkeypatch.setattr(camera, "get_int_range", lambda key: ranges[key])
+        return writes
+
+    return install
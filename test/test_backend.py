@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+import cv2
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera.backend import NumpyBackend, OpenCVBackend, create_backend
+from hikrobot_camera.hikrobot_camera import DECODE_PLANS
+from hikrobot_camera.pixel_format import ChannelOrder
+from hikrobot_camera.transform import TransformPlan
+
+from .test_decode_plans import HEIGHT, WIDTH, random_raw
+
+
+def valid_raw(pixel_type: int) -> np.ndarray:
+    """原始数据, 16 位容器中的数值不超过有效位数"""
+    plan = DECODE_PLANS[pixel_type]
+    if plan.dtype != np.uint16 or plan.kernel is not None:
+        return random_raw(pixel_type)
+    samples = np.random.default_rng(0).integers(0, 1 << plan.bits, HEIGHT * WIDTH * plan.channels, dtype=np.uint16)
+    return samples.view(np.uint8)
+
+
+NUMPY_PLANS = {
+    pixel_type: plan for pixel_type, plan in DECODE_PLANS.items()
+    if NumpyBackend().supports(plan) or NumpyBackend().supports(plan.reorder(ChannelOrder.BGR))
+}
+
+
+def test_create_backend():
+    assert isinstance(create_backend("opencv"), OpenCVBackend)
+    assert isinstance(create_backend("numpy"), NumpyBackend)
+    with pytest.raises(ValueError):
+        create_backend("sdk")
+    with pytest.raises(ValueError):
+        create_backend("cuda")
+
+
+def test_numpy_backend_supports():
+    names = {plan.name for plan in NUMPY_PLANS.values()}
+    assert {"Mono8", "Mono12", "Mono12_Packed", "RGB8_Packed", "BGR8_Packed", "BGRA8_Packed"} <= names
+    # Bayer 插值及 YUV 转换回退到 OpenCV
+    assert not any(name.startswith(("Bayer", "YUV", "YCBCR")) for name in names)
+
+
+@pytest.mark.parametrize("pixel_type", list(NUMPY_PLANS), ids=[plan.name for plan in NUMPY_PLANS.values()])
+@pytest.mark.parametrize("order", [ChannelOrder.RGB, ChannelOrder.BGR])
+def test_numpy_backend_decode(pixel_type, order):
+    plan = DECODE_PLANS[pixel_type].reorder(order)
+    backend = NumpyBackend()
+    if not backend.supports(plan):
+        pytest.skip(f"{plan.name} -> {order.value} falls back to opencv")
+    raw = valid_raw(pixel_type)
+    # 保持位深时与 OpenCV 完全一致
+    np.testing.assert_array_equal(
+        backend.decode(plan, raw, pixel_type, HEIGHT, WIDTH, keep_depth=True), plan.decode(raw, HEIGHT, WIDTH, keep_depth=True)
+    )
+    # 缩放到 8 位为右移, OpenCV 为四舍五入
+    dst = np.empty(plan.out_shape(HEIGHT, WIDTH), np.uint8)
+    image = backend.decode(plan, raw, pixel_type, HEIGHT, WIDTH, dst=dst)
+    assert image.shape == dst.shape and image.dtype == np.uint8
+    assert np.abs(image.astype(int) - plan.decode(raw, HEIGHT, WIDTH)).max() <= 1
+
+
+@pytest.mark.parametrize("rotate_code", [None, cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_180])
+def test_numpy_backend_transform(rotate_code):
+    backend = NumpyBackend()
+    # 整数倍缩小为块均值, 与 INTER_AREA 一致
+    image = np.random.default_rng(0).integers(0, 256, (8, 12, 3), dtype=np.uint8)
+    plan = TransformPlan.compile(resize_ratio=0.5, rotate_code=rotate_code)
+    result = backend.transform(plan, image)
+    assert result.flags.c_contiguous
+    assert np.abs(result.astype(int) - plan.apply(image)).max() <= 1
+    # 其余比例为最近邻
+    plan = TransformPlan.compile(resize_ratio=0.75, rotate_code=rotate_code)
+    dst = np.empty((*plan.out_size(8, 12), 3), np.uint8)
+    assert backend.transform(plan, image, dst=dst) is dst
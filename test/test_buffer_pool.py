@@ -0,0 +1,85 @@
+import gc
+import pytest
+import numpy as np
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera.buffer_pool import BufferPool
+
+
+def test_acquire_shape_dtype_alignment():
+    pool = BufferPool(alignment=64)
+    array = pool.acquire((3, 5), np.uint16)
+    assert array.shape == (3, 5) and array.dtype == np.uint16
+    assert array.ctypes.data % 64 == 0
+    assert pool.acquire(7).shape == (7,)
+
+
+def test_released_buffer_is_reused():
+    pool = BufferPool()
+    array = pool.acquire((4, 4))
+    address = array.ctypes.data
+    del array
+    assert pool.acquire((4, 4)).ctypes.data == address
+
+
+def test_buffer_held_by_view_is_not_reused():
+    pool = BufferPool()
+    array = pool.acquire((4, 4))
+    array[:] = 7
+    view = array[1:, ::2]
+    del array
+    other = pool.acquire((4, 4))
+    other[:] = 0
+    assert (view == 7).all()
+    del view, other
+    gc.collect()
+
+
+def test_same_bytes_different_shape_share_group():
+    pool = BufferPool()
+    array = pool.acquire((4, 4), np.uint8)
+    address = array.ctypes.data
+    del array
+    assert pool.acquire((2, 4), np.uint16).ctypes.data == address
+
+
+@pytest.mark.parametrize("sizes", [4, 5, 12])
+def test_steady_state_does_not_allocate(sizes, count_allocations):
+    # 每帧用到 sizes 种尺寸, 只有第一帧分配
+    pool = BufferPool()
+    allocations = count_allocations(pool)
+    for _ in range(10):
+        arrays = [pool.acquire((i + 1, 8)) for i in range(sizes)]
+        del arrays
+    assert len(allocations) == sizes
+
+
+def test_more_sizes_than_groups_evicts(count_allocations):
+    pool = BufferPool(max_sizes=4)
+    allocations = count_allocations(pool)
+    for _ in range(10):
+        arrays = [pool.acquire((i + 1, 8)) for i in range(5)]
+        del arrays
+    # 轮流淘汰, 每次都重新分配
+    assert len(allocations) == 50
+
+
+def test_exhausted_pool_allocates_temporary_buffer(count_allocations):
+    pool = BufferPool(max_buffers=2)
+    allocations = count_allocations(pool)
+    for _ in range(3):
+        arrays = [pool.acquire(16) for _ in range(3)]
+        del arrays
+    # 超出 max_buffers 的第 3 块每次临时分配, 归还后丢弃
+    assert len(allocations) == 2 + 3
+
+
+def test_clear_drops_outstanding_buffers(count_allocations):
+    pool = BufferPool()
+    allocations = count_allocations(pool)
+    array = pool.acquire(16)
+    pool.clear()
+    del array
+    pool.acquire(16)
+    assert len(allocations) == 2
@@ -0,0 +1,356 @@
+import ctypes
+import asyncio
+import threading
+import pytest
+import numpy as np
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera import Frame, HikCameraError
+from hikrobot_camera.hikrobot_camera import HIK
+
+
+def make_frame(camera, raw: np.ndarray, height: int, width: int, pixel_type: int = HIK.PixelType_Gvsp_Mono8) -> Frame:
+    """由原始数据构造取流时的帧, 几何快照为相机的当前设置"""
+    info = HIK.MV_FRAME_OUT_INFO_EX()
+    info.nWidth, info.nHeight = width, height
+    info.enPixelType = pixel_type
+    info.nFrameLen = raw.nbytes
+    return Frame(None, info, raw=raw, camera=camera, geometry=camera.snapshot_geometry(pixel_type))
+
+
+# #################### adjust_image ####################
+def test_adjust_image_before_first_frame(make_camera):
+    # 尚未解码过帧, 没有解码方案, 使用 OpenCV 后端
+    camera = make_camera()
+    image = np.arange(16, dtype=np.uint8).reshape(4, 4)
+    np.testing.assert_array_equal(camera.adjust_image(image), image)
+
+
+def test_adjust_image_before_first_frame_transforms(make_camera):
+    camera = make_camera(rotation=0, resize_ratio=0.5)
+    small = np.arange(12, dtype=np.uint8).reshape(4, 3)
+    # 每个 2x2 块取值相同, INTER_AREA 缩小后无舍入误差
+    image = np.kron(small, np.ones((2, 2), dtype=np.uint8))
+    np.testing.assert_array_equal(camera.adjust_image(image), np.rot90(small, -1))
+
+
+# #################### 缓存池 ####################
+def test_pipeline_steady_state_does_not_allocate(make_camera, count_allocations):
+    # 解码、resize、rotation、查表及 3 层预览金字塔, 每帧用到 5 种以上尺寸
+    camera = make_camera(resize_ratio=0.75, rotation=0, gamma=1.5, preview_level=3)
+    allocations = count_allocations(camera.buffer_pool)
+
+    height, width = 32, 48
+    raw = np.random.default_rng(0).integers(0, 256, height * width, dtype=np.uint8)
+    counts = list()
+    for _ in range(10):
+        frame = make_frame(camera, raw, height, width, HIK.PixelType_Gvsp_BayerRG8)
+        assert frame.preview.shape == (width * 3 // 4 // 8, height * 3 // 4 // 8, 3)
+        frame.gray
+        del frame
+        counts.append(len(allocations))
+    assert len(set(allocations)) > 4
+    # 第一帧之后不再分配
+    assert counts[1:] == [counts[0]] * 9
+
+
+# #################### asyncio ####################
+def test_aget_one_frame_decodes_on_producer_thread(make_camera):
+    # 被动取流, 由"回调线程"投递调用之后到达的帧
+    camera = make_camera(grab_method=3, rotation=1)
+    raw = np.arange(12, dtype=np.uint8)
+    decode_threads = list()
+    render_raw = camera.render_raw
+
+    def traced_render_raw(*args, **kwargs):
+        decode_threads.append(threading.current_thread())
+        return render_raw(*args, **kwargs)
+
+    camera.render_raw = traced_render_raw
+
+    async def main():
+        task = asyncio.create_task(camera.aget_one_frame())
+        # 等待 aget_one_frame 注册帧处理函数
+        while not camera.frame_handlers:
+            await asyncio.sleep(0)
+        producer = threading.Thread(target=camera.dispatch_frame, args=(make_frame(camera, raw, 3, 4),), name="producer")
+        producer.start()
+        image = await task
+        producer.join()
+        return image, producer
+
+    image, producer = asyncio.run(main())
+    np.testing.assert_array_equal(image, np.rot90(raw.reshape(3, 4), 2))
+    assert decode_threads == [producer]
+    assert not camera.frame_handlers
+
+
+def test_agrab_frame_returns_lazy_frame(make_camera):
+    camera = make_camera(grab_method=3)
+    raw = np.arange(12, dtype=np.uint8)
+
+    async def main():
+        task = asyncio.create_task(camera.agrab_frame())
+        while not camera.frame_handlers:
+            await asyncio.sleep(0)
+        threading.Thread(target=camera.dispatch_frame, args=(make_frame(camera, raw, 3, 4),)).start()
+        return await task
+
+    frame = asyncio.run(main())
+    assert not frame.is_decoded
+    np.testing.assert_array_equal(frame.image, raw.reshape(3, 4))
+
+
+def test_agrab_frame_timeout(make_camera):
+    camera = make_camera(grab_method=3, get_one_frame_timeout_ms=10)
+    with pytest.raises(HikCameraError):
+        asyncio.run(camera.agrab_frame())
+    assert not camera.frame_handlers
+
+
+# #################### 解码方案 ####################
+def test_decode_path_has_no_side_effects(make_camera):
+    camera = make_camera(gamma=2.0)
+    raw = np.arange(12, dtype=np.uint8)
+    lut = np.rint((np.arange(256) / 255) ** 0.5 * 255).astype(np.uint8)
+    np.testing.assert_array_equal(make_frame(camera, raw, 3, 4).image, lut[raw.reshape(3, 4)])
+    # 解码不选定当前流的解码方案
+    assert camera.decode_plan is None
+
+
+def test_resolve_decode_plan_sets_sdk_gamma(make_camera, monkeypatch):
+    from hikrobot_camera.hikrobot_camera import DECODE_PLANS
+    from hikrobot_camera.pixel_format import ChannelOrder
+
+    camera = make_camera(gamma=2.0, sdk_gamma=True, conversion_backend="sdk", output_channel_order="BGR")
+    pixel_type = HIK.PixelType_Gvsp_BayerRG8
+    monkeypatch.setattr(type(camera), "__getitem__", lambda self, key: pixel_type if key == "PixelFormat" else None)
+    calls = list()
+    camera.set_sdk_gamma = lambda *args: calls.append(args)
+
+    camera.resolve_decode_plan()
+    plan = DECODE_PLANS[pixel_type].reorder(ChannelOrder.BGR)
+    assert camera.decode_plan == (pixel_type, plan)
+    assert calls == [(pixel_type, 2.0)]
+    assert camera.get_decode_plan(pixel_type) is camera.decode_plan[1]
+    assert camera.sdk_gamma_applies(plan)
+    # 其他像素格式的 gamma 由查找表完成
+    assert not camera.sdk_gamma_applies(camera.get_decode_plan(HIK.PixelType_Gvsp_Mono8))
+
+    camera.set_gamma(1.5)
+    assert calls[-1] == (pixel_type, 1.5)
+
+
+# #################### 平场校正 ####################
+def test_flat_field_validated_on_geometry_change_only(make_camera):
+    from hikrobot_camera import FlatFieldCorrection
+
+    camera = make_camera()
+    signatures = list()
+
+    def get_flat_field_signature() -> dict:
+        # 真实相机上需要读取 PixelFormat、Binning/Decimation 等节点
+        signatures.append(camera.rotation.value)
+        return {"roi": camera.roi, "rotation": camera.rotation.value}
+
+    camera.get_flat_field_signature = get_flat_field_signature
+    flat = np.full((3, 4), 100.0)
+    camera.set_flat_field(FlatFieldCorrection.from_frames(flat, signature=get_flat_field_signature()))
+    signatures.clear()
+
+    # 取流路径只读取校验结果
+    for _ in range(5):
+        assert camera.snapshot_geometry(HIK.PixelType_Gvsp_Mono8).flat_field is camera.flat_field_correction
+    assert signatures == []
+
+    # 修改几何参数时校验, 不一致时跳过校正
+    camera.set_rotation(1)
+    assert signatures == [1]
+    assert camera.snapshot_geometry(HIK.PixelType_Gvsp_Mono8).flat_field is None
+    camera.set_rotation(3)
+    assert signatures == [1, 3]
+    assert camera.snapshot_geometry(HIK.PixelType_Gvsp_Mono8).flat_field is camera.flat_field_correction
+
+
+# #################### 连拍 ####################
+def install_one_frame_timeout(camera, frames: np.ndarray, pixel_type: int = HIK.PixelType_Gvsp_Mono8):
+    """以 frames 中的各帧模拟 MV_CC_GetOneFrameTimeout"""
+    count = iter(range(len(frames)))
+
+    def get_one_frame_timeout(pData, nDataSize, stFrameInfo, nMsec):
+        i = next(count)
+        ctypes.memmove(pData, frames[i].ctypes.data, frames[i].nbytes)
+        stFrameInfo.nFrameNum = i
+        stFrameInfo.nHeight, stFrameInfo.nWidth = frames.shape[1:3]
+        stFrameInfo.enPixelType = pixel_type
+        stFrameInfo.nFrameLen = frames[i].nbytes
+        return HIK.MV_OK
+
+    camera.MV_CC_GetOneFrameTimeout = get_one_frame_timeout
+    # 由 start_grabbing 初始化
+    camera.stFrameInfo = HIK.MV_FRAME_OUT_INFO_EX()
+    camera.nPayloadSize = frames[0].nbytes
+
+
+def test_capture_burst(make_camera, fake_nodes):
+    camera = make_camera(grab_method=1, rotation=0)
+    fake_nodes(camera, {"PixelFormat": HIK.PixelType_Gvsp_Mono8, "Width": 4, "Height": 3})
+    frames = np.arange(3 * 12, dtype=np.uint8).reshape(3, 3, 4)
+    install_one_frame_timeout(camera, frames)
+
+    out, info = camera.capture_burst(3)
+    assert out.shape == (3, 4, 3) and out.flags.c_contiguous
+    np.testing.assert_array_equal(out, np.rot90(frames, -1, axes=(1, 2)))
+    np.testing.assert_array_equal(info["frame_num"], [0, 1, 2])
+    with pytest.raises(ValueError):
+        camera.capture_burst(2, out=np.empty((2, 3, 4), np.uint8))
+
+
+def test_capture_burst_to_file(make_camera, fake_nodes, tmp_path):
+    camera = make_camera(grab_method=1)
+    fake_nodes(camera, {"PixelFormat": HIK.PixelType_Gvsp_Mono8, "Width": 4, "Height": 3})
+    frames = np.arange(3 * 12, dtype=np.uint8).reshape(3, 3, 4)
+    install_one_frame_timeout(camera, frames)
+
+    path = str(tmp_path / "burst" / "frames.npy")
+    written, info = camera.capture_burst_to_file(path, 3)
+    np.testing.assert_array_equal(written, frames)
+    loaded, loaded_info = camera.load_burst(path)
+    np.testing.assert_array_equal(loaded, frames)
+    np.testing.assert_array_equal(loaded_info["frame_num"], [0, 1, 2])
+
+
+@pytest.mark.parametrize("pixel_type, shape, dtype", [
+    (HIK.PixelType_Gvsp_Mono8, (3, 4), np.uint8),
+    (HIK.PixelType_Gvsp_RGB8_Packed, (3, 4, 3), np.uint8),
+    (HIK.PixelType_Gvsp_Mono12, (3, 4), np.uint16),
+    (HIK.PixelType_Gvsp_BayerRG12, (3, 4), np.uint16),
+    (HIK.PixelType_Gvsp_YUV422_Packed, (3, 4, 2), np.uint8),
+    (HIK.PixelType_Gvsp_Mono12_Packed, (18,), np.uint8),
+], ids=["Mono8", "RGB8", "Mono12", "BayerRG12", "YUV422", "Mono12_Packed"])
+def test_get_raw_frame_layout(make_camera, fake_nodes, pixel_type, shape, dtype):
+    camera = make_camera()
+    fake_nodes(camera, {"PixelFormat": pixel_type, "Width": 4, "Height": 3})
+    assert camera.get_raw_frame_layout() == (shape, np.dtype(dtype))
+
+
+# #################### 锁 ####################
+def test_params_do_not_wait_for_acquisition(make_camera):
+    camera = make_camera()
+    done = threading.Event()
+
+    def set_params():
+        camera.set_gamma(1.2)
+        camera.set_resize_ratio(0.5)
+        camera.snapshot_geometry(HIK.PixelType_Gvsp_Mono8)
+        done.set()
+
+    # 取流线程持有取流锁等待曝光时, 仍可修改主机端参数
+    with camera.lock:
+        worker = threading.Thread(target=set_params)
+        worker.start()
+        assert done.wait(timeout=1)
+    worker.join()
+    assert camera.transform_plan.resize_ratio == 0.5
+
+
+# #################### 相机端变换 ####################
+def test_offload_transform(make_camera, fake_nodes):
+    camera = make_camera(sensor_offload=True)
+    camera.is_opened_flag = True
+    # 不支持 Binning 时回退到 Decimation
+    writes = fake_nodes(camera, dict(), unsupported=("BinningHorizontal",))
+    try:
+        camera.set_resize_ratio(0.5)
+        assert (camera.sensor_factor_node, camera.sensor_factor) == ("Decimation", 2)
+        assert writes == [("DecimationHorizontal", 2), ("DecimationVertical", 2)]
+        assert camera.transform_plan.is_identity and camera.resize_ratio == 0.5
+
+        # 180° 旋转由 ReverseX/ReverseY 完成
+        writes.clear()
+        camera.set_rotation(1)
+        assert writes == [("ReverseX", True), ("ReverseY", True)]
+        assert camera.transform_plan.is_identity
+
+        # 90° 旋转由主机完成
+        writes.clear()
+        camera.set_rotation(0)
+        assert writes == [("ReverseX", False), ("ReverseY", False)]
+        assert camera.transform_plan.rotate_code == 0
+
+        # 剩余的缩放由主机完成
+        writes.clear()
+        camera.set_resize_ratio(0.3)
+        assert writes[:2] == [("DecimationHorizontal", 1), ("DecimationVertical", 1)]
+        assert camera.sensor_factor == 3
+        assert camera.transform_plan.resize_ratio == pytest.approx(0.9)
+    finally:
+        camera.is_opened_flag = False
+
+
+def test_offload_transform_without_device(make_camera, fake_nodes):
+    camera = make_camera(sensor_offload=True)
+    writes = fake_nodes(camera, dict())
+    camera.set_resize_ratio(0.5)
+    assert writes == [] and camera.transform_plan.resize_ratio == 0.5
+
+
+# #################### ROI ####################
+ROI_RANGES = {"Width": (16, 1024, 16), "OffsetX": (0, 1008, 8), "Height": (8, 768, 8), "OffsetY": (0, 760, 4)}
+
+
+def test_align_roi_axis(make_camera, fake_nodes):
+    camera = make_camera()
+    writes = fake_nodes(camera, dict(), ROI_RANGES)
+    # 偏移向下、尺寸向上对齐, 先设置尺寸
+    assert camera.align_roi_axis(13, 30, "OffsetX", "Width") == 5
+    assert writes == [("Width", 48), ("OffsetX", 8)]
+    # 超出右边界时左移相机区域
+    writes.clear()
+    assert camera.align_roi_axis(1000, 20, "OffsetX", "Width") == 8
+    assert writes == [("Width", 32), ("OffsetX", 992)]
+    with pytest.raises(ValueError):
+        camera.align_roi_axis(1000, 30, "OffsetX", "Width")
+
+
+def test_set_roi(make_camera, fake_nodes):
+    camera = make_camera()
+    nodes = {"Width": 1024, "Height": 768, "OffsetX": 0, "OffsetY": 0}
+    fake_nodes(camera, nodes, ROI_RANGES)
+    camera.set_roi((13, 5, 30, 20))
+    assert (nodes["OffsetX"], nodes["OffsetY"], nodes["Width"], nodes["Height"]) == (8, 4, 48, 24)
+    assert camera.roi_crop == (5, 1, 30, 20)
+    assert camera.get_image_size() == (20, 30)
+    # 对齐后无需裁剪
+    camera.set_roi((8, 4, 32, 16))
+    assert camera.roi_crop is None
+    camera.set_roi(None)
+    assert (nodes["Width"], nodes["Height"], camera.roi_crop) == (1024, 768, None)
+    with pytest.raises(ValueError):
+        camera.set_roi((0, 0, 0, 10))
+
+
+# #################### 命名区域 ####################
+@pytest.mark.parametrize("pixel_type, kwargs", [
+    (HIK.PixelType_Gvsp_BayerRG8, dict(rotation=0)),
+    (HIK.PixelType_Gvsp_Mono8, dict(rotation=1, resize_ratio=0.5)),
+], ids=["BayerRG8", "Mono8"])
+def test_render_rois(make_camera, pixel_type, kwargs):
+    named_rois = {"a": (2, 2, 6, 4), "b": (8, 4, 4, 6)}
+    # 每个 2x2 块取值相同, 缩小一半没有舍入误差
+    raw = np.kron(np.random.default_rng(0).integers(0, 256, (8, 8), dtype=np.uint8), np.ones((2, 2), np.uint8)).reshape(-1)
+
+    camera = make_camera(named_rois=named_rois, **kwargs)
+    frame = make_frame(camera, raw, 16, 16, pixel_type)
+    full = frame.rois
+    assert all(np.shares_memory(view, frame.image) for view in full.values())
+
+    # 只解码外接矩形, 不计算整幅图像
+    camera = make_camera(named_rois=named_rois, roi_only=True, **kwargs)
+    frame = make_frame(camera, raw, 16, 16, pixel_type)
+    rois = frame.rois
+    assert not frame.is_decoded
+    assert rois.keys() == full.keys()
+    for name in named_rois:
+        np.testing.assert_array_equal(rois[name], full[name])
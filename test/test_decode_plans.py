@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+import cv2
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera.hikrobot_camera import DECODE_PLANS
+from hikrobot_camera.pixel_format import ChannelOrder, DecodePlan
+from hikrobot_camera.transform import write_into
+
+from .test_pixel_format import make_mosaic
+
+HEIGHT, WIDTH = 4, 8
+
+
+def random_raw(pixel_type: int, seed: int = 0) -> np.ndarray:
+    """按 PFNC 编码的像素位数生成一帧随机原始数据"""
+    bits = (pixel_type >> 16) & 0xFF
+    return np.random.default_rng(seed).integers(0, 256, HEIGHT * WIDTH * bits // 8, dtype=np.uint8)
+
+
+@pytest.mark.parametrize("pixel_type", list(DECODE_PLANS), ids=[plan.name for plan in DECODE_PLANS.values()])
+@pytest.mark.parametrize("order", [ChannelOrder.RGB, ChannelOrder.BGR])
+@pytest.mark.parametrize("keep_depth", [False, True])
+def test_decode_plan_orders(pixel_type, order, keep_depth):
+    plan = DECODE_PLANS[pixel_type]
+    reordered = plan.reorder(order)
+    raw = random_raw(pixel_type)
+    image = reordered.decode(raw, HEIGHT, WIDTH, keep_depth=keep_depth)
+    assert image.shape == plan.out_shape(HEIGHT, WIDTH)
+    assert image.dtype == plan.out_dtype(keep_depth)
+    assert reordered.out_order() == (ChannelOrder.GRAY if plan.out_channels == 1 else order)
+    # BGR 输出恰为 RGB 输出交换通道
+    expected = plan.decode(raw, HEIGHT, WIDTH, keep_depth=keep_depth)
+    if plan.out_channels != 1 and order == ChannelOrder.BGR:
+        expected = expected[..., ::-1]
+    np.testing.assert_array_equal(image, expected)
+
+
+@pytest.mark.parametrize("pixel_type", list(DECODE_PLANS), ids=[plan.name for plan in DECODE_PLANS.values()])
+@pytest.mark.parametrize("order", [ChannelOrder.RGB, ChannelOrder.BGR])
+def test_decode_plan_gray_and_dst(pixel_type, order):
+    plan = DECODE_PLANS[pixel_type].reorder(order)
+    raw = random_raw(pixel_type)
+    gray = plan.decode(raw, HEIGHT, WIDTH, gray=True)
+    assert gray.shape == (HEIGHT, WIDTH)
+    # 写入 dst 与分配新数组的结果一致, 无需转换时由调用者复制
+    dst = np.empty(plan.out_shape(HEIGHT, WIDTH), np.uint8)
+    write_into(plan.decode(raw, HEIGHT, WIDTH, dst=dst), dst)
+    np.testing.assert_array_equal(dst, plan.decode(raw, HEIGHT, WIDTH))
+
+
+def test_reorder_without_swap_code_falls_back():
+    # COLOR_XYZ2RGB 没有登记 R/B 交换的对应代码
+    plan = DecodePlan("XYZ", channels=3, cvt_code=cv2.COLOR_XYZ2RGB, out_channels=3)
+    bgr = plan.reorder(ChannelOrder.BGR)
+    assert bgr.swap_rb and bgr.out_order() == ChannelOrder.BGR
+    assert bgr.reorder(ChannelOrder.RGB) == plan
+    raw = np.random.default_rng(0).integers(0, 256, HEIGHT * WIDTH * 3, dtype=np.uint8)
+    expected = cv2.cvtColor(raw.reshape(HEIGHT, WIDTH, 3), cv2.COLOR_XYZ2BGR)
+    np.testing.assert_array_equal(bgr.decode(raw, HEIGHT, WIDTH), expected)
+    dst = np.empty_like(expected)
+    bgr.decode(raw, HEIGHT, WIDTH, dst=dst)
+    np.testing.assert_array_equal(dst, expected)
+
+
+@pytest.mark.parametrize("bayer", ["RG", "BG", "GR", "GB"])
+@pytest.mark.parametrize("bits", [8, 12])
+def test_bayer_plan_colors(bayer, bits):
+    # 单色场景: GenICam 排列与 OpenCV 转换代码对应正确时, 插值结果恰为该颜色
+    plan = next(plan for plan in DECODE_PLANS.values() if plan.name == f"Bayer{bayer}{bits}")
+    color = np.array([200, 100, 100, 50]) << (bits - 8)
+    mosaic = make_mosaic(np.broadcast_to(color, (4, 4, 4)).astype(plan.dtype), bayer)
+    raw = mosaic.view(np.uint8).reshape(-1)
+    image = plan.decode(raw, 8, 8)
+    np.testing.assert_array_equal(image[2:-2, 2:-2], np.broadcast_to([200, 100, 50], (4, 4, 3)))
+    np.testing.assert_array_equal(plan.decode_half(raw, 8, 8), np.broadcast_to([200, 100, 50], (4, 4, 3)))
@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera import FlatFieldCorrection
+
+
+def make_scene(shape: tuple[int, ...] = (4, 6), seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    渐晕及暗电流不均匀的场景
+    :return: (flat, dark, vignetting), flat/dark 为 float64 平均图像
+    """
+    rng = np.random.default_rng(seed)
+    vignetting = rng.uniform(0.5, 1.0, shape)
+    dark = rng.uniform(2, 8, shape)
+    flat = dark + 160 * vignetting
+    return flat, dark, vignetting
+
+
+def test_from_frames_apply():
+    flat, dark, vignetting = make_scene()
+    correction = FlatFieldCorrection.from_frames(flat, dark)
+    assert correction.shape == flat.shape and correction.dtype == np.uint8
+    # 均匀场景经渐晕后校正为均匀的平均响应
+    image = np.clip(np.rint(dark + 100 * vignetting), 0, 255).astype(np.uint8)
+    corrected = correction.apply(image)
+    target = 100 * vignetting.mean()
+    assert np.abs(corrected.astype(float) - target).max() <= 2
+    # 原地校正
+    assert correction.apply(image, dst=image) is image
+    np.testing.assert_array_equal(image, corrected)
+
+
+def test_apply_saturates():
+    flat = np.array([[100.0, 50.0]])
+    correction = FlatFieldCorrection.from_frames(flat, np.full_like(flat, 10))
+    # 低于暗场为 0, 增益后超出最大值截断
+    np.testing.assert_array_equal(correction.apply(np.array([[5, 255]], np.uint8)), [[0, 255]])
+    with pytest.raises(ValueError):
+        correction.apply(np.zeros((1, 2), np.uint16))
+
+
+def test_from_frames_color_uint16():
+    flat, dark, vignetting = make_scene((4, 6, 3))
+    flat = flat * [1.0, 2.0, 4.0]
+    correction = FlatFieldCorrection.from_frames(flat, None, dtype=np.uint16)
+    corrected = correction.apply(np.rint(flat).astype(np.uint16)).astype(float)
+    # 按通道以各自的平均值为目标, 不改变白平衡
+    np.testing.assert_allclose(corrected, np.broadcast_to(flat.mean(axis=(0, 1)), flat.shape), atol=2)
+
+
+def test_save_load_mismatch(tmp_path):
+    flat, dark, _ = make_scene()
+    signature = {"roi": (0, 0, 6, 4), "rotation": 3}
+    correction = FlatFieldCorrection.from_frames(flat, dark, signature=signature)
+    path = tmp_path / "flat_field.npz"
+    correction.save(str(path))
+    loaded = FlatFieldCorrection.load(str(path))
+    np.testing.assert_array_equal(loaded.offset, correction.offset)
+    np.testing.assert_array_equal(loaded.gain, correction.gain)
+    assert loaded.shift == correction.shift and loaded.signature == correction.signature
+
+    assert loaded.mismatch(signature) == dict()
+    assert loaded.mismatch({**signature, "rotation": 0}) == {"rotation": (3, 0)}
+    # 未记录几何参数时不校验
+    assert FlatFieldCorrection.from_frames(flat).mismatch(signature) == dict()
+
+
+def test_average():
+    frames = iter([np.full((2, 2), value, np.uint8) for value in (10, 20, 30)])
+    np.testing.assert_array_equal(FlatFieldCorrection.average(lambda: next(frames), 3), np.full((2, 2), 20.0))
+    frames = iter([np.zeros((2, 2), np.uint8), np.zeros((2, 3), np.uint8)])
+    with pytest.raises(ValueError):
+        FlatFieldCorrection.average(lambda: next(frames), 2)
+    with pytest.raises(ValueError):
+        FlatFieldCorrection.average(lambda: np.zeros(1), 0)
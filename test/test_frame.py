@@ -0,0 +1,134 @@
+import ctypes
+import pytest
+import numpy as np
+import cv2
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera import ChannelOrder, Frame, FrameLease
+from hikrobot_camera.hikrobot_camera import HIK
+
+from .test_camera import make_frame
+
+
+# #################### 帧信息 ####################
+def test_info_record():
+    info = HIK.MV_FRAME_OUT_INFO_EX()
+    info.nFrameNum, info.nWidth, info.nHeight = 7, 640, 480
+    info.nDevTimeStampHigh, info.nDevTimeStampLow = 1, 2
+    info.fExposureTime, info.nLostPacket, info.nOffsetX = 5000.0, 3, 16
+    frame = Frame(None, info)
+    assert frame.dev_timestamp == (1 << 32) | 2
+
+    records = np.zeros(2, dtype=Frame.INFO_DTYPE)
+    records[1] = frame.info_record()
+    record = records[1]
+    assert (record["frame_num"], record["width"], record["height"]) == (7, 640, 480)
+    assert record["dev_timestamp"] == frame.dev_timestamp and record["arrival"] == frame.arrival
+    assert (record["exposure_time"], record["lost_packet"], record["offset_x"]) == (5000.0, 3, 16)
+
+
+# #################### 惰性解码 ####################
+def test_lazy_decode_uses_grab_geometry(make_camera):
+    camera = make_camera()
+    raw = np.arange(12, dtype=np.uint8)
+    frame = make_frame(camera, raw, 3, 4)
+    assert not frame.is_decoded
+    # 取流后修改设置不影响已取到的帧
+    camera.set_rotation(0)
+    np.testing.assert_array_equal(frame.image, raw.reshape(3, 4))
+    assert frame.is_decoded
+    np.testing.assert_array_equal(make_frame(camera, raw, 3, 4).image, np.rot90(raw.reshape(3, 4), -1))
+
+
+def test_frame_without_raw():
+    frame = Frame(None, HIK.MV_FRAME_OUT_INFO_EX())
+    assert frame.image is None
+    with pytest.raises(RuntimeError):
+        frame.decoded
+
+
+# #################### 通道顺序 ####################
+@pytest.mark.parametrize("order", [ChannelOrder.RGB, ChannelOrder.BGR])
+def test_channel_order(make_camera, order):
+    camera = make_camera(output_channel_order=order.value)
+    raw = np.random.default_rng(0).integers(0, 256, 8 * 8, dtype=np.uint8)
+    frame = make_frame(camera, raw, 8, 8, HIK.PixelType_Gvsp_BayerRG8)
+    assert frame.channel_order == order
+    expected = cv2.cvtColor(raw.reshape(8, 8), cv2.COLOR_BAYER_BG2BGR)
+    np.testing.assert_array_equal(frame.bgr, expected)
+    if order == ChannelOrder.BGR:
+        # 已解码为 BGR 时不再转换
+        assert frame.bgr is frame.decoded
+    else:
+        np.testing.assert_array_equal(frame.decoded, expected[..., ::-1])
+
+    gray = make_frame(camera, raw, 8, 8)
+    assert gray.channel_order == ChannelOrder.GRAY
+    np.testing.assert_array_equal(gray.bgr, np.repeat(raw.reshape(8, 8, 1), 3, axis=2))
+
+
+def test_channel_order_without_camera():
+    assert Frame(np.zeros((2, 2), np.uint8), HIK.MV_FRAME_OUT_INFO_EX()).channel_order == ChannelOrder.GRAY
+    assert Frame(np.zeros((2, 2, 3), np.uint8), HIK.MV_FRAME_OUT_INFO_EX()).channel_order == ChannelOrder.RGB
+
+
+# #################### 金字塔 ####################
+def test_pyramid_levels(make_camera):
+    camera = make_camera(preview_level=2)
+    raw = np.random.default_rng(0).integers(0, 256, 16 * 20, dtype=np.uint8)
+    frame = make_frame(camera, raw, 16, 20)
+    assert frame.level(0) is frame.image
+    half = cv2.resize(frame.image, (10, 8), interpolation=cv2.INTER_AREA)
+    np.testing.assert_array_equal(frame.level(1), half)
+    # 由上一层缩小, 奇数尺寸舍弃最后一行/列
+    np.testing.assert_array_equal(frame.preview, cv2.resize(half, (5, 4), interpolation=cv2.INTER_AREA))
+    assert frame.level(2) is frame.preview
+    assert frame.level(3).shape == (2, 2)
+    with pytest.raises(ValueError):
+        frame.level(-1)
+    with pytest.raises(ValueError):
+        frame.level(5)
+    # 替换 image 后重新计算
+    frame.image = np.zeros((4, 4), np.uint8)
+    assert frame.level(1).shape == (2, 2)
+
+
+# #################### FrameLease ####################
+def test_frame_lease_release(make_camera):
+    camera = make_camera(grab_method=2)
+    freed = list()
+    camera.MV_CC_FreeImageBuffer = lambda stOutFrame: freed.append(stOutFrame) or HIK.MV_OK
+    camera.is_grabbing_flag = True
+    try:
+        stOutFrame = HIK.MV_FRAME_OUT()
+        buffer = ctypes.create_string_buffer(b"\x01\x02\x03\x04", 4)
+        stOutFrame.pBufAddr = ctypes.cast(buffer, type(stOutFrame.pBufAddr))
+        stOutFrame.stFrameInfo.nWidth, stOutFrame.stFrameInfo.nHeight, stOutFrame.stFrameInfo.nFrameLen = 4, 1, 4
+        stOutFrame.stFrameInfo.enPixelType = HIK.PixelType_Gvsp_Mono8
+
+        with FrameLease(camera, stOutFrame, camera.stream_generation) as lease:
+            # 零拷贝视图
+            assert lease.raw.ctypes.data == ctypes.addressof(buffer)
+            frame = lease.frame
+        assert lease.released and freed == [stOutFrame]
+        np.testing.assert_array_equal(frame.image, [[1, 2, 3, 4]])
+        with pytest.raises(RuntimeError):
+            lease.raw
+        # 重复释放不再归还
+        lease.release()
+        assert len(freed) == 1
+
+        # 停止取流之前的租约不归还到新的取流
+        FrameLease(camera, stOutFrame, camera.stream_generation - 1).release()
+        assert len(freed) == 1
+
+        # 未释放即被回收的租约推迟到下一次取流时归还
+        lease = FrameLease(camera, stOutFrame, camera.stream_generation)
+        del lease
+        assert len(freed) == 1 and len(camera.pending_lease_frees) == 1
+        with camera.lock:
+            camera.drain_lease_frees()
+        assert len(freed) == 2 and not camera.pending_lease_frees
+    finally:
+        camera.is_grabbing_flag = False
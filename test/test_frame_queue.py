@@ -0,0 +1,100 @@
+import queue
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera import Frame
+from hikrobot_camera.frame_queue import DropPolicy, FrameQueue, AsyncFrameQueue
+from hikrobot_camera.grabber import LatestFrameSlot
+from hikrobot_camera.hikrobot_camera import HIK
+
+
+def make_info_frame(frame_num: int) -> Frame:
+    """只带帧号的帧"""
+    info = HIK.MV_FRAME_OUT_INFO_EX()
+    info.nFrameNum = frame_num
+    return Frame(None, info)
+
+
+# #################### FrameQueue ####################
+def test_frame_queue_drop_oldest():
+    frames = FrameQueue(maxsize=2, policy=DropPolicy.DropOldest)
+    assert all(frames.put(i) for i in range(4))
+    assert frames.dropped == 2 and len(frames) == 2
+    assert [frames.get(timeout=0), frames.get(timeout=0)] == [2, 3]
+    with pytest.raises(queue.Empty):
+        frames.get(timeout=0)
+
+
+def test_frame_queue_drop_newest():
+    frames = FrameQueue(maxsize=2, policy=DropPolicy.DropNewest)
+    assert [frames.put(i) for i in range(4)] == [True, True, False, False]
+    assert frames.dropped == 2
+    assert [frames.get(timeout=0), frames.get(timeout=0)] == [0, 1]
+
+
+def test_frame_queue_block():
+    frames = FrameQueue(maxsize=1, policy=DropPolicy.Block)
+    frames.put(0)
+    # 超时后丢弃
+    assert not frames.put(1, timeout=0.01)
+    assert frames.dropped == 1
+    # 消费者读取后生产者继续
+    producer = threading.Thread(target=frames.put, args=(2,))
+    producer.start()
+    assert frames.get(timeout=1) == 0
+    producer.join(timeout=1)
+    assert not producer.is_alive()
+    assert frames.get(timeout=1) == 2
+
+
+def test_frame_queue_maxsize():
+    with pytest.raises(ValueError):
+        FrameQueue(maxsize=0)
+
+
+# #################### AsyncFrameQueue ####################
+def test_async_frame_queue():
+    async def main():
+        frames = AsyncFrameQueue(asyncio.get_running_loop(), maxsize=2)
+        producer = threading.Thread(target=lambda: [frames.put_threadsafe(i) for i in range(3)])
+        producer.start()
+        producer.join()
+        # 已满时丢弃最旧的帧, 不阻塞生产者
+        first, second = await frames.get(timeout=1), await frames.get(timeout=1)
+        with pytest.raises(asyncio.TimeoutError):
+            await frames.get(timeout=0.01)
+        return first, second, frames.dropped
+
+    assert asyncio.run(main()) == (1, 2, 1)
+
+
+# #################### LatestFrameSlot ####################
+def test_latest_frame_slot():
+    slot = LatestFrameSlot()
+    assert slot.latest() is None
+    first, second = make_info_frame(1), make_info_frame(2)
+    slot.publish(first)
+    assert slot.latest() is first
+    slot.publish(second)
+    assert slot.latest() is second
+    assert slot.latest(max_age_ms=60_000) is second
+    second.arrival -= 1
+    assert slot.latest(max_age_ms=100) is None
+    slot.clear()
+    assert slot.latest() is None
+
+
+def test_latest_frame_slot_wait_newer():
+    slot = LatestFrameSlot()
+    slot.publish(make_info_frame(1))
+    assert slot.wait_newer(0, timeout=0).frame_num == 1
+    assert slot.wait_newer(1, timeout=0.01) is None
+
+    frame = make_info_frame(2)
+    timer = threading.Timer(0.01, slot.publish, args=(frame,))
+    timer.start()
+    assert slot.wait_newer(1, timeout=1) is frame
+    timer.join()
@@ -0,0 +1,160 @@
+import pytest
+import numpy as np
+import cv2
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera.pixel_format import (
+    ChannelOrder, superpixel_demosaic, build_tone_lut, tone_lut, tone_map, build_adjust_lut, apply_lut,
+    unpack_10_packed, unpack_12_packed, unpack_packed_to_8, ycbcr_matrix, yuv422_to_rgb,
+)
+
+# 各 Bayer 排列中 (R, G1, G2, B) 在 2x2 单元内的位置
+BAYER_POSITIONS = {
+    "RG": ((0, 0), (0, 1), (1, 0), (1, 1)),
+    "BG": ((1, 1), (0, 1), (1, 0), (0, 0)),
+    "GR": ((0, 1), (0, 0), (1, 1), (1, 0)),
+    "GB": ((1, 0), (0, 0), (1, 1), (0, 1)),
+}
+
+
+def pack(pixels: np.ndarray, bits: int) -> np.ndarray:
+    """按 GigE Vision Mono10Packed / Mono12Packed 逐对打包, 作为解码核的参照"""
+    mask = (1 << (bits - 8)) - 1
+    p0, p1 = pixels.reshape(-1, 2).T.astype(np.uint16)
+    triplets = np.stack([p0 >> (bits - 8), (p0 & mask) | ((p1 & mask) << 4), p1 >> (bits - 8)], axis=1)
+    return triplets.astype(np.uint8).reshape(-1)
+
+
+def make_mosaic(channels: np.ndarray, bayer: str) -> np.ndarray:
+    """由 (h, w, 4) 的 (R, G1, G2, B) 超像素生成 (2h, 2w) Bayer 原始数据"""
+    height, width = channels.shape[:2]
+    mosaic = np.empty((height * 2, width * 2), channels.dtype)
+    for i, (y, x) in enumerate(BAYER_POSITIONS[bayer]):
+        mosaic[y::2, x::2] = channels[..., i]
+    return mosaic
+
+
+# #################### Packed 解码核 ####################
+@pytest.mark.parametrize("bits, kernel", [(10, unpack_10_packed), (12, unpack_12_packed)])
+def test_unpack_packed(bits, kernel):
+    height, width = 3, 6
+    pixels = np.random.default_rng(bits).integers(0, 1 << bits, (height, width), dtype=np.uint16)
+    raw = pack(pixels, bits)
+    np.testing.assert_array_equal(kernel(raw, height, width), pixels)
+    # 写入调用者提供的数组
+    out = np.empty((height, width), np.uint16)
+    assert kernel(raw, height, width, out) is out
+    np.testing.assert_array_equal(out, pixels)
+    # 融合解码核只取高 8 位
+    np.testing.assert_array_equal(unpack_packed_to_8(raw, height, width), pixels >> (bits - 8))
+
+
+def test_unpack_packed_odd_pixel_count():
+    with pytest.raises(ValueError):
+        unpack_12_packed(np.zeros(8, np.uint8), 1, 5)
+
+
+# #################### 色调映射 ####################
+def test_tone_lut():
+    lut = tone_lut(12)
+    assert lut.shape == (65536,) and lut.dtype == np.uint8 and not lut.flags.writeable
+    assert lut[0] == 0 and lut[4095] == 255 and lut[65535] == 255
+    assert np.all(np.diff(lut[:4096].astype(int)) >= 0)
+    assert tone_lut(12) is lut
+
+    image = np.random.default_rng(0).integers(0, 4096, (4, 5), dtype=np.uint16)
+    dst = np.empty(image.shape, np.uint8)
+    assert tone_map(image, lut, dst=dst) is dst
+    np.testing.assert_array_equal(dst, np.rint(image / 4095 * 255).astype(np.uint8))
+
+
+def test_build_tone_lut_black_white():
+    lut = build_tone_lut(black=100, white=200)
+    assert lut[100] == 0 and lut[150] == 128 and lut[200] == 255
+    with pytest.raises(ValueError):
+        build_tone_lut(black=200, white=100)
+
+
+# #################### 查找表调整 ####################
+def test_build_adjust_lut():
+    np.testing.assert_array_equal(build_adjust_lut(), np.arange(256))
+    lut = build_adjust_lut(gamma=2.0)
+    assert not lut.flags.writeable
+    np.testing.assert_array_equal(lut, np.rint((np.arange(256) / 255) ** 0.5 * 255))
+    # 对比度以中灰为中心
+    lut = build_adjust_lut(contrast=2.0)
+    assert lut[0] == 0 and lut[255] == 255 and lut[64] == 0 and abs(int(lut[128]) - 128) <= 1
+    # uint16 超出满量程的输入映射为满量程
+    lut = build_adjust_lut(np.uint16, bits=12, gamma=2.0)
+    assert lut.shape == (65536,) and lut.dtype == np.uint16
+    assert lut[4095] == 4095 and lut[65535] == 4095
+    with pytest.raises(TypeError):
+        build_adjust_lut(np.float32)
+
+
+@pytest.mark.parametrize("dtype, bits", [(np.uint8, 8), (np.uint16, 12)])
+def test_apply_lut_in_place(dtype, bits):
+    lut = build_adjust_lut(dtype, bits=bits, gamma=1.5, contrast=1.2)
+    image = np.random.default_rng(0).integers(0, 1 << bits, (4, 5, 3), dtype=dtype)
+    expected = lut[image]
+    assert apply_lut(image, lut, dst=image) is image
+    np.testing.assert_array_equal(image, expected)
+
+
+# #################### Bayer 超像素解码 ####################
+@pytest.mark.parametrize("bayer", list(BAYER_POSITIONS))
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_superpixel_demosaic(bayer, dtype):
+    rng = np.random.default_rng(0)
+    channels = rng.integers(0, 200, (3, 4, 4)).astype(dtype)
+    # 两个绿色像素之和为偶数, 均值没有舍入
+    channels[..., 2] = channels[..., 1] + 2 * rng.integers(0, 20, (3, 4)).astype(dtype)
+    mosaic = make_mosaic(channels, bayer)
+    r, g1, g2, b = (channels[..., i] for i in range(4))
+    g = (g1.astype(int) + g2) // 2
+
+    rgb = superpixel_demosaic(mosaic, bayer)
+    assert rgb.shape == (3, 4, 3) and rgb.dtype == dtype
+    np.testing.assert_array_equal(rgb, np.stack([r, g, b], axis=2))
+    out = np.empty((3, 4, 3), dtype)
+    assert superpixel_demosaic(mosaic, bayer, out=out, order=ChannelOrder.BGR) is out
+    np.testing.assert_array_equal(out, rgb[..., ::-1])
+    # 奇数尺寸舍弃最后一行/列
+    odd = np.pad(mosaic, ((0, 1), (0, 1)))
+    np.testing.assert_array_equal(superpixel_demosaic(odd, bayer), rgb)
+
+
+# #################### YCbCr 4:2:2 ####################
+def test_ycbcr_matrix():
+    matrix = ycbcr_matrix(0.299, 0.114, full_range=True)
+    assert matrix.shape == (3, 4) and matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix[:, :3], [[1, 0, 1.402], [1, -0.344136, -0.714136], [1, 1.772, 0]], atol=1e-5)
+    # 有限范围的黑、白点
+    limited = ycbcr_matrix(0.2126, 0.0722)
+    np.testing.assert_allclose(limited @ [16, 128, 128, 1], 0, atol=1e-3)
+    np.testing.assert_allclose(limited @ [235, 128, 128, 1], 255, atol=1e-3)
+
+
+@pytest.mark.parametrize("layout, cvt_code", [("UYVY", cv2.COLOR_YUV2RGB_UYVY), ("YUYV", cv2.COLOR_YUV2RGB_YUYV)])
+def test_yuv422_to_rgb(layout, cvt_code):
+    height, width = 4, 8
+    raw = np.random.default_rng(0).integers(16, 236, height * width * 2, dtype=np.uint8)
+    # 有限范围 BT.601 与 OpenCV 的转换一致 (OpenCV 为定点运算, 允许 1 的舍入差)
+    rgb = yuv422_to_rgb(raw, height, width, layout=layout, matrix=ycbcr_matrix(0.299, 0.114))
+    expected = cv2.cvtColor(raw.reshape(height, width, 2), cvt_code)
+    assert rgb.shape == (height, width, 3) and rgb.dtype == np.uint8
+    assert np.abs(rgb.astype(int) - expected).max() <= 1
+
+    # 两种排列只有字节位置不同
+    groups = raw.reshape(-1, 4)
+    swapped = groups[:, [1, 0, 3, 2]].reshape(-1)
+    other = "YUYV" if layout == "UYVY" else "UYVY"
+    out = np.empty_like(rgb)
+    assert yuv422_to_rgb(swapped, height, width, out=out, layout=other, matrix=ycbcr_matrix(0.299, 0.114)) is out
+    np.testing.assert_array_equal(out, rgb)
+
+
+def test_yuv422_to_rgb_odd_width():
+    with pytest.raises(ValueError):
+        yuv422_to_rgb(np.zeros(2 * 3 * 2, np.uint8), 2, 3)
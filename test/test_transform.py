@@ -0,0 +1,119 @@
+import pytest
+import numpy as np
+import cv2
+
+pytest.importorskip("hikrobot_camera", reason="MVS SDK is required")
+
+from hikrobot_camera.transform import ROT90_K, TransformPlan, decimation_step, write_into
+
+ROTATE_CODES = [None, cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_180, cv2.ROTATE_90_COUNTERCLOCKWISE]
+
+
+def reference(image: np.ndarray, resize_ratio, rotate_code) -> np.ndarray:
+    """先 resize 再旋转, 作为变换方案的参照"""
+    if resize_ratio is not None:
+        height, width = image.shape[:2]
+        size = (max(1, round(width * resize_ratio)), max(1, round(height * resize_ratio)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image if rotate_code is None else np.rot90(image, ROT90_K[rotate_code])
+
+
+# #################### 整数抽取 ####################
+@pytest.mark.parametrize("shape, height, width, expected", [
+    ((8, 12), 4, 6, 2),
+    ((9, 12), 3, 4, 3),
+    ((10, 10), 3, 3, 3),    # 尺寸取整: round(10 / 3) == 3, 10[::3] 的长度为 4, 截取前 9 行
+    ((8, 12), 4, 4, None),  # 两个方向的倍数不同
+    ((8, 12), 8, 12, None),  # 不缩小
+    ((8, 12), 5, 7, None),  # 非整数倍
+])
+def test_decimation_step(shape, height, width, expected):
+    step = decimation_step(shape, height, width)
+    assert step == expected
+    if step is not None:
+        assert np.empty(shape)[: height * step: step, : width * step: step].shape == (height, width)
+
+
+# #################### TransformPlan ####################
+def test_compile():
+    assert TransformPlan.compile().is_identity
+    assert TransformPlan.compile(resize_ratio=1).is_identity
+    assert TransformPlan.compile(resize_ratio=0.5, rotate_code=cv2.ROTATE_90_CLOCKWISE).out_size(8, 12) == (6, 4)
+    with pytest.raises(ValueError):
+        TransformPlan.compile(resize_ratio=0)
+
+
+@pytest.mark.parametrize("resize_ratio", [None, 0.5, 0.75, 1.5])
+@pytest.mark.parametrize("rotate_code", ROTATE_CODES)
+def test_apply(resize_ratio, rotate_code):
+    plan = TransformPlan.compile(resize_ratio=resize_ratio, rotate_code=rotate_code)
+    # 每个 4x4 块取值相同, 先旋转或先 resize 的结果一致
+    image = np.kron(np.random.default_rng(0).integers(0, 256, (2, 3, 3), dtype=np.uint8), np.ones((4, 4, 1), np.uint8))
+    expected = reference(image, plan.resize_ratio, rotate_code)
+    result = plan.apply(image)
+    assert result.shape == (*plan.out_size(8, 12), 3)
+    np.testing.assert_array_equal(result, expected)
+    # 写入调用者提供的数组, 中间结果由 alloc 分配
+    allocated = list()
+
+    def alloc(shape, dtype):
+        allocated.append(shape)
+        return np.empty(shape, dtype)
+
+    dst = np.empty(expected.shape, np.uint8)
+    assert plan.apply(image, dst=dst, alloc=alloc) is dst
+    np.testing.assert_array_equal(dst, expected)
+    assert len(allocated) <= 1
+
+
+def test_apply_resized_input():
+    # 输入已缩小一半(如超像素解码)时只缩放剩余部分
+    plan = TransformPlan.compile(resize_ratio=0.25)
+    image = np.kron(np.arange(6, dtype=np.uint8).reshape(2, 3), np.ones((2, 2), np.uint8))
+    np.testing.assert_array_equal(plan.apply(image, 8, 12), np.arange(6).reshape(2, 3))
+
+
+@pytest.mark.parametrize("rotate_code", ROTATE_CODES)
+def test_apply_views(rotate_code):
+    plan = TransformPlan.compile(resize_ratio=0.5, rotate_code=rotate_code, views=True)
+    image = np.arange(8 * 12, dtype=np.uint8).reshape(8, 12)
+    result = plan.apply(image)
+    # 整数倍缩小为抽取, 旋转为跨步视图, 均不复制
+    assert np.shares_memory(result, image)
+    expected = image[::2, ::2]
+    np.testing.assert_array_equal(result, expected if rotate_code is None else np.rot90(expected, ROT90_K[rotate_code]))
+    # 非整数倍缩放仍生成新数组
+    result = TransformPlan.compile(resize_ratio=0.75, rotate_code=rotate_code, views=True).apply(image)
+    assert not np.shares_memory(result, image)
+    assert result.shape == TransformPlan.compile(resize_ratio=0.75, rotate_code=rotate_code).out_size(8, 12)
+
+
+@pytest.mark.parametrize("resize_ratio", [None, 0.5])
+@pytest.mark.parametrize("rotate_code", ROTATE_CODES)
+def test_map_rect(resize_ratio, rotate_code):
+    plan = TransformPlan.compile(resize_ratio=resize_ratio, rotate_code=rotate_code)
+    height, width = 8, 12
+    rect = (2, 4, 6, 2)
+    # 只有矩形内为 1 的掩模经变换后, 恰为映射后的矩形
+    mask = np.zeros((height, width), np.uint8)
+    mask[4:6, 2:8] = 1
+    transformed = plan.apply(mask * 255)
+    x, y, w, h = plan.map_rect(rect, height, width)
+    assert transformed.shape == plan.out_size(height, width)
+    ys, xs = np.nonzero(transformed)
+    assert (xs.min(), ys.min(), xs.max() + 1 - xs.min(), ys.max() + 1 - ys.min()) == (x, y, w, h)
+
+
+def test_map_rect_rounds_outward():
+    plan = TransformPlan.compile(resize_ratio=0.5)
+    assert plan.map_rect((1, 1, 2, 2), 8, 12) == (0, 0, 2, 2)
+    assert plan.map_rect((11, 7, 1, 1), 8, 12) == (5, 3, 1, 1)
+
+
+def test_write_into():
+    image = np.arange(6, dtype=np.uint8)
+    assert write_into(image, None) is image
+    dst = np.empty_like(image)
+    assert write_into(image, dst) is dst
+    np.testing.assert_array_equal(dst, image)
+    assert write_into(dst, dst) is dst